@@ -3,7 +3,7 @@ API v1 router aggregation
 """
 from fastapi import APIRouter
 
-from app.api.v1.endpoints import auth, documents, chat, health
+from app.api.v1.endpoints import auth, documents, chat, health, models
 
 api_router = APIRouter()
 
@@ -30,3 +30,9 @@ api_router.include_router(
     prefix="/chat",
     tags=["Chat"]
 )
+
+api_router.include_router(
+    models.router,
+    prefix="/models",
+    tags=["Models"]
+)
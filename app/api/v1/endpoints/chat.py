@@ -1,10 +1,15 @@
 """
 Chat router - RAG-powered chat with documents
 """
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import datetime
+import asyncio
+import threading
 import time
 import json
 
@@ -17,12 +22,140 @@ from app.models import (
     ChatSessionSchema,
     QueryRequest,
     QueryResponse,
+    BatchQueryRequest,
+    BatchQueryResponse,
+    BatchQuestionResult,
     get_db,
 )
-from app.services import get_current_active_user, leann_service, ollama_service
+from app.config import settings
+from app.services import (
+    get_current_active_user,
+    leann_service,
+    ollama_service,
+    conversation_summary_service,
+    model_router,
+    SchedulerRejected,
+    GenerationCancelled,
+)
+from app.services.generation_scheduler import PRIORITY_BATCH
 
 router = APIRouter()
 
+# Non-standard status (nginx convention) for requests abandoned by the client
+HTTP_499_CLIENT_CLOSED_REQUEST = 499
+
+# How often a running query checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 0.5
+
+
+def _get_session_documents(db: Session, session: ChatSessionModel) -> List[DocumentModel]:
+    """Get the documents of a chat session, all of which must be ready"""
+    # Get document IDs for this session
+    doc_ids = []
+    if session.document_ids:
+        doc_ids = json.loads(session.document_ids)
+    elif session.document_id:
+        doc_ids = [session.document_id]
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Session has no associated documents"
+        )
+
+    return _get_ready_documents(db, doc_ids)
+
+
+def _get_ready_documents(db: Session, doc_ids: List[int]) -> List[DocumentModel]:
+    """Get documents by id, all of which must be ready"""
+    documents = db.query(DocumentModel).filter(
+        DocumentModel.id.in_(doc_ids)
+    ).all()
+
+    # Check all documents are ready
+    not_ready = [doc for doc in documents if doc.status != "ready"]
+    if not_ready:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Some documents are not ready: {', '.join([doc.title for doc in not_ready])}"
+        )
+
+    return documents
+
+
+def _select_context(results_by_document, top_k: int, min_similarity: Optional[float]) -> List[dict]:
+    """
+    Merge search results of several documents into the context for one question
+    results_by_document: list of (document, search results) pairs
+    Returns: top_k results above the similarity threshold, in document order
+    """
+    all_results = []
+    for document, search_results in results_by_document:
+        # Add document title to each result for context
+        for result in search_results:
+            result["source_document"] = document.title
+        all_results.extend(search_results)
+
+    # Filter by similarity threshold if specified
+    threshold = min_similarity if min_similarity is not None else settings.leann_default_similarity_threshold
+    if threshold > 0.0:
+        all_results = [r for r in all_results if r.get("score", 0) >= threshold]
+
+    # Sort by score and take top_k results across all documents
+    all_results.sort(key=lambda x: x.get("score", 0), reverse=True)
+    top_results = all_results[:top_k]
+
+    # Present the selected chunks in document order rather than score order so
+    # the same chunks always render the same prompt prefix (Ollama KV-cache reuse)
+    top_results.sort(key=_document_order_key)
+    return top_results
+
+
+def _format_context_chunks(results: List[dict]) -> List[str]:
+    """Extract context chunks with source attribution"""
+    return [
+        f"[From: {result['source_document']}] {result['text']}"
+        for result in results
+    ]
+
+
+async def _watch_disconnect(request: Request, cancel_event: threading.Event) -> None:
+    """Set cancel_event once the client disconnects"""
+    while not cancel_event.is_set():
+        if await request.is_disconnected():
+            cancel_event.set()
+            return
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+
+class _EventStream:
+    """
+    Generation events read in worker threads, one step at a time
+    close() waits for a step still running in a worker, so the stream can be
+    closed from the threadpool after the client goes away mid-step.
+    """
+
+    def __init__(self, events):
+        self._events = events
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            return next(self._events, None)
+
+    def close(self) -> None:
+        with self._lock:
+            self._events.close()
+
+
+def _document_order_key(result: dict):
+    """Sort key placing search results in source document and passage order"""
+    passage_id = result.get("id")
+    try:
+        position = int(passage_id)
+    except (TypeError, ValueError):
+        position = result.get("rank", 0)
+    return (result.get("source_document", ""), position)
+
 
 @router.post("/sessions", response_model=ChatSessionSchema, status_code=status.HTTP_201_CREATED)
 def create_chat_session(
@@ -134,15 +267,21 @@ def delete_chat_session(
     return {"message": "Chat session deleted successfully"}
 
 
-@router.post("/query", response_model=QueryResponse)
-def query_document(
-    query_data: QueryRequest,
-    db: Session = Depends(get_db)
-):
-    """Query document(s) using RAG (public mode - no authentication)"""
-    # Track timing
-    start_time = time.time()
-    query_timestamp = datetime.now()
+def _retrieve_for_query(
+    db: Session,
+    query_data: QueryRequest
+) -> Tuple[ChatSessionModel, List[dict], List[dict], Optional[str], List[dict]]:
+    """
+    Validate a query and gather what the prompt needs
+    Returns: session, top search results, recent chat history, conversation summary
+    and the effective search settings per document
+    """
+    # Only configured models may be selected explicitly
+    if query_data.model and query_data.model not in model_router.allowed_models():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Model not available. Allowed: {', '.join(model_router.allowed_models())}"
+        )
 
     # Verify session exists
     session = db.query(ChatSessionModel).filter(
@@ -155,95 +294,54 @@ def query_document(
             detail="Chat session not found"
         )
 
-    # Get document IDs for this session
-    doc_ids = []
-    if session.document_ids:
-        doc_ids = json.loads(session.document_ids)
-    elif session.document_id:
-        doc_ids = [session.document_id]
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Session has no associated documents"
-        )
-
-    # Get all documents
-    documents = db.query(DocumentModel).filter(
-        DocumentModel.id.in_(doc_ids)
-    ).all()
-
-    # Check all documents are ready
-    not_ready = [doc for doc in documents if doc.status != "ready"]
-    if not_ready:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Some documents are not ready: {', '.join([doc.title for doc in not_ready])}"
-        )
+    documents = _get_session_documents(db, session)
 
     # Search all documents and merge results
-    all_results = []
+    results_by_document = []
+    search_settings = []
     try:
         for document in documents:
-            search_results = leann_service.search(
+            search = leann_service.search_detailed(
                 document_id=str(document.id),
                 query=query_data.query,
-                top_k=query_data.top_k
+                top_k=query_data.top_k,
+                latency_budget_ms=query_data.latency_budget_ms,
+                filters={
+                    "page_from": query_data.page_from,
+                    "page_to": query_data.page_to,
+                    "section": query_data.section
+                }
             )
-            # Add document title to each result for context
-            for result in search_results:
-                result["source_document"] = document.title
-            all_results.extend(search_results)
+            results_by_document.append((document, search["results"]))
+            search_settings.append({"document_id": document.id, **search["search"]})
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error searching documents: {str(e)}"
         )
 
-    # Filter by similarity threshold if specified
-    from app.config import settings
-    threshold = query_data.min_similarity if query_data.min_similarity is not None else settings.leann_default_similarity_threshold
-    if threshold > 0.0:
-        all_results = [r for r in all_results if r.get("score", 0) >= threshold]
-
-    # Sort by score and take top_k results across all documents
-    all_results.sort(key=lambda x: x.get("score", 0), reverse=True)
-    top_results = all_results[:query_data.top_k]
-
-    # Extract context chunks with source attribution
-    context_chunks = [
-        f"[From: {result['source_document']}] {result['text']}"
-        for result in top_results
-    ]
+    top_results = _select_context(results_by_document, query_data.top_k, query_data.min_similarity)
 
-    # Get chat history
-    chat_history = db.query(ChatMessageModel).filter(
-        ChatMessageModel.session_id == session.id
-    ).order_by(ChatMessageModel.created_at.desc()).limit(10).all()
+    # Get chat history: rolling summary of older turns plus the most recent messages
+    chat_history_formatted = conversation_summary_service.recent_history(db, session)
+    conversation_summary = conversation_summary_service.summary_for(session)
 
-    chat_history_formatted = [
-        {"role": msg.role, "content": msg.content}
-        for msg in reversed(chat_history)
-    ]
+    return session, top_results, chat_history_formatted, conversation_summary, search_settings
 
-    # Query Ollama
-    try:
-        answer = ollama_service.chat(
-            query=query_data.query,
-            context_chunks=context_chunks,
-            chat_history=chat_history_formatted,
-            system_instruction=query_data.system_instruction
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error generating response: {str(e)}"
-        )
 
+def _save_turn(
+    db: Session,
+    session: ChatSessionModel,
+    query: str,
+    answer: str,
+    context_chunks: List[str]
+) -> ChatMessageModel:
+    """Save the user query and the assistant answer, returns the assistant message"""
     # Save user message
     user_message = ChatMessageModel(
         session_id=session.id,
         role="user",
-        content=query_data.query
+        content=query
     )
     db.add(user_message)
 
@@ -258,6 +356,75 @@ def query_document(
 
     db.commit()
     db.refresh(assistant_message)
+    return assistant_message
+
+
+def _generation_error(e: Exception) -> HTTPException:
+    """Map a generation failure to an HTTP error"""
+    if isinstance(e, SchedulerRejected):
+        return HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    if isinstance(e, GenerationCancelled):
+        return HTTPException(
+            status_code=HTTP_499_CLIENT_CLOSED_REQUEST,
+            detail="Client disconnected"
+        )
+    return HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=f"Error generating response: {str(e)}"
+    )
+
+
+def _stage_timings(retrieval_seconds: float, generation_seconds: float, queue_wait_seconds: float) -> dict:
+    """Per-stage latency of a query; generation excludes the admission queue wait"""
+    return {
+        "retrieval": retrieval_seconds,
+        "queue_wait": queue_wait_seconds,
+        "generation": max(0.0, generation_seconds - queue_wait_seconds),
+    }
+
+
+def _answer_query(
+    query_data: QueryRequest,
+    background_tasks: BackgroundTasks,
+    db: Session,
+    cancel_event: threading.Event
+) -> QueryResponse:
+    """Answer a query in a worker thread, aborting generation when cancel_event is set"""
+    # Track timing
+    start_time = time.time()
+    query_timestamp = datetime.now()
+
+    session, top_results, chat_history_formatted, conversation_summary, search_settings = _retrieve_for_query(db, query_data)
+    retrieval_seconds = time.time() - start_time
+
+    # Query Ollama (context and history are trimmed to the model's token budget)
+    generation_start = time.time()
+    try:
+        chat_result = ollama_service.chat_detailed(
+            query=query_data.query,
+            context_chunks=_format_context_chunks(top_results),
+            chat_history=chat_history_formatted,
+            system_instruction=query_data.system_instruction,
+            context_scores=[result.get("score", 0) for result in top_results],
+            conversation_summary=conversation_summary,
+            model=query_data.model,
+            cancel_event=cancel_event
+        )
+    except Exception as e:
+        raise _generation_error(e)
+    generation_seconds = time.time() - generation_start
+
+    answer = chat_result["answer"]
+    context_chunks = chat_result["context_chunks"]
+
+    assistant_message = _save_turn(db, session, query_data.query, answer, context_chunks)
+
+    # Fold older turns into the session summary after the response is sent
+    background_tasks.add_task(conversation_summary_service.update_session_summary, session.id)
 
     # Calculate timing
     response_timestamp = datetime.now()
@@ -270,5 +437,268 @@ def query_document(
         message_id=assistant_message.id,
         query_timestamp=query_timestamp,
         response_timestamp=response_timestamp,
-        elapsed_time=elapsed_time
+        elapsed_time=elapsed_time,
+        token_usage=chat_result["usage"],
+        model=chat_result["model"],
+        timings=_stage_timings(retrieval_seconds, generation_seconds, chat_result["queue_wait_seconds"]),
+        search=search_settings
+    )
+
+
+@router.post("/query", response_model=QueryResponse)
+async def query_document(
+    query_data: QueryRequest,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """
+    Query document(s) using RAG (public mode - no authentication)
+    Generation is aborted if the client disconnects before the answer is ready.
+    """
+    cancel_event = threading.Event()
+    watcher = asyncio.create_task(_watch_disconnect(request, cancel_event))
+    try:
+        return await run_in_threadpool(_answer_query, query_data, background_tasks, db, cancel_event)
+    finally:
+        watcher.cancel()
+
+
+@router.post("/query/stream")
+async def query_document_stream(
+    query_data: QueryRequest,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """
+    Query document(s) using RAG, streaming the answer (public mode - no authentication)
+    Returns newline-delimited JSON events: {"type": "token", "content": ...} for
+    each piece of the answer, then {"type": "done", ...} with the QueryResponse
+    fields, or {"type": "error", "detail": ...}. Generation is aborted if the
+    client disconnects.
+    """
+    start_time = time.time()
+    query_timestamp = datetime.now()
+
+    session, top_results, chat_history_formatted, conversation_summary, search_settings = await run_in_threadpool(
+        _retrieve_for_query, db, query_data
+    )
+    retrieval_seconds = time.time() - start_time
+
+    cancel_event = threading.Event()
+    events = _EventStream(ollama_service.chat_stream(
+        query=query_data.query,
+        context_chunks=_format_context_chunks(top_results),
+        chat_history=chat_history_formatted,
+        system_instruction=query_data.system_instruction,
+        context_scores=[result.get("score", 0) for result in top_results],
+        conversation_summary=conversation_summary,
+        model=query_data.model,
+        cancel_event=cancel_event
+    ))
+
+    # Wait for admission and the first token before sending headers, so a
+    # rejected request still gets a proper status code
+    watcher = asyncio.create_task(_watch_disconnect(request, cancel_event))
+    try:
+        first_event = await run_in_threadpool(events.next)
+    except Exception as e:
+        raise _generation_error(e)
+    finally:
+        watcher.cancel()
+
+    async def stream_events():
+        event = first_event
+        try:
+            while event is not None:
+                if event["type"] == "done":
+                    generation_seconds = time.time() - start_time - retrieval_seconds
+                    assistant_message = await run_in_threadpool(
+                        _save_turn, db, session, query_data.query, event["answer"], event["context_chunks"]
+                    )
+                    background_tasks.add_task(conversation_summary_service.update_session_summary, session.id)
+                    response = QueryResponse(
+                        answer=event["answer"],
+                        context_chunks=event["context_chunks"],
+                        session_id=session.id,
+                        message_id=assistant_message.id,
+                        query_timestamp=query_timestamp,
+                        response_timestamp=datetime.now(),
+                        elapsed_time=time.time() - start_time,
+                        token_usage=event["usage"],
+                        model=event["model"],
+                        timings=_stage_timings(retrieval_seconds, generation_seconds, event["queue_wait_seconds"]),
+                        search=search_settings
+                    )
+                    yield json.dumps({"type": "done", **response.model_dump(mode="json")}) + "\n"
+                else:
+                    yield json.dumps(event) + "\n"
+
+                if await request.is_disconnected():
+                    cancel_event.set()
+                event = await run_in_threadpool(events.next)
+
+        except GenerationCancelled:
+            return
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": f"Error generating response: {str(e)}"}) + "\n"
+        finally:
+            # Stops the generation and frees its slot if the stream ended early. The
+            # stream may be cancelled while a worker is still reading the next event:
+            # the close runs in the threadpool once that read returns, never here.
+            cancel_event.set()
+            asyncio.get_running_loop().run_in_executor(None, events.close)
+
+    return StreamingResponse(stream_events(), media_type="application/x-ndjson")
+
+
+@router.post("/batch", response_model=BatchQueryResponse)
+def batch_query(
+    batch_data: BatchQueryRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """
+    Ask many independent questions against one session or document set (public mode - no authentication)
+    Each document is searched once for all questions, documents are searched
+    concurrently and answers are generated with bounded parallelism at batch
+    priority. Questions are answered without chat history.
+    """
+    start_time = time.time()
+
+    if len(batch_data.questions) > settings.chat_batch_max_questions:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many questions (max {settings.chat_batch_max_questions})"
+        )
+
+    if batch_data.model and batch_data.model not in model_router.allowed_models():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Model not available. Allowed: {', '.join(model_router.allowed_models())}"
+        )
+
+    # Resolve documents from the session or the explicit document list
+    session = None
+    if batch_data.session_id is not None:
+        session = db.query(ChatSessionModel).filter(
+            ChatSessionModel.id == batch_data.session_id
+        ).first()
+        if not session:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Chat session not found"
+            )
+        documents = _get_session_documents(db, session)
+    elif batch_data.document_ids:
+        documents = _get_ready_documents(db, batch_data.document_ids)
+        if len(documents) != len(set(batch_data.document_ids)):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="One or more documents not found"
+            )
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Either session_id or document_ids must be provided"
+        )
+
+    if batch_data.persist_history and session is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="persist_history requires a session_id"
+        )
+
+    questions = batch_data.questions
+
+    # Search every document for all questions at once, documents in parallel
+    try:
+        with ThreadPoolExecutor(max_workers=min(len(documents), 4) or 1) as pool:
+            futures = [
+                (document, pool.submit(leann_service.search_batch, str(document.id), questions, batch_data.top_k))
+                for document in documents
+            ]
+            results_by_document = [(document, future.result()) for document, future in futures]
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error searching documents: {str(e)}"
+        )
+    retrieval_time = time.time() - start_time
+
+    def answer_question(index: int) -> BatchQuestionResult:
+        question_start = time.time()
+        top_results = _select_context(
+            [(document, batch_results[index]) for document, batch_results in results_by_document],
+            batch_data.top_k,
+            batch_data.min_similarity
+        )
+        try:
+            chat_result = ollama_service.chat_detailed(
+                query=questions[index],
+                context_chunks=_format_context_chunks(top_results),
+                system_instruction=batch_data.system_instruction,
+                context_scores=[result.get("score", 0) for result in top_results],
+                priority=PRIORITY_BATCH,
+                model=batch_data.model
+            )
+        except SchedulerRejected as e:
+            return BatchQuestionResult(
+                question=questions[index],
+                error=f"{e.status_code}: {str(e)}",
+                elapsed_time=time.time() - question_start
+            )
+        except Exception as e:
+            return BatchQuestionResult(
+                question=questions[index],
+                error=f"Error generating response: {str(e)}",
+                elapsed_time=time.time() - question_start
+            )
+
+        return BatchQuestionResult(
+            question=questions[index],
+            answer=chat_result["answer"],
+            context_chunks=chat_result["context_chunks"],
+            model=chat_result["model"],
+            elapsed_time=time.time() - question_start,
+            token_usage=chat_result["usage"]
+        )
+
+    # Generate answers with bounded parallelism
+    max_parallel = min(batch_data.max_parallel or settings.chat_batch_max_parallel, settings.chat_batch_max_parallel)
+    with ThreadPoolExecutor(max_workers=max_parallel) as pool:
+        results = list(pool.map(answer_question, range(len(questions))))
+
+    # Optionally save answered questions to the session history, in question order
+    if batch_data.persist_history:
+        assistant_messages = []
+        for result in results:
+            if result.answer is None:
+                continue
+            db.add(ChatMessageModel(
+                session_id=session.id,
+                role="user",
+                content=result.question
+            ))
+            assistant_message = ChatMessageModel(
+                session_id=session.id,
+                role="assistant",
+                content=result.answer,
+                context_chunks=json.dumps(result.context_chunks)
+            )
+            db.add(assistant_message)
+            assistant_messages.append((result, assistant_message))
+        db.commit()
+        for result, assistant_message in assistant_messages:
+            result.message_id = assistant_message.id
+
+        # Fold older turns into the session summary after the response is sent
+        background_tasks.add_task(conversation_summary_service.update_session_summary, session.id)
+
+    return BatchQueryResponse(
+        session_id=session.id if session else None,
+        results=results,
+        retrieval_time=retrieval_time,
+        elapsed_time=time.time() - start_time
     )
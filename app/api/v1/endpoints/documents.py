@@ -3,9 +3,11 @@ Documents router - Document upload, indexing, and management
 Optimized for Markdown documents
 """
 import os
+import threading
 import uuid
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status, BackgroundTasks
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, status, BackgroundTasks
 from sqlalchemy.orm import Session
 
 from app.models import (
@@ -13,6 +15,13 @@ from app.models import (
     Document as DocumentModel,
     DocumentSchema,
     DocumentUploadResponse,
+    DocumentChunk,
+    DocumentChunksResponse,
+    StorageModeRequest,
+    StorageModeResponse,
+    ReindexRequest,
+    ReindexStatus,
+    SessionLocal,
     get_db,
 )
 from app.services import get_current_active_user, leann_service
@@ -20,6 +29,21 @@ from app.config import settings
 
 router = APIRouter()
 
+# Progress of the bulk re-index; one runs at a time
+_reindex_lock = threading.Lock()
+_reindex_status = {
+    "running": False,
+    "total": 0,
+    "done": 0,
+    "failed": 0,
+    "text_cached": 0,
+    "chars_saved": 0,
+    "chunks_saved": 0,
+    "started_at": None,
+    "finished_at": None,
+    "errors": [],
+}
+
 
 def index_document_background(document_id: int, file_path: str, file_type: str, db_session):
     """Background task to index document"""
@@ -37,7 +61,8 @@ def index_document_background(document_id: int, file_path: str, file_type: str,
         result = leann_service.build_index(
             document_id=str(document_id),
             file_path=file_path,
-            file_type=file_type
+            file_type=file_type,
+            storage_mode=document.storage_mode
         )
 
         if result["status"] == "success":
@@ -55,6 +80,90 @@ def index_document_background(document_id: int, file_path: str, file_type: str,
         db_session.commit()
 
 
+def convert_index_background(document_id: int, storage_mode: str, db_session):
+    """
+    Background task to rebuild a document's index in another storage mode
+    The request claimed the rebuild (leann_service.claim_rebuild) before scheduling it.
+    """
+    document = db_session.query(DocumentModel).filter(DocumentModel.id == document_id).first()
+    if not document:
+        leann_service.release_rebuild(str(document_id))
+        return
+
+    result = leann_service.rebuild_index(
+        document_id=str(document_id),
+        file_path=document.file_path,
+        file_type=document.file_type,
+        storage_mode=storage_mode,
+        claimed=True
+    )
+
+    # The previous index keeps serving if the conversion fails, so the document stays ready
+    document.error_message = None if result["status"] == "success" else (
+        f"Storage conversion to {storage_mode} failed: {result.get('error', 'Unknown error')}"
+    )
+    db_session.commit()
+
+
+def reindex_documents_background(document_ids: List[int]):
+    """
+    Background task to rebuild the index of many documents, one after another
+    Indexed documents are rebuilt as a new index version and stay queryable meanwhile;
+    extracted text comes from the cache sidecars, so this is mostly embedding.
+    """
+    db_session = SessionLocal()
+    try:
+        for document_id in document_ids:
+            document = db_session.query(DocumentModel).filter(DocumentModel.id == document_id).first()
+            if not document:
+                continue
+
+            if leann_service.index_exists(str(document_id)):
+                result = leann_service.rebuild_index(
+                    document_id=str(document_id),
+                    file_path=document.file_path,
+                    file_type=document.file_type,
+                    storage_mode=document.storage_mode
+                )
+            else:
+                # Nothing to keep serving (e.g. a failed build): show the document as indexing
+                document.status = "indexing"
+                db_session.commit()
+                result = leann_service.build_index(
+                    document_id=str(document_id),
+                    file_path=document.file_path,
+                    file_type=document.file_type,
+                    storage_mode=document.storage_mode
+                )
+
+            if result["status"] == "success":
+                document.status = "ready"
+                document.leann_index_id = str(document_id)
+                document.error_message = None
+            else:
+                if not leann_service.index_exists(str(document_id)):
+                    document.status = "error"
+                document.error_message = f"Re-index failed: {result.get('error', 'Unknown error')}"
+            db_session.commit()
+
+            with _reindex_lock:
+                _reindex_status["done"] += 1
+                if result["status"] == "success":
+                    _reindex_status["text_cached"] += int(result.get("text_cached", False))
+                    boilerplate = result.get("boilerplate") or {}
+                    _reindex_status["chars_saved"] += boilerplate.get("chars_saved", 0)
+                    _reindex_status["chunks_saved"] += boilerplate.get("chunks_saved", 0)
+                else:
+                    _reindex_status["failed"] += 1
+                    _reindex_status["errors"].append({"document_id": document_id, "error": result.get("error")})
+
+    finally:
+        db_session.close()
+        with _reindex_lock:
+            _reindex_status["running"] = False
+            _reindex_status["finished_at"] = datetime.utcnow()
+
+
 @router.post("/upload", response_model=DocumentUploadResponse)
 async def upload_document(
     background_tasks: BackgroundTasks,
@@ -133,6 +242,52 @@ def list_documents(
     return documents
 
 
+@router.get("/reindex", response_model=ReindexStatus)
+def get_reindex_status():
+    """Progress of the bulk re-index (public mode - no authentication)"""
+    with _reindex_lock:
+        return ReindexStatus(**_reindex_status)
+
+
+@router.post("/reindex", response_model=ReindexStatus, status_code=status.HTTP_202_ACCEPTED)
+def reindex_documents(
+    background_tasks: BackgroundTasks,
+    request: Optional[ReindexRequest] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Rebuild the index of all documents, or of the given ones (public mode - no authentication)
+    Runs in the background; poll GET /documents/reindex for progress.
+    """
+    query = db.query(DocumentModel.id).filter(DocumentModel.status.in_(["ready", "error"]))
+    if request and request.document_ids:
+        query = query.filter(DocumentModel.id.in_(request.document_ids))
+    document_ids = [document_id for (document_id,) in query.order_by(DocumentModel.id).all()]
+
+    with _reindex_lock:
+        if _reindex_status["running"]:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A re-index is already running"
+            )
+        _reindex_status.update({
+            "running": True,
+            "total": len(document_ids),
+            "done": 0,
+            "failed": 0,
+            "text_cached": 0,
+            "chars_saved": 0,
+            "chunks_saved": 0,
+            "started_at": datetime.utcnow(),
+            "finished_at": None,
+            "errors": [],
+        })
+        response = ReindexStatus(**_reindex_status)
+
+    background_tasks.add_task(reindex_documents_background, document_ids)
+    return response
+
+
 @router.get("/{document_id}", response_model=DocumentSchema)
 def get_document(
     document_id: int,
@@ -152,6 +307,145 @@ def get_document(
     return document
 
 
+def _get_indexed_document(db: Session, document_id: int) -> DocumentModel:
+    """Get a document whose index can be read"""
+    document = db.query(DocumentModel).filter(
+        DocumentModel.id == document_id
+    ).first()
+
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+
+    if not leann_service.index_exists(str(document_id)):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Document index not available (status: {document.status})"
+        )
+
+    return document
+
+
+@router.get("/{document_id}/chunks", response_model=DocumentChunksResponse)
+def list_document_chunks(
+    document_id: int,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """List the indexed chunks of a document in order, paginated (public mode - no authentication)"""
+    document = _get_indexed_document(db, document_id)
+
+    try:
+        page = leann_service.get_passages(str(document_id), offset=offset, limit=limit)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error reading chunks: {str(e)}"
+        )
+
+    return DocumentChunksResponse(
+        document_id=document_id,
+        total=page["total"],
+        offset=offset,
+        limit=limit,
+        chunks=page["passages"],
+        boilerplate=leann_service.get_boilerplate(document.file_path)
+    )
+
+
+@router.get("/{document_id}/chunks/{chunk_id}", response_model=DocumentChunk)
+def get_document_chunk(
+    document_id: int,
+    chunk_id: str,
+    db: Session = Depends(get_db)
+):
+    """Get one indexed chunk by id, e.g. to resolve a citation (public mode - no authentication)"""
+    _get_indexed_document(db, document_id)
+
+    try:
+        return leann_service.get_passage(str(document_id), chunk_id)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chunk not found"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error reading chunk: {str(e)}"
+        )
+
+
+def _storage_mode_response(document: DocumentModel, message: str) -> StorageModeResponse:
+    return StorageModeResponse(
+        document_id=document.id,
+        storage_mode=leann_service.get_storage_mode(str(document.id)),
+        requested_mode=document.storage_mode,
+        converting=leann_service.is_rebuilding(str(document.id)),
+        message=message
+    )
+
+
+@router.get("/{document_id}/storage", response_model=StorageModeResponse)
+def get_storage_mode(
+    document_id: int,
+    db: Session = Depends(get_db)
+):
+    """Get the index storage mode of a document (public mode - no authentication)"""
+    document = _get_indexed_document(db, document_id)
+    return _storage_mode_response(document, "Conversion in progress" if leann_service.is_rebuilding(str(document_id)) else "OK")
+
+
+@router.post("/{document_id}/storage", response_model=StorageModeResponse, status_code=status.HTTP_202_ACCEPTED)
+def set_storage_mode(
+    document_id: int,
+    request: StorageModeRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """
+    Convert a document's index between pruned and full embeddings (public mode - no authentication)
+    The index is rebuilt in the background; the current one serves queries until it is replaced.
+    """
+    document = _get_indexed_document(db, document_id)
+
+    if document.status != "ready":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Document is not ready (status: {document.status})"
+        )
+    if leann_service.is_flat(str(document_id)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Document uses the exact flat index, which always stores its embeddings"
+        )
+    # Claimed before anything else, so concurrent requests cannot both schedule a conversion
+    if not leann_service.claim_rebuild(str(document_id)):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A rebuild of this index is already in progress"
+        )
+
+    converting = False
+    try:
+        # Remembered so that re-indexing keeps the choice
+        document.storage_mode = request.mode
+        db.commit()
+        converting = leann_service.get_storage_mode(str(document_id)) != request.mode
+    finally:
+        if not converting:
+            leann_service.release_rebuild(str(document_id))
+
+    if not converting:
+        return _storage_mode_response(document, f"Index already uses {request.mode} storage")
+
+    background_tasks.add_task(convert_index_background, document.id, request.mode, db)
+    return _storage_mode_response(document, f"Converting index to {request.mode} storage in the background")
+
+
 @router.delete("/{document_id}")
 def delete_document(
     document_id: int,
@@ -190,6 +484,7 @@ def delete_document(
     try:
         if os.path.exists(document.file_path):
             os.remove(document.file_path)
+        leann_service.delete_text_cache(document.file_path)
     except Exception as e:
         print(f"Error deleting file: {e}")
 
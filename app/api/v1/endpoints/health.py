@@ -2,7 +2,9 @@
 Health check endpoints
 """
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 from app.config import settings
+from app.services import generation_scheduler, model_manager, model_router, search_tuner
 
 router = APIRouter()
 
@@ -13,5 +15,29 @@ async def health_check():
     return {
         "status": "healthy",
         "app": settings.app_name,
-        "version": settings.app_version
+        "version": settings.app_version,
+        "models": model_manager.status()
+    }
+
+
+@router.get("/ready")
+async def readiness_check():
+    """Readiness check - 503 until the chat model has been preloaded"""
+    model_status = model_manager.status()
+    return JSONResponse(
+        status_code=200 if model_status["ready"] else 503,
+        content={
+            "status": "ready" if model_status["ready"] else "warming_up",
+            "models": model_status
+        }
+    )
+
+
+@router.get("/metrics")
+async def metrics():
+    """Runtime metrics (LLM generation queue, model routing, adaptive search effort)"""
+    return {
+        "generation": generation_scheduler.metrics(),
+        "routing": model_router.metrics(),
+        "search": search_tuner.metrics()
     }
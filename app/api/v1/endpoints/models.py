@@ -0,0 +1,43 @@
+"""
+Models router - Ollama model residency (warm-up, pin, evict)
+"""
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from app.models import User, ModelActionRequest
+from app.services import get_current_admin_user, model_manager
+
+router = APIRouter()
+
+
+@router.get("/")
+def get_models_status():
+    """Preload and residency status of Ollama models"""
+    return model_manager.status()
+
+
+@router.post("/pin")
+def pin_model(
+    action: ModelActionRequest,
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Load a model and keep it resident until evicted (admin only)"""
+    if not model_manager.pin(action.model):
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Error loading model {action.model}"
+        )
+    return model_manager.status()
+
+
+@router.post("/evict")
+def evict_model(
+    action: ModelActionRequest,
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Unload a model from Ollama memory (admin only)"""
+    if not model_manager.evict(action.model):
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Error evicting model {action.model}"
+        )
+    return model_manager.status()
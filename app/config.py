@@ -28,14 +28,55 @@ class Settings(BaseSettings):
     ollama_max_tokens: int = Field(default=8000, env="OLLAMA_MAX_TOKENS")
     ollama_num_gpu: int = Field(default=1, env="OLLAMA_NUM_GPU")
     ollama_num_threads: int = Field(default=8, env="OLLAMA_NUM_THREADS")
+    ollama_keep_alive: str = Field(default="30m", env="OLLAMA_KEEP_ALIVE")  # Duration ("30m") or seconds; -1 keeps the model loaded
+    ollama_num_ctx: int = Field(default=8192, env="OLLAMA_NUM_CTX")  # Context window requested from Ollama (prompt + answer)
+    ollama_context_budget_tokens: int = Field(default=3072, env="OLLAMA_CONTEXT_BUDGET_TOKENS")  # Max prompt tokens, 0 = fill num_ctx minus answer reserve
+    ollama_history_messages: int = Field(default=4, env="OLLAMA_HISTORY_MESSAGES")  # Recent messages sent verbatim, older ones are summarized
+    ollama_tokenizer: str = Field(default="", env="OLLAMA_TOKENIZER")  # Optional HF tokenizer (e.g. Qwen/Qwen2.5-7B-Instruct) for exact counts
+    ollama_chars_per_token: float = Field(default=3.5, env="OLLAMA_CHARS_PER_TOKEN")  # Estimator seed when no tokenizer is set
+    ollama_model_tiers: str = Field(default="", env="OLLAMA_MODEL_TIERS")  # Comma separated, smallest first; 2+ models enable routing
+    ollama_router_max_words: int = Field(default=12, env="OLLAMA_ROUTER_MAX_WORDS")  # Queries up to this length count as short
+    ollama_router_min_score_margin: float = Field(default=0.05, env="OLLAMA_ROUTER_MIN_SCORE_MARGIN")  # Relative top1-top2 retrieval score gap
+    ollama_preload_on_startup: bool = Field(default=True, env="OLLAMA_PRELOAD_ON_STARTUP")
+    ollama_preload_models: str = Field(default="", env="OLLAMA_PRELOAD_MODELS")  # Comma separated, empty = model tiers or ollama_model
+    ollama_pinned_models: str = Field(default="", env="OLLAMA_PINNED_MODELS")  # Comma separated, kept loaded until evicted
+    ollama_evict_models: str = Field(default="", env="OLLAMA_EVICT_MODELS")  # Comma separated, unloaded at startup
+    ollama_keep_alive_refresh_seconds: int = Field(default=300, env="OLLAMA_KEEP_ALIVE_REFRESH_SECONDS")  # 0 disables refresh
+    ollama_summary_enabled: bool = Field(default=True, env="OLLAMA_SUMMARY_ENABLED")
+    ollama_summary_model: str = Field(default="", env="OLLAMA_SUMMARY_MODEL")  # Cheap model for conversation summaries, empty = ollama_model
+    ollama_summary_max_tokens: int = Field(default=300, env="OLLAMA_SUMMARY_MAX_TOKENS")
+    ollama_max_concurrency: int = Field(default=2, env="OLLAMA_MAX_CONCURRENCY")  # Generations sent to Ollama at once
+    ollama_max_queue: int = Field(default=16, env="OLLAMA_MAX_QUEUE")  # Requests allowed to wait for a slot, beyond that 429
+    ollama_queue_timeout: float = Field(default=60.0, env="OLLAMA_QUEUE_TIMEOUT")  # Max seconds waiting for a slot, beyond that 503
 
     # LEANN Configuration
     leann_index_path: str = Field(default="./data/leann_index", env="LEANN_INDEX_PATH")
     leann_backend: str = Field(default="hnsw", env="LEANN_BACKEND")
     leann_embedding_batch_size: int = Field(default=32, env="LEANN_EMBEDDING_BATCH_SIZE")
     leann_use_gpu: bool = Field(default=True, env="LEANN_USE_GPU")
-    leann_num_threads: int = Field(default=4, env="LEANN_NUM_THREADS")
+    leann_num_threads: int = Field(default=4, env="LEANN_NUM_THREADS")  # Torch threads for query-time embedding
+    leann_embedding_engine: str = Field(default="torch", env="LEANN_EMBEDDING_ENGINE")  # torch or onnx (int8 ONNX Runtime, see export_onnx.py)
+    leann_onnx_model_dir: str = Field(default="./data/onnx/contriever", env="LEANN_ONNX_MODEL_DIR")
+    leann_build_workers: int = Field(default=0, env="LEANN_BUILD_WORKERS")  # Processes embedding passages in CPU builds, 0 = in-process (LEANN default)
+    leann_build_threads: int = Field(default=0, env="LEANN_BUILD_THREADS")  # Cores split between build workers, 0 = all but LEANN_NUM_THREADS
     leann_default_similarity_threshold: float = Field(default=0.0, env="LEANN_DEFAULT_SIMILARITY_THRESHOLD")
+    leann_searcher_cache_size: int = Field(default=8, env="LEANN_SEARCHER_CACHE_SIZE")  # Open index searchers kept in memory
+    leann_flat_max_chunks: int = Field(default=64, env="LEANN_FLAT_MAX_CHUNKS")  # Documents up to this many chunks use exact flat search, 0 = always HNSW
+    leann_full_embeddings_max_chunks: int = Field(default=0, env="LEANN_FULL_EMBEDDINGS_MAX_CHUNKS")  # HNSW documents up to this many chunks keep full embeddings, larger ones are pruned
+    leann_shard_chunks: int = Field(default=0, env="LEANN_SHARD_CHUNKS")  # HNSW documents with more chunks are split into shards of about this many, 0 = never shard
+    leann_max_shards: int = Field(default=8, env="LEANN_MAX_SHARDS")  # Upper bound on shards per document
+    leann_search_complexity: int = Field(default=64, env="LEANN_SEARCH_COMPLEXITY")  # HNSW search candidate list size (ef) without a latency budget
+    leann_search_complexity_levels: str = Field(default="16,32,64,128", env="LEANN_SEARCH_COMPLEXITY_LEVELS")  # Complexities the latency budget chooses from
+    leann_search_latency_budget_ms: float = Field(default=0.0, env="LEANN_SEARCH_LATENCY_BUDGET_MS")  # Default per-search budget, 0 = fixed complexity
+    leann_vector_dtype: str = Field(default="float32", env="LEANN_VECTOR_DTYPE")  # Stored embedding type of flat indices: float32, float16 or int8 (per-dimension scales); HNSW indices always store float32
+    leann_projection_dims: int = Field(default=0, env="LEANN_PROJECTION_DIMS")  # Project stored embeddings to this many dimensions (flat and full-embedding indices), 0 = keep all
+    leann_projection_method: str = Field(default="pca", env="LEANN_PROJECTION_METHOD")  # pca (fitted per document), random (fixed orthogonal) or truncate (Matryoshka models)
+    leann_strip_boilerplate: bool = Field(default=True, env="LEANN_STRIP_BOILERPLATE")  # Remove PDF header/footer lines repeated across pages before chunking
+    leann_boilerplate_min_page_fraction: float = Field(default=0.6, env="LEANN_BOILERPLATE_MIN_PAGE_FRACTION")  # Share of pages a line must repeat on to count as header/footer
+
+    # Batch chat queries
+    chat_batch_max_questions: int = Field(default=100, env="CHAT_BATCH_MAX_QUESTIONS")
+    chat_batch_max_parallel: int = Field(default=4, env="CHAT_BATCH_MAX_PARALLEL")  # Concurrent generations per batch
 
     # Database
     database_url: str = Field(default="sqlite:///./rag_app.db", env="DATABASE_URL")
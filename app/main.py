@@ -10,6 +10,7 @@ import os
 from app.config import settings
 from app.models import init_db
 from app.api.v1.api import api_router
+from app.services import model_manager
 
 # Configure logging
 logging.basicConfig(
@@ -105,11 +106,15 @@ async def startup_event():
     logger.info(f"LEANN Index Path: {settings.leann_index_path}")
     logger.info(f"Database: {settings.database_url}")
 
+    # Load models in the background so the first chat does not pay the model load
+    model_manager.start()
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Shutdown tasks"""
     logger.info(f"Shutting down {settings.app_name}")
+    model_manager.stop()
 
 
 if __name__ == "__main__":
@@ -1,15 +1,18 @@
 """
 Database models and schemas
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, Session
 from app.config import settings
 from app.models.database import Base, User, Document, ChatSession, ChatMessage
 from app.models.schemas import (
     UserCreate, UserLogin, UserSchema, Token, TokenData,
-    DocumentSchema, DocumentUploadResponse,
+    DocumentSchema, DocumentUploadResponse, DocumentChunk, DocumentChunksResponse,
+    StorageModeRequest, StorageModeResponse, ReindexRequest, ReindexStatus,
     ChatSessionCreate, ChatSessionSchema, ChatMessageSchema,
-    QueryRequest, QueryResponse
+    QueryRequest, QueryResponse,
+    BatchQueryRequest, BatchQueryResponse, BatchQuestionResult,
+    ModelActionRequest
 )
 
 # Create engine
@@ -25,6 +28,22 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 def init_db():
     """Initialize database"""
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+
+
+def _add_missing_columns():
+    """Add nullable columns introduced after a table was created (create_all skips existing tables)"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
 
 
 def get_db():
@@ -39,8 +58,11 @@ def get_db():
 __all__ = [
     "User", "Document", "ChatSession", "ChatMessage",
     "UserCreate", "UserLogin", "UserSchema", "Token", "TokenData",
-    "DocumentSchema", "DocumentUploadResponse",
+    "DocumentSchema", "DocumentUploadResponse", "DocumentChunk", "DocumentChunksResponse",
+    "StorageModeRequest", "StorageModeResponse", "ReindexRequest", "ReindexStatus",
     "ChatSessionCreate", "ChatSessionSchema", "ChatMessageSchema",
     "QueryRequest", "QueryResponse",
+    "BatchQueryRequest", "BatchQueryResponse", "BatchQuestionResult",
+    "ModelActionRequest",
     "get_db", "init_db"
 ]
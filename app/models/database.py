@@ -40,6 +40,7 @@ class Document(Base):
     status = Column(String(50), default="pending")  # pending, indexing, ready, error
     error_message = Column(Text, nullable=True)
     leann_index_id = Column(String(100), nullable=True)
+    storage_mode = Column(String(20), nullable=True)  # pruned, full; None = size-based policy
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # Nullable for public mode
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -58,6 +59,8 @@ class ChatSession(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # Nullable for public mode
     document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
     document_ids = Column(Text, nullable=True)  # JSON array of document IDs for multi-doc
+    summary = Column(Text, nullable=True)  # Rolling summary of older turns
+    summary_until_message_id = Column(Integer, nullable=True)  # Last message folded into summary
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -2,7 +2,7 @@
 Pydantic schemas for API requests and responses
 """
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime
 
 
@@ -60,6 +60,7 @@ class DocumentSchema(DocumentBase):
     status: str
     error_message: Optional[str] = None
     leann_index_id: Optional[str] = None
+    storage_mode: Optional[str] = None
     owner_id: Optional[int] = None  # Nullable for public mode
     created_at: datetime
     updated_at: datetime
@@ -68,6 +69,52 @@ class DocumentSchema(DocumentBase):
         from_attributes = True
 
 
+class DocumentChunk(BaseModel):
+    id: str
+    text: str
+    metadata: Dict[str, Any] = {}
+
+
+class DocumentChunksResponse(BaseModel):
+    document_id: int
+    total: int
+    offset: int
+    limit: int
+    chunks: List[DocumentChunk]
+    boilerplate: Optional[Dict[str, Any]] = None  # PDF header/footer lines removed before chunking, and the savings
+
+
+class StorageModeRequest(BaseModel):
+    mode: Literal["pruned", "full"] = Field(
+        ..., description="pruned: recompute embeddings at search time (small index), full: keep them (faster search)"
+    )
+
+
+class StorageModeResponse(BaseModel):
+    document_id: int
+    storage_mode: Optional[str] = None  # Mode of the index on disk
+    requested_mode: Optional[str] = None  # Per-document choice, None = size-based policy
+    converting: bool
+    message: str
+
+
+class ReindexRequest(BaseModel):
+    document_ids: Optional[List[int]] = Field(None, description="Documents to re-index (default: all ready or failed documents)")
+
+
+class ReindexStatus(BaseModel):
+    running: bool
+    total: int
+    done: int
+    failed: int
+    text_cached: int  # Rebuilds that read the extracted text cache instead of parsing the upload
+    chars_saved: int = 0  # Characters of repeated PDF headers/footers removed before chunking
+    chunks_saved: int = 0  # Chunks those characters would have added
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    errors: List[Dict[str, Any]] = []
+
+
 # Chat schemas
 class ChatSessionCreate(BaseModel):
     title: Optional[str] = None
@@ -91,6 +138,7 @@ class ChatSessionSchema(BaseModel):
     user_id: Optional[int] = None  # Nullable for public mode
     document_id: int
     document_ids: Optional[str] = None
+    summary: Optional[str] = None
     created_at: datetime
     updated_at: datetime
     messages: List[ChatMessageSchema] = []
@@ -105,6 +153,13 @@ class QueryRequest(BaseModel):
     top_k: int = Field(default=5, ge=1, le=20)
     min_similarity: Optional[float] = Field(None, description="Minimum similarity threshold (0.0-1.0)", ge=0.0, le=1.0)
     system_instruction: Optional[str] = Field(None, description="Custom system instruction for this query")
+    model: Optional[str] = Field(None, description="Ollama model for this query (overrides automatic routing)")
+    latency_budget_ms: Optional[float] = Field(
+        None, ge=0, description="Per-document search latency budget in ms (default LEANN_SEARCH_LATENCY_BUDGET_MS, 0 = fixed effort)"
+    )
+    page_from: Optional[int] = Field(None, ge=1, description="Only search passages on or after this page")
+    page_to: Optional[int] = Field(None, ge=1, description="Only search passages on or before this page")
+    section: Optional[str] = Field(None, description="Only search passages whose heading path starts with this (case-insensitive)")
 
 
 class QueryResponse(BaseModel):
@@ -115,3 +170,42 @@ class QueryResponse(BaseModel):
     query_timestamp: datetime
     response_timestamp: datetime
     elapsed_time: float
+    token_usage: Optional[Dict[str, Any]] = None
+    model: Optional[str] = None
+    timings: Optional[Dict[str, float]] = None  # Seconds per stage: retrieval, queue_wait, generation
+    search: Optional[List[Dict[str, Any]]] = None  # Effective search settings per document: backend, shards, candidates, complexity, budget_ms, elapsed_ms
+
+
+class BatchQueryRequest(BaseModel):
+    session_id: Optional[int] = Field(None, description="Session whose documents are queried")
+    document_ids: Optional[List[int]] = Field(None, description="Documents to query when no session is given")
+    questions: List[str] = Field(..., min_length=1)
+    top_k: int = Field(default=5, ge=1, le=20)
+    min_similarity: Optional[float] = Field(None, description="Minimum similarity threshold (0.0-1.0)", ge=0.0, le=1.0)
+    system_instruction: Optional[str] = Field(None, description="Custom system instruction for all questions")
+    model: Optional[str] = Field(None, description="Ollama model for all questions (overrides automatic routing)")
+    max_parallel: Optional[int] = Field(None, description="Max concurrent generations for this batch", ge=1)
+    persist_history: bool = Field(default=False, description="Save questions and answers to the session history")
+
+
+class BatchQuestionResult(BaseModel):
+    question: str
+    answer: Optional[str] = None
+    context_chunks: List[str] = []
+    error: Optional[str] = None
+    model: Optional[str] = None
+    message_id: Optional[int] = None
+    elapsed_time: float
+    token_usage: Optional[Dict[str, Any]] = None
+
+
+class BatchQueryResponse(BaseModel):
+    session_id: Optional[int] = None
+    results: List[BatchQuestionResult]
+    retrieval_time: float
+    elapsed_time: float
+
+
+# Model management schemas
+class ModelActionRequest(BaseModel):
+    model: str = Field(..., description="Ollama model name, e.g. qwen2.5:7b-instruct")
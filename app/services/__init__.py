@@ -1,14 +1,36 @@
 """
 Service modules
 """
-from app.services.auth import get_current_user, get_current_active_user, get_password_hash
+from app.services.auth import (
+    get_current_user,
+    get_current_active_user,
+    get_current_admin_user,
+    get_password_hash,
+)
 from app.services.leann_service import leann_service
 from app.services.ollama_service import ollama_service
+from app.services.generation_scheduler import (
+    generation_scheduler,
+    SchedulerRejected,
+    GenerationCancelled,
+)
+from app.services.conversation_summary import conversation_summary_service
+from app.services.model_manager import model_manager
+from app.services.model_router import model_router
+from app.services.search_tuner import search_tuner
 
 __all__ = [
     "get_current_user",
     "get_current_active_user",
+    "get_current_admin_user",
     "get_password_hash",
     "leann_service",
-    "ollama_service"
+    "ollama_service",
+    "generation_scheduler",
+    "SchedulerRejected",
+    "GenerationCancelled",
+    "conversation_summary_service",
+    "model_manager",
+    "model_router",
+    "search_tuner"
 ]
@@ -85,6 +85,13 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
     return current_user
 
 
+async def get_current_admin_user(current_user: User = Depends(get_current_active_user)) -> User:
+    """Get current user, requiring admin rights"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return current_user
+
+
 async def get_optional_api_key(
     api_key: Optional[str] = None,
     db: Session = Depends(get_db)
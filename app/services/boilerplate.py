@@ -0,0 +1,110 @@
+"""
+Boilerplate - repeated PDF page headers and footers
+Multi-page invoices and contracts repeat the same header and footer lines on
+every page. A line that recurs near the top or bottom of a large fraction of
+the pages is kept on the first page where it appears and removed from the
+others, before chunking and embedding. Only the uninterrupted run of such
+lines at the very top and bottom of a page is removed, so table headings
+and totals below a per-page line (an invoice number) stay in place.
+
+Lines without letters (amounts, dates, bare numbers) are never boilerplate.
+Page counters ("Página 2 de 5", "Page 3", "2/5 ...") are compared with their
+numbers masked; every other line has to repeat exactly.
+"""
+import math
+import re
+from typing import List, Dict, Any, Tuple
+
+# Version of the rules below; cached texts stripped with other rules are parsed again
+RULES_VERSION = 2
+
+# Documents with fewer pages are left alone: two pages sharing a line prove little
+MIN_PAGES = 3
+
+# Non-empty lines at the top and at the bottom of a page considered header / footer
+EDGE_LINES = 4
+
+# Lines with at most this many words besides numbers can be page counters
+MAX_COUNTER_WORDS = 2
+
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+_LETTER = re.compile(r"[^\W\d_]")
+_PAGE_COUNTER = re.compile(
+    r"\b(p[áa]g(ina)?|page|seite|p)\b\.?|\d+\s*(/|\bde\b|\bof\b|\bvon\b)\s*\d+",
+    re.IGNORECASE
+)
+
+
+def _line_key(line: str) -> str:
+    """
+    Comparison form of a line: whitespace collapsed and casefolded, numbers masked
+    on page counters; empty for lines that can never be boilerplate
+    """
+    line = _SPACES.sub(" ", line.strip()).casefold()
+    if not _LETTER.search(line):
+        return ""
+    words = [word for word in line.split(" ") if not _DIGITS.search(word)]
+    if len(words) <= MAX_COUNTER_WORDS and _PAGE_COUNTER.search(line):
+        line = _DIGITS.sub("#", line)
+    return line
+
+
+def _edge_runs(lines: List[str], repeated: set) -> List[int]:
+    """Indices of the repeated lines forming the top and bottom runs of a page"""
+    non_empty = [i for i, line in enumerate(lines) if line.strip()]
+    run = []
+    for edge in (non_empty[:EDGE_LINES], non_empty[::-1][:EDGE_LINES]):
+        for i in edge:
+            if _line_key(lines[i]) not in repeated:
+                break
+            run.append(i)
+    return sorted(set(run))
+
+
+def find_repeated_lines(pages: List[str], min_page_fraction: float) -> List[str]:
+    """Keys of the lines near a page edge found on at least min_page_fraction of the pages"""
+    if len(pages) < MIN_PAGES:
+        return []
+    counts: Dict[str, int] = {}
+    for page in pages:
+        non_empty = [line for line in page.split("\n") if line.strip()]
+        edges = non_empty[:EDGE_LINES] + non_empty[-EDGE_LINES:]
+        # Each page counts once, however often the line appears on it
+        for key in {_line_key(line) for line in edges}:
+            if key:
+                counts[key] = counts.get(key, 0) + 1
+    threshold = max(2, math.ceil(min_page_fraction * len(pages)))
+    return sorted(key for key, count in counts.items() if count >= threshold)
+
+
+def strip_boilerplate(pages: List[str], min_page_fraction: float) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Remove repeated header / footer lines from the pages, keeping them on the first page they appear on
+    Returns: (page texts, stats with the removed lines and characters saved)
+    """
+    repeated = set(find_repeated_lines(pages, min_page_fraction))
+    if not repeated:
+        return pages, {"lines": [], "chars_saved": 0}
+
+    seen = set()
+    examples: Dict[str, str] = {}
+    stripped = []
+    chars_saved = 0
+    for page in pages:
+        lines = page.split("\n")
+        drop = set()
+        first_seen = set()
+        for i in _edge_runs(lines, repeated):
+            key = _line_key(lines[i])
+            if key in seen:
+                drop.add(i)
+                chars_saved += len(lines[i]) + 1
+            else:
+                first_seen.add(key)
+                examples.setdefault(key, lines[i].strip())
+        # Only later pages lose the line: the page it first appears on keeps every copy
+        seen |= first_seen
+        stripped.append("\n".join(line for i, line in enumerate(lines) if i not in drop))
+
+    return stripped, {"lines": sorted(examples.values()), "chars_saved": chars_saved}
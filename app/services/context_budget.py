@@ -0,0 +1,174 @@
+"""
+Context Budget - token accounting for RAG prompts
+Fits retrieved context and chat history into the model's context window
+"""
+import logging
+import threading
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Tokens added by the chat template around each message (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+# Tokens the chat template adds to prime the assistant reply
+REPLY_PRIMER_TOKENS = 3
+# Headroom kept free for estimation error
+SAFETY_MARGIN_TOKENS = 64
+# Default cap on prompt tokens: instructions, the best few chunks and recent history.
+# Filling the whole window only adds low-scoring chunks and prefill time
+DEFAULT_PROMPT_BUDGET_TOKENS = 3072
+
+
+class TokenCounter:
+    """Counts tokens with the model tokenizer if configured, otherwise a calibrated estimate"""
+
+    def __init__(self, tokenizer_name: str = "", chars_per_token: float = 3.5):
+        self.chars_per_token = chars_per_token
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+        if tokenizer_name:
+            try:
+                from transformers import AutoTokenizer
+                self._tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+            except Exception as e:
+                logger.warning(f"Tokenizer {tokenizer_name} unavailable, using estimator: {e}")
+
+    @property
+    def exact(self) -> bool:
+        """True when counting with the real tokenizer"""
+        return self._tokenizer is not None
+
+    def count(self, text: str) -> int:
+        """Count tokens in a piece of text"""
+        if not text:
+            return 0
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text, add_special_tokens=False))
+        return int(len(text) / self.chars_per_token) + 1
+
+    def count_message(self, content: str) -> int:
+        """Count tokens for one chat message including template overhead"""
+        return self.count(content) + MESSAGE_OVERHEAD_TOKENS
+
+    def calibrate(self, prompt_chars: int, observed_tokens: int) -> None:
+        """
+        Adjust the chars-per-token ratio from a prompt token count reported by Ollama
+        Observations far below the estimate are skipped: with a warm prompt cache
+        Ollama only reports the tokens it actually had to evaluate.
+        """
+        if self.exact or prompt_chars <= 0 or observed_tokens <= 0:
+            return
+
+        observed_ratio = prompt_chars / observed_tokens
+        if not 1.5 <= observed_ratio <= 8.0:
+            return
+
+        with self._lock:
+            estimated_tokens = prompt_chars / self.chars_per_token
+            if observed_tokens < estimated_tokens * 0.5:
+                return
+            self.chars_per_token = 0.9 * self.chars_per_token + 0.1 * observed_ratio
+
+
+class ContextBudgetManager:
+    """Selects context chunks and history turns that fit the prompt budget"""
+
+    def __init__(
+        self,
+        counter: TokenCounter,
+        num_ctx: int,
+        max_output_tokens: int,
+        budget_tokens: int = DEFAULT_PROMPT_BUDGET_TOKENS,
+        history_messages: int = 5
+    ):
+        """budget_tokens: cap on prompt tokens, 0 fills the context window"""
+        self.counter = counter
+        self.num_ctx = num_ctx
+        self.max_output_tokens = max_output_tokens
+        self.budget_tokens = budget_tokens
+        self.history_messages = history_messages
+
+    def prompt_budget(self) -> int:
+        """Tokens available for the prompt after reserving room for the answer"""
+        output_reserve = min(self.max_output_tokens, self.num_ctx // 2)
+        available = self.num_ctx - output_reserve - SAFETY_MARGIN_TOKENS
+        if self.budget_tokens > 0:
+            return min(self.budget_tokens, available)
+        return available
+
+    def assemble(
+        self,
+        instruction: str,
+        query: str,
+        context_chunks: List[str],
+        context_scores: Optional[List[float]] = None,
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        summary: str = ""
+    ) -> Dict[str, Any]:
+        """
+        Fit context and history into the prompt budget
+        The conversation summary is always kept. Context chunks are taken
+        greedily by score (chunks that do not fit are skipped) and keep their
+        given order; history uses what is left, newest turn first, so it is
+        always trimmed before context.
+        """
+        budget = self.prompt_budget()
+        instruction_tokens = self.counter.count_message(instruction)
+        query_tokens = self.counter.count_message(query)
+        summary_tokens = self.counter.count_message(summary) if summary else 0
+        fixed_tokens = instruction_tokens + query_tokens + summary_tokens + REPLY_PRIMER_TOKENS
+        remaining = budget - fixed_tokens
+
+        # Context: greedy by score
+        if context_scores is None or len(context_scores) != len(context_chunks):
+            context_scores = [float(len(context_chunks) - i) for i in range(len(context_chunks))]
+
+        chunk_tokens = [self.counter.count(chunk) + 2 for chunk in context_chunks]  # + separator
+        by_score = sorted(range(len(context_chunks)), key=lambda i: context_scores[i], reverse=True)
+        selected = set()
+        context_tokens = 0
+        for i in by_score:
+            if chunk_tokens[i] <= remaining - context_tokens:
+                selected.add(i)
+                context_tokens += chunk_tokens[i]
+        remaining -= context_tokens
+
+        # History: newest first, stop at the first turn that does not fit
+        recent = [
+            msg for msg in (chat_history or [])
+            if msg.get('role') in ('user', 'assistant')
+        ][-self.history_messages:] if self.history_messages > 0 else []
+        kept_history = []
+        history_tokens = 0
+        for msg in reversed(recent):
+            tokens = self.counter.count_message(msg.get('content', ''))
+            if tokens > remaining - history_tokens:
+                break
+            kept_history.insert(0, msg)
+            history_tokens += tokens
+
+        prompt_tokens = fixed_tokens + context_tokens + history_tokens
+        num_predict = max(1, min(self.max_output_tokens, self.num_ctx - prompt_tokens))
+
+        return {
+            "context_chunks": [chunk for i, chunk in enumerate(context_chunks) if i in selected],
+            "chat_history": kept_history,
+            "num_predict": num_predict,
+            "usage": {
+                "num_ctx": self.num_ctx,
+                "budget_tokens": budget,
+                "prompt_tokens": prompt_tokens,
+                "instruction_tokens": instruction_tokens,
+                "query_tokens": query_tokens,
+                "summary_tokens": summary_tokens,
+                "context_tokens": context_tokens,
+                "history_tokens": history_tokens,
+                "num_predict": num_predict,
+                "context_chunks_used": len(selected),
+                "context_chunks_dropped": len(context_chunks) - len(selected),
+                "history_messages_used": len(kept_history),
+                "history_messages_dropped": len(recent) - len(kept_history),
+                "exact_token_count": self.counter.exact
+            }
+        }
@@ -0,0 +1,95 @@
+"""
+Conversation Summary Service - rolling per-session summaries
+Older turns are folded into ChatSession.summary so prompts stay bounded
+"""
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.models import SessionLocal, ChatSession, ChatMessage
+from app.services.ollama_service import ollama_service
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationSummaryService:
+    """Incrementally summarizes chat sessions after each turn"""
+
+    # Max messages folded per update; a backlog is caught up over several turns
+    MAX_MESSAGES_PER_UPDATE = 20
+
+    def __init__(self):
+        self.enabled = settings.ollama_summary_enabled
+        self.recent_messages = settings.ollama_history_messages
+        self._locks: Dict[int, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _session_lock(self, session_id: int) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(session_id, threading.Lock())
+
+    def recent_history(self, db, session: ChatSession) -> List[Dict[str, str]]:
+        """Recent messages sent verbatim alongside the summary"""
+        query = db.query(ChatMessage).filter(ChatMessage.session_id == session.id)
+        if self.enabled and session.summary_until_message_id:
+            query = query.filter(ChatMessage.id > session.summary_until_message_id)
+        messages = query.order_by(ChatMessage.id.desc()).limit(self.recent_messages).all()
+        return [
+            {"role": msg.role, "content": msg.content}
+            for msg in reversed(messages)
+        ]
+
+    def summary_for(self, session: ChatSession) -> Optional[str]:
+        """Summary to include in the prompt, if any"""
+        return session.summary if self.enabled else None
+
+    def update_session_summary(self, session_id: int) -> None:
+        """
+        Fold messages older than the recent window into the session summary
+        Meant to run as a background task after a turn is saved.
+        """
+        if not self.enabled:
+            return
+
+        lock = self._session_lock(session_id)
+        if not lock.acquire(blocking=False):
+            return  # An update for this session is already running
+
+        db = SessionLocal()
+        try:
+            session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+            if not session:
+                return
+
+            query = db.query(ChatMessage).filter(ChatMessage.session_id == session_id)
+            if session.summary_until_message_id:
+                query = query.filter(ChatMessage.id > session.summary_until_message_id)
+            pending = query.order_by(ChatMessage.id.asc()).all()
+
+            # Keep the recent window verbatim
+            to_fold = pending[:-self.recent_messages] if self.recent_messages > 0 else pending
+            to_fold = to_fold[:self.MAX_MESSAGES_PER_UPDATE]
+            if not to_fold:
+                return
+
+            summary = ollama_service.summarize_conversation(
+                previous_summary=session.summary,
+                messages=[{"role": msg.role, "content": msg.content} for msg in to_fold]
+            )
+
+            if summary:
+                session.summary = summary
+                session.summary_until_message_id = to_fold[-1].id
+                db.commit()
+
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Error updating summary for chat session {session_id}: {e}")
+        finally:
+            db.close()
+            lock.release()
+
+
+# Singleton instance
+conversation_summary_service = ConversationSummaryService()
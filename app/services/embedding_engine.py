@@ -0,0 +1,252 @@
+"""
+Embedding Engine - torch or ONNX Runtime embeddings for the contriever model
+The default engine computes embeddings with LEANN (sentence-transformers on
+PyTorch). The "onnx" engine runs the same model exported to ONNX with int8
+dynamic quantization, which is several times faster and lighter on CPU-only
+hosts. An exported model is only used once its parity check against the
+torch embeddings has passed (see export_onnx.py).
+"""
+import json
+import logging
+import os
+import threading
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+ENGINES = ("torch", "onnx")
+
+# Files of an exported model directory (tokenizer files are saved next to them)
+ONNX_MODEL_FILE = "model.int8.onnx"
+ENGINE_INFO_FILE = "engine.json"
+PARITY_FILE = "parity.json"
+
+MAX_SEQUENCE_LENGTH = 512
+
+# Sentences for the parity check when no passages are given (Spanish invoices and English text)
+PARITY_SAMPLE_TEXTS = [
+    "¿Cuál es el importe total de la factura?",
+    "Importe total: 84,27 € (IVA incluido)",
+    "Titular del contrato: María García López, CIF B12345678",
+    "Potencia contratada P1: 4,6 kW; P2: 4,6 kW",
+    "Fecha de emisión 12/03/2024, periodo de facturación del 01/02/2024 al 29/02/2024",
+    "Lectura del contador: 12.345 kWh, consumo del periodo 312 kWh",
+    "El alquiler del equipo de medida se factura por días.",
+    "Bono social: descuento del 25% sobre el término de energía",
+    "What is the termination notice period of the contract?",
+    "Either party may terminate this agreement with thirty days written notice.",
+    "The invoice is payable within 15 days by direct debit to the account ending in 4821.",
+    "Customer service can be reached by phone at 900 123 456 from Monday to Friday.",
+]
+
+
+class OnnxEmbedder:
+    """Mean-pooled transformer embeddings from an exported ONNX graph"""
+
+    def __init__(self, model_dir: str, num_threads: int = 0):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, ENGINE_INFO_FILE)) as f:
+            self.info = json.load(f)
+        self.model_name = self.info["model"]
+        self.normalize = bool(self.info.get("normalize", False))
+
+        options = onnxruntime.SessionOptions()
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, ONNX_MODEL_FILE), options, providers=["CPUExecutionProvider"]
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self._inputs = {model_input.name for model_input in self.session.get_inputs()}
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            tokens = self.tokenizer(
+                texts[start:start + batch_size], padding=True, truncation=True,
+                max_length=MAX_SEQUENCE_LENGTH, return_tensors="np"
+            )
+            feed = {name: tokens[name].astype(np.int64) for name in tokens if name in self._inputs}
+            hidden = self.session.run(["last_hidden_state"], feed)[0]
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            if self.normalize:
+                pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            batches.append(pooled.astype(np.float32))
+        return np.concatenate(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+
+
+_embedders: Dict[int, OnnxEmbedder] = {}
+_embedders_lock = threading.Lock()
+
+
+def get_onnx_embedder(num_threads: Optional[int] = None) -> OnnxEmbedder:
+    """
+    Shared ONNX embedder per thread budget (default leann_num_threads)
+    Fails unless the exported model's parity check passed.
+    """
+    num_threads = settings.leann_num_threads if num_threads is None else num_threads
+    with _embedders_lock:
+        embedder = _embedders.get(num_threads)
+        if embedder is None:
+            model_dir = settings.leann_onnx_model_dir
+            parity = load_parity(model_dir)
+            if not parity or not parity.get("passed"):
+                raise RuntimeError(
+                    f"ONNX embedding model in {model_dir} has no passing parity check; "
+                    f"run export_onnx.py or set LEANN_EMBEDDING_ENGINE=torch"
+                )
+            embedder = OnnxEmbedder(model_dir, num_threads)
+            _embedders[num_threads] = embedder
+            logger.info(f"ONNX embedding engine loaded from {model_dir} ({num_threads or 'default'} threads)")
+        return embedder
+
+
+def uses_onnx(model: str) -> bool:
+    """True when embeddings for this model come from the ONNX engine"""
+    engine = settings.leann_embedding_engine
+    if engine not in ENGINES:
+        raise ValueError(f"Unsupported embedding engine: {engine} (expected one of {', '.join(ENGINES)})")
+    return engine == "onnx" and model == _onnx_model_name()
+
+
+_model_name: Optional[str] = None
+
+
+def _onnx_model_name() -> Optional[str]:
+    """Model the ONNX graph was exported from (read once it exists)"""
+    global _model_name
+    if _model_name is None:
+        try:
+            with open(os.path.join(settings.leann_onnx_model_dir, ENGINE_INFO_FILE)) as f:
+                _model_name = json.load(f).get("model")
+        except (OSError, ValueError):
+            return None
+    return _model_name
+
+
+def embed_texts(texts: List[str], model: str, mode: str, num_threads: Optional[int] = None) -> np.ndarray:
+    """
+    Embeddings with the configured engine
+    Models other than the exported one (e.g. an index built with another
+    model) are always embedded with torch.
+    """
+    if uses_onnx(model):
+        return get_onnx_embedder(num_threads).encode(texts, settings.leann_embedding_batch_size)
+
+    from leann.api import compute_embeddings
+
+    return np.asarray(compute_embeddings(texts, model, mode, use_server=False), dtype=np.float32)
+
+
+def load_parity(model_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(model_dir, PARITY_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def parity_check(
+    embedder: OnnxEmbedder,
+    texts: List[str],
+    mode: str = "sentence-transformers",
+    min_cosine: float = 0.98,
+    max_norm_error: float = 0.05
+) -> Dict[str, Any]:
+    """
+    Compare ONNX embeddings with the torch embeddings of the same texts
+    Reports cosine similarity per text and whether nearest-neighbour rankings
+    among the texts agree, which is what retrieval depends on. Norms must
+    match too: scores are inner products, compared against min_similarity.
+    """
+    from leann.api import compute_embeddings
+
+    reference = np.asarray(compute_embeddings(texts, embedder.model_name, mode, use_server=False), dtype=np.float32)
+    candidate = embedder.encode(texts)
+
+    def unit(matrix: np.ndarray) -> np.ndarray:
+        return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    cosines = (unit(reference) * unit(candidate)).sum(axis=1)
+    norm_ratio = np.linalg.norm(candidate, axis=1) / np.maximum(np.linalg.norm(reference, axis=1), 1e-12)
+
+    # Top-1 neighbour of each text among the others, by inner product (the index metric)
+    def neighbours(matrix: np.ndarray) -> np.ndarray:
+        scores = matrix @ matrix.T
+        np.fill_diagonal(scores, -np.inf)
+        return scores.argmax(axis=1)
+
+    agreement = float((neighbours(reference) == neighbours(candidate)).mean()) if len(texts) > 1 else 1.0
+
+    return {
+        "model": embedder.model_name,
+        "texts": len(texts),
+        "mean_cosine": float(cosines.mean()),
+        "min_cosine": float(cosines.min()),
+        "max_norm_ratio_error": float(np.abs(norm_ratio - 1).max()),
+        "top1_neighbour_agreement": agreement,
+        "min_cosine_required": min_cosine,
+        "max_norm_error_allowed": max_norm_error,
+        "passed": bool(cosines.min() >= min_cosine and np.abs(norm_ratio - 1).max() <= max_norm_error),
+    }
+
+
+def export_onnx_model(model_name: str, output_dir: str, reference_texts: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Export a Hugging Face encoder to ONNX and quantize its weights to int8
+    Whether the torch embeddings are unit normalized is detected from
+    reference_texts and recorded, so the ONNX engine matches them.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    from leann.api import compute_embeddings
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.config.return_dict = False
+    model.eval()
+
+    fp32_path = os.path.join(output_dir, "model.fp32.onnx")
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state", "pooler_output"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+                "pooler_output": {0: "batch"},
+            },
+            opset_version=17,
+        )
+    quantize_dynamic(fp32_path, os.path.join(output_dir, ONNX_MODEL_FILE), weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    tokenizer.save_pretrained(output_dir)
+
+    reference = np.asarray(
+        compute_embeddings(reference_texts or PARITY_SAMPLE_TEXTS, model_name, "sentence-transformers", use_server=False)
+    )
+    normalize = bool(np.allclose(np.linalg.norm(reference, axis=1), 1.0, atol=1e-3))
+    info = {"model": model_name, "quantization": "int8-dynamic", "normalize": normalize}
+    with open(os.path.join(output_dir, ENGINE_INFO_FILE), "w") as f:
+        json.dump(info, f, indent=2)
+    return info
+
+
+def save_parity(model_dir: str, report: Dict[str, Any]) -> None:
+    with open(os.path.join(model_dir, PARITY_FILE), "w") as f:
+        json.dump(report, f, indent=2)
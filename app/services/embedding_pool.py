@@ -0,0 +1,144 @@
+"""
+Embedding Pool - thread budgets for embedding work
+Query-time embedding runs in the API process with a fixed number of torch
+intra-op threads (leann_num_threads). Index builds embed their passages in
+separate worker processes that split the build core budget between them, so
+a large build does not starve concurrent searches and uses all cores it is
+given. Per-batch throughput is measured and returned with the build result.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Environment read by OpenMP / MKL / OpenBLAS when torch is first imported
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+_query_threads_lock = threading.Lock()
+_query_threads_applied = False
+
+
+def apply_query_threads(num_threads: int) -> None:
+    """
+    Limit torch intra-op threads of this process (query-time embedding)
+    Also exported to the environment, so embedding servers LEANN starts for
+    pruned indices inherit the same budget.
+    """
+    global _query_threads_applied
+    with _query_threads_lock:
+        if _query_threads_applied or num_threads <= 0:
+            return
+        for name in THREAD_ENV_VARS:
+            os.environ[name] = str(num_threads)
+        import torch
+        torch.set_num_threads(num_threads)
+        _query_threads_applied = True
+        logger.info(f"Query embedding limited to {num_threads} torch threads")
+
+
+def build_thread_budget(workers: int, build_threads: int, query_threads: int) -> Tuple[int, int]:
+    """
+    Workers and torch threads per worker for a build
+    build_threads 0 means every core not reserved for query-time embedding.
+    """
+    total = build_threads or max(1, (os.cpu_count() or 1) - max(query_threads, 0))
+    workers = max(1, min(workers, total))
+    return workers, max(1, total // workers)
+
+
+def init_worker_threads(threads: int) -> None:
+    """Worker process setup (embedding, shard builds): thread budget before torch is imported"""
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+
+
+def _embed_batch(texts: List[str], model: str, mode: str, threads: Optional[int] = None) -> Tuple[np.ndarray, float]:
+    """Embed one batch; in a worker the model stays loaded between batches"""
+    from app.services.embedding_engine import embed_texts
+
+    start = time.perf_counter()
+    embeddings = embed_texts(texts, model, mode, threads)
+    return embeddings, time.perf_counter() - start
+
+
+def _batch_stats(batches: List[List[str]], results: List[Tuple[np.ndarray, float]], seconds: float, **budget) -> Dict[str, Any]:
+    """Overall and per-batch throughput of an embedding run"""
+    batch_stats = []
+    for index, (batch, (_, batch_seconds)) in enumerate(zip(batches, results)):
+        rate = len(batch) / batch_seconds if batch_seconds else 0.0
+        batch_stats.append({"batch": index, "passages": len(batch), "seconds": batch_seconds, "passages_per_second": rate})
+        logger.debug(f"Embedding batch {index}: {len(batch)} passages in {batch_seconds:.2f}s ({rate:.1f}/s)")
+
+    passages = sum(len(batch) for batch in batches)
+    stats = {
+        **budget,
+        "passages": passages,
+        "seconds": seconds,
+        "passages_per_second": passages / seconds if seconds else 0.0,
+        "batches": batch_stats,
+    }
+    logger.info(
+        f"Embedded {passages} passages ({', '.join(f'{key}={value}' for key, value in budget.items())}) "
+        f"in {seconds:.2f}s ({stats['passages_per_second']:.1f}/s)"
+    )
+    return stats
+
+
+def _concat(results: List[Tuple[np.ndarray, float]]) -> np.ndarray:
+    return np.concatenate([embeddings for embeddings, _ in results]) if results else np.zeros((0, 0), np.float32)
+
+
+def compute_embeddings_in_process(
+    texts: List[str],
+    model: str,
+    mode: str,
+    threads: int,
+    batch_size: int = 32
+) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    Embed texts batch by batch in this process (engines with their own thread pool, e.g. ONNX Runtime)
+    Returns: (embeddings matrix, stats with overall and per-batch throughput)
+    """
+    batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+    start = time.perf_counter()
+    results = [_embed_batch(batch, model, mode, threads) for batch in batches]
+    return _concat(results), _batch_stats(batches, results, time.perf_counter() - start, workers=0, threads=threads)
+
+
+def compute_embeddings_parallel(
+    texts: List[str],
+    model: str,
+    mode: str,
+    workers: int,
+    threads_per_worker: int,
+    batch_size: int = 32
+) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    Embed texts in batches across worker processes, keeping their order
+    Returns: (embeddings matrix, stats with overall and per-batch throughput)
+    """
+    batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+    start = time.perf_counter()
+
+    # Spawned workers do not inherit torch / CUDA state from the API process
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context("spawn"),
+        initializer=init_worker_threads,
+        initargs=(threads_per_worker,)
+    ) as pool:
+        futures = [pool.submit(_embed_batch, batch, model, mode, threads_per_worker) for batch in batches]
+        results = [future.result() for future in futures]
+
+    stats = _batch_stats(batches, results, time.perf_counter() - start,
+                         workers=workers, threads_per_worker=threads_per_worker)
+    return _concat(results), stats
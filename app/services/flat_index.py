@@ -0,0 +1,265 @@
+"""
+Flat Index - exact brute-force vector search for small documents
+Stores the passage embeddings as one float32 matrix next to the passages and
+scores queries with a single matrix product, which beats building and walking
+an HNSW graph for documents with a handful of chunks.
+
+Vectors can be stored as float16, or as int8 with one scale per dimension
+(2x / 4x smaller on disk and in memory). Search folds the int8 scales into the
+query instead of dequantizing the matrix, and the build records the top-k
+recall of the quantized vectors against float32 in the meta file. HNSW
+indices keep float32 vectors whatever LEANN_VECTOR_DTYPE says.
+
+The embeddings can also be projected to fewer dimensions first (see
+projection.py); queries are projected with the same stored matrix.
+"""
+import json
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from app.services.embedding_engine import embed_texts
+from app.services.projection import fit_projection, describe, save_projection, projection_path
+
+# Backend name written to the index meta file
+FLAT_BACKEND = "flat"
+
+# Same embedding model and mode LEANN uses by default, so scores are comparable
+EMBEDDING_MODEL = "facebook/contriever"
+EMBEDDING_MODE = "sentence-transformers"
+
+# Storage types for the embedding matrix
+VECTOR_DTYPES = ("float32", "float16", "int8")
+
+# Recall of quantized storage is measured with up to this many passages as queries
+RECALL_SAMPLE_QUERIES = 100
+RECALL_TOP_K = 10
+
+
+def _embed(texts: List[str], model: str, mode: str) -> np.ndarray:
+    return embed_texts(texts, model, mode)
+
+
+def quantize(embeddings: np.ndarray, vector_dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Convert float32 embeddings to the storage type
+    Returns: (stored matrix, per-dimension scales for int8 else None)
+    """
+    if vector_dtype not in VECTOR_DTYPES:
+        raise ValueError(f"Unsupported vector dtype: {vector_dtype} (expected one of {', '.join(VECTOR_DTYPES)})")
+    if vector_dtype == "float32":
+        return embeddings.astype(np.float32, copy=False), None
+    if vector_dtype == "float16":
+        return embeddings.astype(np.float16), None
+
+    # Symmetric int8: each dimension maps [-max|x|, max|x|] to [-127, 127]
+    scales = np.abs(embeddings).max(axis=0) / 127.0
+    scales[scales == 0] = 1.0
+    stored = np.clip(np.rint(embeddings / scales), -127, 127).astype(np.int8)
+    return stored, scales.astype(np.float32)
+
+
+def _top_k(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Row-wise indices of the top_k scores, best first"""
+    if top_k < scores.shape[1]:
+        candidates = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    else:
+        candidates = np.tile(np.arange(scores.shape[1]), (len(scores), 1))
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def _score(queries: np.ndarray, stored: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    """Inner products of float32 queries against the stored matrix"""
+    if scales is not None:
+        # q . (s * v) == (q * s) . v: dequantize through the query
+        queries = queries * scales
+    return queries @ stored.T.astype(np.float32, copy=False)
+
+
+def measure_recall(
+    embeddings: np.ndarray,
+    stored: np.ndarray,
+    scales: Optional[np.ndarray],
+    top_k: int = RECALL_TOP_K,
+    sample: int = RECALL_SAMPLE_QUERIES,
+    seed: int = 0,
+    projection: Optional[np.ndarray] = None
+) -> Dict[str, Any]:
+    """
+    Top-k overlap of quantized (and projected) search with float32 search
+    A sample of the passages' own embeddings stands in for queries.
+    """
+    top_k = min(top_k, len(embeddings))
+    if top_k == 0:
+        return {"recall_at_k": 1.0, "k": 0, "sample_queries": 0}
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(embeddings), size=min(sample, len(embeddings)), replace=False)
+    queries = embeddings[rows]
+
+    exact = _top_k(queries @ embeddings.T, top_k)
+    approx = _top_k(_score(queries if projection is None else queries @ projection, stored, scales), top_k)
+    overlap = sum(len(set(a) & set(b)) for a, b in zip(exact.tolist(), approx.tolist()))
+    return {
+        "recall_at_k": overlap / (len(rows) * top_k),
+        "k": top_k,
+        "sample_queries": int(len(rows)),
+    }
+
+
+class FlatIndex:
+    """Exact inner-product search over an in-memory embedding matrix"""
+
+    def __init__(
+        self,
+        index_path: str,
+        embeddings: np.ndarray,
+        passages: List[Dict[str, Any]],
+        embedding_model: str = EMBEDDING_MODEL,
+        embedding_mode: str = EMBEDDING_MODE,
+        scales: Optional[np.ndarray] = None,
+        projection: Optional[np.ndarray] = None
+    ):
+        self.index_path = index_path
+        self.embeddings = embeddings
+        self.scales = scales
+        self.projection = projection
+        self.passages = passages
+        self.embedding_model = embedding_model
+        self.embedding_mode = embedding_mode
+
+    @staticmethod
+    def files(index_path: str) -> Dict[str, str]:
+        return {
+            "meta": f"{index_path}.meta.json",
+            "vectors": f"{index_path}.flat.npy",
+            "scales": f"{index_path}.flat.scales.npy",
+            "projection": projection_path(index_path),
+            "passages": f"{index_path}.passages.jsonl",
+        }
+
+    @staticmethod
+    def is_flat(index_path: str) -> bool:
+        """True when the index at index_path was built by this backend"""
+        try:
+            with open(f"{index_path}.meta.json") as f:
+                return json.load(f).get("backend_name") == FLAT_BACKEND
+        except (OSError, ValueError):
+            return False
+
+    @classmethod
+    def build(
+        cls,
+        index_path: str,
+        chunks: List[str],
+        embedding_model: str = EMBEDDING_MODEL,
+        embedding_mode: str = EMBEDDING_MODE,
+        vector_dtype: str = "float32",
+        projection_dims: int = 0,
+        projection_method: str = "pca",
+        metadata: Optional[List[Dict[str, Any]]] = None
+    ) -> "FlatIndex":
+        """
+        Embed the chunks and write the index files, vectors stored as vector_dtype
+        projection_dims: project the embeddings to this many dimensions first, 0 keeps them
+        metadata: stored with each passage (see passage_metadata)
+        """
+        embeddings = _embed(chunks, embedding_model, embedding_mode)
+        projection = None
+        if 0 < projection_dims < embeddings.shape[1]:
+            projection = fit_projection(embeddings, projection_dims, projection_method)
+        stored, scales = quantize(embeddings if projection is None else embeddings @ projection, vector_dtype)
+        metadata = metadata or [{}] * len(chunks)
+        passages = [{"id": str(i), "text": chunk, "metadata": chunk_metadata}
+                    for i, (chunk, chunk_metadata) in enumerate(zip(chunks, metadata))]
+        files = cls.files(index_path)
+
+        quantization = {
+            "vector_dtype": vector_dtype,
+            "vector_bytes": int(stored.nbytes + (scales.nbytes if scales is not None else 0)),
+            "float32_bytes": int(embeddings.nbytes),
+        }
+        if vector_dtype != "float32" or projection is not None:
+            quantization.update(measure_recall(embeddings, stored, scales, projection=projection))
+
+        np.save(files["vectors"], stored)
+        if scales is not None:
+            np.save(files["scales"], scales)
+        if projection is not None:
+            save_projection(index_path, projection)
+        with open(files["passages"], "w", encoding="utf-8") as f:
+            for passage in passages:
+                f.write(json.dumps(passage, ensure_ascii=False) + "\n")
+        # Written last: the meta file marks the index as complete
+        with open(files["meta"], "w") as f:
+            json.dump({
+                "version": "1.0",
+                "backend_name": FLAT_BACKEND,
+                "embedding_model": embedding_model,
+                "embedding_mode": embedding_mode,
+                "dimensions": int(stored.shape[1]),
+                "num_passages": len(passages),
+                "quantization": quantization,
+                "projection": describe(index_path, embeddings, projection, projection_method) if projection is not None else None,
+            }, f, indent=2)
+
+        return cls(index_path, stored, passages, embedding_model, embedding_mode, scales, projection)
+
+    @classmethod
+    def load(cls, index_path: str) -> "FlatIndex":
+        files = cls.files(index_path)
+        with open(files["meta"]) as f:
+            meta = json.load(f)
+        embeddings = np.load(files["vectors"])
+        scales = np.load(files["scales"]) if embeddings.dtype == np.int8 else None
+        projection = np.load(files["projection"]) if meta.get("projection") else None
+        with open(files["passages"], encoding="utf-8") as f:
+            passages = [json.loads(line) for line in f if line.strip()]
+        return cls(index_path, embeddings, passages, meta["embedding_model"], meta["embedding_mode"], scales, projection)
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    def search_vectors(
+        self,
+        queries: np.ndarray,
+        top_k: int,
+        rows: Optional[np.ndarray] = None
+    ) -> List[List[SimpleNamespace]]:
+        """
+        Exact top-k by inner product for a (num_queries, dim) matrix of query embeddings
+        rows: passage positions to search (a metadata filter's matches), None for all
+        """
+        rows = np.arange(len(self.passages)) if rows is None else np.asarray(rows, dtype=np.int64)
+        top_k = min(top_k, len(rows))
+        if top_k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        if self.projection is not None:
+            queries = queries @ self.projection
+        stored = self.embeddings if len(rows) == len(self.passages) else self.embeddings[rows]
+        scores = _score(queries, stored, self.scales)
+
+        batch_results = []
+        for row, ranked in zip(scores, _top_k(scores, top_k)):
+            batch_results.append([
+                SimpleNamespace(
+                    id=self.passages[rows[i]]["id"],
+                    text=self.passages[rows[i]]["text"],
+                    score=float(row[i]),
+                    metadata=self.passages[rows[i]].get("metadata", {})
+                )
+                for i in ranked
+            ])
+        return batch_results
+
+    def search_batch(self, queries: List[str], top_k: int = 5, rows: Optional[np.ndarray] = None) -> List[List[SimpleNamespace]]:
+        return self.search_vectors(_embed(queries, self.embedding_model, self.embedding_mode), top_k, rows)
+
+    def search(self, query: str, top_k: int = 5, rows: Optional[np.ndarray] = None, **kwargs) -> List[SimpleNamespace]:
+        """Same call shape as LeannSearcher.search; graph search options are ignored"""
+        return self.search_batch([query], top_k, rows)[0]
+
+    def cleanup(self) -> None:
+        """Nothing to release: no embedding server or graph is held"""
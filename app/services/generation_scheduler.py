@@ -0,0 +1,243 @@
+"""
+Generation Scheduler - admission control for LLM generation
+Bounds concurrent Ollama calls and queues the rest by priority with backpressure
+"""
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Iterator
+
+from app.config import settings
+
+# Lower value is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+PRIORITY_BACKGROUND = 20
+
+# How often a queued request checks whether its client went away
+CANCEL_POLL_SECONDS = 0.25
+
+
+class SchedulerRejected(Exception):
+    """Raised when a generation request is not admitted"""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class GenerationCancelled(Exception):
+    """Raised when a generation is abandoned because its client disconnected"""
+
+
+class _Waiter:
+    """A request waiting for a generation slot"""
+
+    __slots__ = ("priority", "seq", "displaced")
+
+    def __init__(self, priority: int, seq: int):
+        self.priority = priority
+        self.seq = seq
+        self.displaced = False
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class GenerationScheduler:
+    """Bounded-concurrency gate with a bounded priority wait queue"""
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+
+        self._cond = threading.Condition()
+        self._queue = []  # heap of _Waiter
+        self._seq = itertools.count()
+        self._active = 0
+
+        # Metrics
+        self._service_time_avg = None  # seconds, learnt from observed generations
+        self._wait_times = deque(maxlen=500)
+        self._counters = {
+            "admitted": 0,
+            "completed": 0,
+            "rejected_queue_full": 0,
+            "rejected_deadline": 0,
+            "dropped_deadline": 0,
+            "displaced": 0,
+            "cancelled_waiting": 0,
+            "cancelled_running": 0,
+        }
+
+    def _estimated_wait(self, position: int) -> float:
+        """Expected seconds until the request at queue position gets a slot"""
+        if self._service_time_avg is None:
+            return 0.0
+        return (position // self.max_concurrency + 1) * self._service_time_avg
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self._estimated_wait(len(self._queue))))
+
+    def _remove(self, waiter: _Waiter) -> None:
+        self._queue.remove(waiter)
+        heapq.heapify(self._queue)
+        self._cond.notify_all()
+
+    def acquire(
+        self,
+        priority: int = PRIORITY_INTERACTIVE,
+        timeout: Optional[float] = None,
+        cancel_event: Optional[threading.Event] = None
+    ) -> float:
+        """
+        Wait for a generation slot
+        cancel_event: Optional event set when the client goes away; the request
+        then leaves the queue
+        Returns: seconds spent waiting
+        Raises: SchedulerRejected with 429 when the queue is full, 503 when the
+        deadline cannot be met or passes while waiting; GenerationCancelled
+        """
+        start = time.monotonic()
+        timeout = self.queue_timeout if timeout is None else timeout
+        deadline = start + timeout if timeout and timeout > 0 else None
+
+        with self._cond:
+            if self._active < self.max_concurrency and not self._queue:
+                self._active += 1
+                self._counters["admitted"] += 1
+                self._wait_times.append(0.0)
+                return 0.0
+
+            if len(self._queue) >= self.max_queue:
+                # A full queue admits a more urgent request by displacing the least urgent one
+                worst = max(self._queue) if self._queue else None
+                if worst is None or worst.priority <= priority:
+                    self._counters["rejected_queue_full"] += 1
+                    raise SchedulerRejected(
+                        "Generation queue is full, try again later",
+                        status_code=429,
+                        retry_after=self._retry_after()
+                    )
+                worst.displaced = True
+                self._remove(worst)
+
+            position = sum(1 for w in self._queue if w.priority <= priority)
+            if deadline is not None and self._estimated_wait(position) > timeout:
+                self._counters["rejected_deadline"] += 1
+                raise SchedulerRejected(
+                    "Generation capacity exhausted, request would exceed its deadline",
+                    status_code=503,
+                    retry_after=self._retry_after()
+                )
+
+            waiter = _Waiter(priority, next(self._seq))
+            heapq.heappush(self._queue, waiter)
+
+            while True:
+                if waiter.displaced:
+                    self._counters["displaced"] += 1
+                    raise SchedulerRejected(
+                        "Generation queue is full, request displaced by a higher priority one",
+                        status_code=429,
+                        retry_after=self._retry_after()
+                    )
+
+                if self._queue[0] is waiter and self._active < self.max_concurrency:
+                    heapq.heappop(self._queue)
+                    self._active += 1
+                    self._counters["admitted"] += 1
+                    # Another slot may still be free for the next waiter
+                    self._cond.notify_all()
+                    break
+
+                if cancel_event is not None and cancel_event.is_set():
+                    self._remove(waiter)
+                    self._counters["cancelled_waiting"] += 1
+                    raise GenerationCancelled("Client disconnected while waiting for generation capacity")
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._remove(waiter)
+                    self._counters["dropped_deadline"] += 1
+                    raise SchedulerRejected(
+                        "Timed out waiting for generation capacity",
+                        status_code=503,
+                        retry_after=self._retry_after()
+                    )
+
+                if cancel_event is not None:
+                    # Cancellation does not notify the condition, poll for it
+                    remaining = CANCEL_POLL_SECONDS if remaining is None else min(remaining, CANCEL_POLL_SECONDS)
+                self._cond.wait(remaining)
+
+            waited = time.monotonic() - start
+            self._wait_times.append(waited)
+            return waited
+
+    def release(self, service_seconds: Optional[float] = None, cancelled: bool = False) -> None:
+        """Free a generation slot (cancelled generations do not count towards service time)"""
+        with self._cond:
+            self._active -= 1
+            if cancelled:
+                self._counters["cancelled_running"] += 1
+            else:
+                self._counters["completed"] += 1
+            if service_seconds is not None and not cancelled:
+                if self._service_time_avg is None:
+                    self._service_time_avg = service_seconds
+                else:
+                    self._service_time_avg = 0.8 * self._service_time_avg + 0.2 * service_seconds
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(
+        self,
+        priority: int = PRIORITY_INTERACTIVE,
+        timeout: Optional[float] = None,
+        cancel_event: Optional[threading.Event] = None
+    ) -> Iterator[float]:
+        """Hold a generation slot for the duration of the block, yields the wait time"""
+        waited = self.acquire(priority=priority, timeout=timeout, cancel_event=cancel_event)
+        start = time.monotonic()
+        cancelled = False
+        try:
+            yield waited
+        except (GenerationCancelled, GeneratorExit):
+            cancelled = True
+            raise
+        finally:
+            self.release(time.monotonic() - start, cancelled=cancelled)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth, concurrency and wait time statistics"""
+        with self._cond:
+            waits = sorted(self._wait_times)
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "active": self._active,
+                "queue_depth": len(self._queue),
+                "wait_seconds": {
+                    "avg": sum(waits) / len(waits) if waits else 0.0,
+                    "p50": waits[int(0.50 * (len(waits) - 1))] if waits else 0.0,
+                    "p95": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+                    "max": waits[-1] if waits else 0.0,
+                },
+                "avg_service_seconds": self._service_time_avg,
+                **self._counters,
+            }
+
+
+# Singleton instance
+generation_scheduler = GenerationScheduler(
+    max_concurrency=settings.ollama_max_concurrency,
+    max_queue=settings.ollama_max_queue,
+    queue_timeout=settings.ollama_queue_timeout
+)
@@ -0,0 +1,167 @@
+"""
+Index Versions - atomic switch between builds of a document's index
+Every build writes its files under a new versioned prefix (doc_N.vK.*) next
+to the version being served; a small manifest (doc_N.current.json), replaced
+atomically, names the version searches use. Searches lease the version they
+read, and a retired version (its searcher and its files) is released once
+the last of them finishes. Indices built before versioning live at the bare
+prefix (doc_N.*) and are served as version 0 until their next build.
+"""
+import glob
+import json
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_SUFFIX = ".current.json"
+
+_VERSION_SUFFIX = re.compile(r"^\.v(\d+)\.")
+
+
+def manifest_path(base_path: str) -> str:
+    return f"{base_path}{MANIFEST_SUFFIX}"
+
+
+def version_path(base_path: str, version: int) -> str:
+    """File prefix of one version of the index (version 0: the unversioned prefix)"""
+    return base_path if version == 0 else f"{base_path}.v{version}"
+
+
+def read_manifest(base_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(manifest_path(base_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(base_path: str, version: int) -> None:
+    """Point the index at a version; the rename makes the switch atomic"""
+    path = manifest_path(base_path)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump({"version": version, "prefix": os.path.basename(version_path(base_path, version))}, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def current_version(base_path: str) -> int:
+    manifest = read_manifest(base_path)
+    return int(manifest["version"]) if manifest else 0
+
+
+def _file_version(base_path: str, path: str) -> Optional[int]:
+    """Version a file of the index belongs to, None for the manifest"""
+    suffix = path[len(base_path):]
+    if suffix.startswith(MANIFEST_SUFFIX):
+        return None
+    match = _VERSION_SUFFIX.match(suffix)
+    return int(match.group(1)) if match else 0
+
+
+def existing_versions(base_path: str) -> List[int]:
+    """Versions with files on disk, complete or not"""
+    versions = {_file_version(base_path, path) for path in glob.glob(f"{base_path}.*")}
+    versions.discard(None)
+    return sorted(versions)
+
+
+def version_files(base_path: str, version: int) -> List[str]:
+    return [path for path in glob.glob(f"{base_path}.*") if _file_version(base_path, path) == version]
+
+
+def remove_version(base_path: str, version: int) -> bool:
+    """Remove the files of one version, returns True if any existed"""
+    files = version_files(base_path, version)
+    for path in files:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return bool(files)
+
+
+class IndexVersions:
+    """Current version of each index and the searches still using older ones"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current: Dict[str, int] = {}
+        self._reserved: Dict[str, int] = {}
+        self._leases: Dict[str, int] = {}
+        self._on_release: Dict[str, List[Callable[[], None]]] = {}
+
+    def _version(self, base_path: str) -> int:
+        if base_path not in self._current:
+            self._current[base_path] = current_version(base_path)
+        return self._current[base_path]
+
+    def current_path(self, base_path: str) -> str:
+        with self._lock:
+            return version_path(base_path, self._version(base_path))
+
+    def reserve(self, base_path: str) -> int:
+        """New version number for a build, above every version on disk or being built"""
+        with self._lock:
+            version = max([self._version(base_path), self._reserved.get(base_path, 0)]
+                          + existing_versions(base_path)) + 1
+            self._reserved[base_path] = version
+            return version
+
+    @contextmanager
+    def lease(self, base_path: str) -> Iterator[str]:
+        """Hold the current version of an index (its file prefix) while it is read"""
+        with self._lock:
+            path = version_path(base_path, self._version(base_path))
+            self._leases[path] = self._leases.get(path, 0) + 1
+        try:
+            yield path
+        finally:
+            with self._lock:
+                self._leases[path] -= 1
+                callbacks = self._pop_released(path)
+            self._run(callbacks)
+
+    def after_release(self, path: str, callback: Callable[[], None]) -> None:
+        """Run callback once no search holds the version at path (now if none does)"""
+        with self._lock:
+            self._on_release.setdefault(path, []).append(callback)
+            callbacks = self._pop_released(path)
+        self._run(callbacks)
+
+    def publish(self, base_path: str, version: int, on_retire: Callable[[int], None]) -> None:
+        """
+        Switch the index to a built version; on_retire(previous version) runs once
+        no search holds the version it replaces
+        """
+        with self._lock:
+            previous = self._version(base_path)
+            write_manifest(base_path, version)
+            self._current[base_path] = version
+        self.after_release(version_path(base_path, previous), lambda: on_retire(previous))
+
+    def withdraw(self, base_path: str) -> int:
+        """Remove the manifest (the index is being deleted), returns the version it served"""
+        with self._lock:
+            version = self._version(base_path)
+            if os.path.exists(manifest_path(base_path)):
+                os.remove(manifest_path(base_path))
+            self._current.pop(base_path, None)
+            return version
+
+    def _pop_released(self, path: str) -> List[Callable[[], None]]:
+        if self._leases.get(path, 0) > 0:
+            return []
+        self._leases.pop(path, None)
+        return self._on_release.pop(path, [])
+
+    @staticmethod
+    def _run(callbacks: List[Callable[[], None]]) -> None:
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Error releasing index version: {e}")
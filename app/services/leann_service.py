@@ -5,10 +5,47 @@ Optimized for Markdown documents
 """
 import os
 import glob
-from typing import List, Dict, Any, Optional
+import json
+import logging
+import math
+import pickle
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional, Tuple, Union, Iterator
 from leann import LeannBuilder, LeannSearcher
 import fitz  # PyMuPDF
 from app.config import settings
+from app.services.flat_index import FlatIndex, FLAT_BACKEND, EMBEDDING_MODEL, EMBEDDING_MODE, measure_recall
+from app.services.sharded_index import (
+    ShardedIndex, SHARDED_BACKEND, shard_count, shard_ranges, shard_path, shard_digest,
+    read_meta as read_sharded_meta, write_meta as write_sharded_meta, open_passage_store
+)
+from app.services.search_tuner import search_tuner
+from app.services import text_cache
+from app.services.index_versions import IndexVersions, version_path, existing_versions, version_files, remove_version
+from app.services.boilerplate import strip_boilerplate, RULES_VERSION as BOILERPLATE_RULES_VERSION
+from app.services.passage_metadata import PassageTable, passage_metadata, active_filters
+from app.services.projection import fit_projection, describe, save_projection, load_projection
+from app.services.embedding_pool import (
+    apply_query_threads, build_thread_budget, compute_embeddings_parallel, compute_embeddings_in_process,
+    init_worker_threads
+)
+from app.services.embedding_engine import embed_texts, uses_onnx
+
+logger = logging.getLogger(__name__)
+
+# Index storage modes: "pruned" drops the embeddings and recomputes them at
+# search time (small on disk), "full" keeps them (no embedding work per search)
+STORAGE_MODES = ("pruned", "full")
+
+# Candidate sets of metadata filters whose vectors each LEANN searcher keeps
+CANDIDATE_CACHE_SIZE = 32
 
 
 class LeannService:
@@ -20,24 +57,87 @@ class LeannService:
         self.batch_size = settings.leann_embedding_batch_size
         self.use_gpu = settings.leann_use_gpu
         self.num_threads = settings.leann_num_threads
+        self.build_workers = settings.leann_build_workers
+        self.build_threads = settings.leann_build_threads
+        self.searcher_cache_size = settings.leann_searcher_cache_size
+        self.flat_max_chunks = settings.leann_flat_max_chunks
+        self.vector_dtype = settings.leann_vector_dtype
+        self.strip_boilerplate = settings.leann_strip_boilerplate
+        self.boilerplate_min_page_fraction = settings.leann_boilerplate_min_page_fraction
+        self.projection_dims = settings.leann_projection_dims
+        self.projection_method = settings.leann_projection_method
+        self.full_embeddings_max_chunks = settings.leann_full_embeddings_max_chunks
+        self.shard_chunks = settings.leann_shard_chunks
+        self.max_shards = settings.leann_max_shards
         os.makedirs(self.index_base_path, exist_ok=True)
 
-    def _get_index_path(self, document_id: str) -> str:
-        """Get the path for a document's index"""
+        # Open searchers by document id with the index version they read, least recently used first
+        self._searchers: "OrderedDict[str, Tuple[str, Union[LeannSearcher, FlatIndex, ShardedIndex]]]" = OrderedDict()
+        self._searchers_lock = threading.Lock()
+
+        # Served version of each index and the searches holding older ones
+        self._versions = IndexVersions()
+
+        # Guards the filter candidate vectors cached on LEANN searchers
+        self._candidates_lock = threading.Lock()
+
+        # Document ids with a rebuild (storage conversion, re-index) in progress
+        self._rebuilding = set()
+        self._rebuilding_lock = threading.Lock()
+
+    def _get_base_path(self, document_id: str) -> str:
+        """Unversioned file prefix of a document's index"""
         return os.path.join(self.index_base_path, f"doc_{document_id}")
 
+    def _get_index_path(self, document_id: str) -> str:
+        """Get the path (file prefix) of the index version a document is served from"""
+        return self._versions.current_path(self._get_base_path(document_id))
+
     def extract_text_from_pdf(self, file_path: str) -> str:
         """Extract text from PDF file"""
+        return self._extract_pdf_pages(file_path)[0]
+
+    def _extract_pdf_pages(self, file_path: str) -> Tuple[str, List[int], List[List[Any]], Optional[Dict[str, Any]]]:
+        """
+        Extract text from PDF file with the character offset where each page starts,
+        the outline (bookmarks) as [offset, level, title] sections and, when
+        LEANN_STRIP_BOILERPLATE is on, what repeated headers / footers removal saved
+        """
         try:
             doc = fitz.open(file_path)
-            full_text = ""
+            page_texts = [page.get_text() for page in doc]
+            toc = doc.get_toc(simple=True)
+            doc.close()
 
-            for page_num, page in enumerate(doc):
-                full_text += f"\n--- Page {page_num + 1} ---\n"
-                full_text += page.get_text()
+            boilerplate = None
+            if self.strip_boilerplate:
+                original = page_texts
+                page_texts, boilerplate = strip_boilerplate(page_texts, self.boilerplate_min_page_fraction)
+                boilerplate["options"] = self._boilerplate_options()
 
-            doc.close()
-            return full_text
+            parts = []
+            pages = []
+            length = 0
+            for page_num, page_text in enumerate(page_texts):
+                pages.append(length)
+                part = f"\n--- Page {page_num + 1} ---\n" + page_text
+                parts.append(part)
+                length += len(part)
+            text = "".join(parts)
+
+            if boilerplate is not None:
+                # At the default chunking, which is what uploads are indexed with
+                original_text = "".join(f"\n--- Page {page_num + 1} ---\n" + page_text
+                                        for page_num, page_text in enumerate(original))
+                boilerplate["chunks_saved"] = len(self.chunk_spans(original_text)) - len(self.chunk_spans(text))
+                if boilerplate["chars_saved"]:
+                    logger.info(
+                        f"Removed {len(boilerplate['lines'])} repeated header/footer lines from {file_path}: "
+                        f"{boilerplate['chars_saved']} characters, {boilerplate['chunks_saved']} chunks saved"
+                    )
+
+            sections = [[pages[page - 1], level, title.strip()] for level, title, page in toc if 1 <= page <= len(pages)]
+            return text, pages, sections, boilerplate
         except Exception as e:
             raise Exception(f"Error extracting text from PDF: {str(e)}")
 
@@ -66,36 +166,104 @@ class LeannService:
         else:
             raise ValueError(f"Unsupported file type: {file_type}")
 
+    def get_text(self, file_path: str, file_type: str) -> Dict[str, Any]:
+        """
+        Extracted text of an upload, parsed once and then read from its cache sidecar
+        Returns: dict with text, page start offsets, outline sections, boilerplate
+        removal stats (PDF, None if not applied) and whether it came from the cache
+        """
+        is_pdf = file_type == "application/pdf" or file_path.endswith('.pdf')
+        cached = text_cache.load(file_path)
+        # PDF text extracted with other boilerplate settings is parsed again
+        if cached is not None and (not is_pdf or (cached["boilerplate"] or {}).get("options") == (
+                self._boilerplate_options() if self.strip_boilerplate else None)):
+            return {"text": cached["text"], "pages": cached["pages"], "sections": cached["sections"],
+                    "boilerplate": cached["boilerplate"], "cached": True}
+
+        if is_pdf:
+            text, pages, sections, boilerplate = self._extract_pdf_pages(file_path)
+        else:
+            text, pages, sections, boilerplate = self.extract_text_from_file(file_path, file_type), [0], [], None
+        text_cache.save(file_path, text, pages, sections, boilerplate)
+        return {"text": text, "pages": pages, "sections": sections, "boilerplate": boilerplate, "cached": False}
+
+    def _boilerplate_options(self) -> Dict[str, Any]:
+        return {"min_page_fraction": self.boilerplate_min_page_fraction, "rules": BOILERPLATE_RULES_VERSION}
+
+    def get_boilerplate(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """Repeated header / footer removal recorded in an upload's text cache, None if not applied or not cached"""
+        cached = text_cache.load(file_path)
+        return cached["boilerplate"] if cached is not None else None
+
+    @staticmethod
+    def delete_text_cache(file_path: str) -> None:
+        """Remove the extracted text cache of an upload"""
+        text_cache.remove(file_path)
+
     def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
         """
         Chunk text into overlapping segments
         Optimized for markdown with section awareness
         """
-        chunks = []
-        text_length = len(text)
+        return [text[start:end] for start, end in self.chunk_spans(text, chunk_size, overlap)] or [text]
 
-        if text_length <= chunk_size:
-            return [text]
+    def chunk_spans(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[Tuple[int, int]]:
+        """
+        (start, end) character offsets of the chunks of text, whitespace trimmed
+        Chunks end at line breaks; each one repeats the last two lines of the previous one.
+        """
+        if len(text) <= chunk_size:
+            spans = [(0, len(text))]
+        else:
+            # Line boundaries (end excludes the newline)
+            lines = []
+            position = 0
+            for line in text.split('\n'):
+                lines.append((position, position + len(line)))
+                position += len(line) + 1
 
-        # Try to split by markdown headers first
-        lines = text.split('\n')
-        current_chunk = ""
+            spans = []
+            chunk_lines: List[Tuple[int, int]] = []
+            size = 0
+            for line in lines:
+                # Check if adding this line would exceed chunk size
+                if size + (line[1] - line[0]) + 1 > chunk_size and chunk_lines:
+                    spans.append((chunk_lines[0][0], chunk_lines[-1][1]))
+                    # Keep overlap by including the last lines
+                    chunk_lines = chunk_lines[-2:] + [line]
+                    size = sum(end - start + 1 for start, end in chunk_lines)
+                else:
+                    chunk_lines.append(line)
+                    size += line[1] - line[0] + 1
 
-        for line in lines:
-            # Check if adding this line would exceed chunk size
-            if len(current_chunk) + len(line) + 1 > chunk_size and current_chunk:
-                chunks.append(current_chunk.strip())
-                # Keep overlap by including last few lines
-                overlap_text = '\n'.join(current_chunk.split('\n')[-3:])
-                current_chunk = overlap_text + '\n' + line
-            else:
-                current_chunk += line + '\n'
+            # Add the last chunk
+            if chunk_lines:
+                spans.append((chunk_lines[0][0], chunk_lines[-1][1]))
 
-        # Add the last chunk
-        if current_chunk.strip():
-            chunks.append(current_chunk.strip())
+        trimmed = []
+        for start, end in spans:
+            chunk = text[start:end]
+            stripped = chunk.lstrip()
+            start += len(chunk) - len(stripped)
+            end = start + len(stripped.rstrip())
+            if end > start:
+                trimmed.append((start, end))
+        return trimmed
 
-        return chunks if chunks else [text]
+    def _chunk_document(
+        self,
+        extracted: Dict[str, Any],
+        chunk_size: int,
+        overlap: int
+    ) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """
+        Chunks of an extracted document (see get_text) with their passage metadata
+        Returns: (passage texts, metadata per passage: pages, heading path, character offsets)
+        """
+        text = extracted["text"]
+        spans = self.chunk_spans(text, chunk_size, overlap)
+        metadata = passage_metadata(text, spans, extracted.get("pages"), extracted.get("sections"))
+        return [text[start:end] for start, end in spans], metadata
 
     def build_index(
         self,
@@ -103,46 +271,80 @@ class LeannService:
         file_path: str,
         file_type: str,
         chunk_size: int = 1000,
-        overlap: int = 200
+        overlap: int = 200,
+        storage_mode: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Build LEANN index for a document
+        storage_mode: "pruned" or "full"; None picks by size (see resolve_storage_mode)
         Returns: dict with status and metadata
         """
         try:
-            # Extract text
-            text = self.extract_text_from_file(file_path, file_type)
+            # Extract text (cached after the first build)
+            extracted = self.get_text(file_path, file_type)
+            text = extracted["text"]
 
-            # Chunk text
-            chunks = self.chunk_text(text, chunk_size, overlap)
+            # Chunk text (only non-empty chunks), with page and section of each
+            passages, metadata = self._chunk_document(extracted, chunk_size, overlap)
 
-            # Create LEANN builder - use CUDA if available
-            index_path = self._get_index_path(document_id)
+            index_path, written = self._write_version(document_id, passages, storage_mode, metadata)
+
+            return {
+                "status": "success",
+                "num_chunks": len(passages),
+                "index_path": index_path,
+                "text_length": len(text),
+                "backend": written["backend"],
+                "storage_mode": written["storage_mode"],
+                "embedding": written["embedding"],
+                "shards": written.get("shards"),
+                "boilerplate": extracted["boilerplate"],
+                "text_cached": extracted["cached"]
+            }
 
-            # Auto-detect CUDA availability (can be overridden by config)
-            import torch
-            device = 'cuda' if (torch.cuda.is_available() and self.use_gpu) else 'cpu'
+        except Exception as e:
+            return {
+                "status": "error",
+                "error": str(e)
+            }
 
-            # Initialize builder with optimized settings
-            builder = LeannBuilder(
-                backend_name=self.backend,
-                device=device,
-                batch_size=self.batch_size
-            )
+    def rebuild_index(
+        self,
+        document_id: str,
+        file_path: str,
+        file_type: str,
+        storage_mode: Optional[str] = None,
+        chunk_size: int = 1000,
+        overlap: int = 200,
+        claimed: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Rebuild a document's index, e.g. in another storage mode or after a chunking change
+        The current version keeps serving searches while the new one is built (see
+        _write_version). Shards whose passages and build options did not change are
+        reused, not rebuilt.
+        claimed: the caller already holds the rebuild (claim_rebuild); it is released here
+        Returns: dict with status and metadata
+        """
+        if not claimed and not self.claim_rebuild(document_id):
+            return {"status": "error", "error": "A rebuild is already in progress"}
 
-            # Add chunks to index
-            for chunk in chunks:
-                if chunk.strip():  # Only add non-empty chunks
-                    builder.add_text(chunk)
+        try:
+            extracted = self.get_text(file_path, file_type)
+            passages, metadata = self._chunk_document(extracted, chunk_size, overlap)
 
-            # Build and save index
-            builder.build_index(index_path)
+            index_path, written = self._write_version(document_id, passages, storage_mode, metadata, reuse=True)
 
             return {
                 "status": "success",
-                "num_chunks": len(chunks),
+                "num_chunks": len(passages),
                 "index_path": index_path,
-                "text_length": len(text)
+                "backend": written["backend"],
+                "storage_mode": written["storage_mode"],
+                "embedding": written["embedding"],
+                "shards": written.get("shards"),
+                "boilerplate": extracted["boilerplate"],
+                "text_cached": extracted["cached"]
             }
 
         except Exception as e:
@@ -150,76 +352,760 @@ class LeannService:
                 "status": "error",
                 "error": str(e)
             }
+        finally:
+            self.release_rebuild(document_id)
+
+    def claim_rebuild(self, document_id: str) -> bool:
+        """Mark a rebuild of the document as in progress, False if one already is"""
+        with self._rebuilding_lock:
+            if document_id in self._rebuilding:
+                return False
+            self._rebuilding.add(document_id)
+            return True
+
+    def release_rebuild(self, document_id: str) -> None:
+        with self._rebuilding_lock:
+            self._rebuilding.discard(document_id)
+
+    def is_rebuilding(self, document_id: str) -> bool:
+        with self._rebuilding_lock:
+            return document_id in self._rebuilding
+
+    def _write_version(
+        self,
+        document_id: str,
+        passages: List[str],
+        storage_mode: Optional[str],
+        metadata: Optional[List[Dict[str, Any]]] = None,
+        reuse: bool = False
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Build a new version of a document's index and switch searches to it
+        The files go under a new versioned prefix while the current version keeps
+        serving; the manifest switch is atomic, and the previous version's files are
+        removed once the searches still reading it finish.
+        reuse: link the current version's unchanged shards instead of rebuilding them
+        Returns: (file prefix of the new version, _write_index result)
+        """
+        base_path = self._get_base_path(document_id)
+        reuse_from = self._get_index_path(document_id) if reuse else None
+        version = self._versions.reserve(base_path)
+        index_path = version_path(base_path, version)
+        try:
+            written = self._write_index(index_path, passages, storage_mode, reuse_from=reuse_from, metadata=metadata)
+            # Passage offsets sidecars are written now, not by the first searches
+            with open_passage_store(index_path):
+                pass
+        except Exception:
+            remove_version(base_path, version)
+            raise
+
+        # Searches opening the index from now on get the new version
+        self._invalidate_searcher(document_id)
+        self._versions.publish(base_path, version, lambda previous: remove_version(base_path, previous))
+        logger.info(f"Index of document {document_id} switched to version {version}")
+        return index_path, written
+
+    def resolve_storage_mode(self, num_passages: int, storage_mode: Optional[str] = None) -> str:
+        """Requested storage mode, else full embeddings for documents up to leann_full_embeddings_max_chunks"""
+        if storage_mode is not None:
+            if storage_mode not in STORAGE_MODES:
+                raise ValueError(f"Unsupported storage mode: {storage_mode} (expected one of {', '.join(STORAGE_MODES)})")
+            return storage_mode
+        return "full" if num_passages <= self.full_embeddings_max_chunks else "pruned"
+
+    def _embed_for_build(self, passages: List[str], device: str) -> Tuple[Optional[Any], Optional[Dict[str, Any]]]:
+        """
+        Embed passages in worker processes when LEANN_BUILD_WORKERS is set and the build
+        runs on CPU, or with the ONNX engine when it is selected
+        Returns: (embeddings, throughput stats), or (None, None) to let the backend embed them
+        """
+        if not passages:
+            return None, None
+        onnx = uses_onnx(EMBEDDING_MODEL)
+        if self.build_workers > 0 and (device == 'cpu' or onnx):
+            workers, threads = build_thread_budget(self.build_workers, self.build_threads, self.num_threads)
+            return compute_embeddings_parallel(
+                passages, EMBEDDING_MODEL, EMBEDDING_MODE, workers, threads, self.batch_size
+            )
+        if onnx:
+            # ONNX Runtime parallelizes within the process
+            _, threads = build_thread_budget(1, self.build_threads, self.num_threads)
+            return compute_embeddings_in_process(passages, EMBEDDING_MODEL, EMBEDDING_MODE, threads, self.batch_size)
+        return None, None
+
+    def _write_index(
+        self,
+        index_path: str,
+        passages: List[str],
+        storage_mode: Optional[str],
+        reuse_from: Optional[str] = None,
+        metadata: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Write the index files for the passages at index_path
+        reuse_from: current index of the document, whose unchanged shards are kept
+        metadata: stored with each passage (see passage_metadata)
+        Returns: dict with backend name, storage mode, embedding throughput (None if not
+        measured) and, for sharded indices, shard build counts
+        """
+        if 0 < len(passages) <= self.flat_max_chunks:
+            # Small document: exact search over a plain embedding matrix (always stored),
+            # too few passages to be worth starting embedding workers
+            FlatIndex.build(
+                index_path, passages, metadata=metadata, vector_dtype=self.vector_dtype,
+                projection_dims=self.projection_dims, projection_method=self.projection_method
+            )
+            return {"backend": FLAT_BACKEND, "storage_mode": "full", "embedding": None}
+
+        storage_mode = self.resolve_storage_mode(len(passages), storage_mode)
+        shards = shard_count(len(passages), self.shard_chunks, self.max_shards)
+        if shards > 1:
+            return self._write_sharded(index_path, passages, storage_mode, shards, reuse_from, metadata)
+        return self._write_leann(index_path, passages, storage_mode, metadata)
+
+    def _write_leann(
+        self,
+        index_path: str,
+        passages: List[str],
+        storage_mode: str,
+        metadata: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """Build one LEANN index for the passages at index_path"""
+        recompute = storage_mode == "pruned"
+
+        # Auto-detect CUDA availability (can be overridden by config)
+        import torch
+        device = 'cuda' if (torch.cuda.is_available() and self.use_gpu) else 'cpu'
+
+        if not recompute and self.vector_dtype != "float32":
+            logger.info(f"LEANN_VECTOR_DTYPE applies to flat indices only, {index_path} stores float32 embeddings")
+
+        # Initialize builder with optimized settings
+        builder = LeannBuilder(
+            backend_name=self.backend,
+            device=device,
+            batch_size=self.batch_size,
+            is_compact=recompute,
+            is_recompute=recompute
+        )
+
+        # Add chunks to index
+        for chunk, chunk_metadata in zip(passages, metadata or [{}] * len(passages)):
+            builder.add_text(chunk, metadata=chunk_metadata)
+
+        # Build and save index
+        embeddings, stats = self._embed_for_build(passages, device)
+        projection = None
+        if self.projection_dims > 0 and passages:
+            if recompute:
+                # Pruned indices recompute full-size neighbour embeddings in LEANN's server
+                logger.info(f"LEANN_PROJECTION_DIMS ignored for pruned index {index_path}")
+            else:
+                if embeddings is None:
+                    _, threads = build_thread_budget(1, self.build_threads, self.num_threads)
+                    embeddings, stats = compute_embeddings_in_process(
+                        passages, EMBEDDING_MODEL, EMBEDDING_MODE, threads, self.batch_size
+                    )
+                if self.projection_dims < embeddings.shape[1]:
+                    projection = fit_projection(embeddings, self.projection_dims, self.projection_method)
+
+        if embeddings is None:
+            builder.build_index(index_path)
+        else:
+            # Precomputed embeddings, as (passage ids, matrix) in the order the passages were added
+            embeddings_file = f"{index_path}.build-embeddings.pkl"
+            vectors = embeddings if projection is None else embeddings @ projection
+            try:
+                with open(embeddings_file, "wb") as f:
+                    pickle.dump(([str(i) for i in range(len(passages))], vectors), f)
+                builder.build_index_from_embeddings(index_path, embeddings_file)
+            finally:
+                if os.path.exists(embeddings_file):
+                    os.remove(embeddings_file)
+
+        if projection is not None:
+            self._record_projection(index_path, embeddings, projection)
+        return {"backend": self.backend, "storage_mode": storage_mode, "embedding": stats}
+
+    def _write_sharded(
+        self,
+        index_path: str,
+        passages: List[str],
+        storage_mode: str,
+        shards: int,
+        reuse_from: Optional[str],
+        metadata: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Build the passages as shards in parallel worker processes (serially on GPU)
+        Shards of reuse_from with the same digest are linked instead of rebuilt.
+        """
+        start_time = time.perf_counter()
+        previous = {entry["offset"]: entry for entry in (read_sharded_meta(reuse_from) or {}).get("shards", [])} \
+            if reuse_from else {}
+
+        metadata = metadata or [{}] * len(passages)
+        entries = []
+        jobs = []
+        for shard, (start, end) in enumerate(shard_ranges(len(passages), shards)):
+            path = shard_path(index_path, shard)
+            digest = shard_digest(
+                passages[start:end], backend=self.backend, storage_mode=storage_mode,
+                projection_dims=self.projection_dims, projection_method=self.projection_method,
+                metadata=metadata[start:end]
+            )
+            entries.append({"file": os.path.basename(path), "offset": start, "count": end - start, "digest": digest})
+            old = previous.get(start)
+            reusable = old is not None and old["digest"] == digest and old["count"] == end - start
+            if not (reusable and self._link_index_files(
+                    os.path.join(os.path.dirname(reuse_from), old["file"]), path)):
+                jobs.append((path, passages[start:end], metadata[start:end]))
+
+        import torch
+        device = 'cuda' if (torch.cuda.is_available() and self.use_gpu) else 'cpu'
+        workers, threads = build_thread_budget(len(jobs), self.build_threads, self.num_threads)
+        if device == 'cuda' or workers <= 1:
+            # One GPU (or one core) gains nothing from several build processes
+            workers = 1
+            for path, shard_passages, shard_metadata in jobs:
+                self._write_leann(path, shard_passages, storage_mode, shard_metadata)
+        else:
+            # Spawned workers do not inherit torch / CUDA state from the API process
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=get_context("spawn"),
+                initializer=init_worker_threads,
+                initargs=(threads,)
+            ) as pool:
+                futures = [pool.submit(_build_shard, path, shard_passages, storage_mode, threads, shard_metadata)
+                           for path, shard_passages, shard_metadata in jobs]
+                for future in futures:
+                    future.result()
+
+        write_sharded_meta(index_path, {
+            "shard_backend": self.backend,
+            "num_passages": len(passages),
+            "is_pruned": storage_mode == "pruned",
+            "shards": entries,
+        })
+        seconds = time.perf_counter() - start_time
+        logger.info(
+            f"Built {len(jobs)} of {shards} shards for {index_path} "
+            f"({len(passages)} passages, {workers} workers) in {seconds:.2f}s"
+        )
+        return {
+            "backend": self.backend,
+            "storage_mode": storage_mode,
+            "embedding": None,
+            "shards": {"count": shards, "built": len(jobs), "reused": shards - len(jobs),
+                       "workers": workers, "seconds": seconds},
+        }
+
+    @staticmethod
+    def _link_index_files(source_path: str, index_path: str) -> bool:
+        """
+        Hard link (or copy) the files of the index at source_path to index_path
+        The meta file is rewritten instead: the passage paths it names must point
+        at the new prefix, or searchers of the new version would keep reading
+        the old version's files until they are removed.
+        """
+        meta_path = f"{source_path}.meta.json"
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        for path in glob.glob(f"{source_path}.*"):
+            if path == meta_path:
+                continue
+            target = f"{index_path}{path[len(source_path):]}"
+            try:
+                os.link(path, target)
+            except OSError:
+                shutil.copy2(path, target)
+
+        source_name, target_name = os.path.basename(source_path), os.path.basename(index_path)
+        for source in meta.get("passage_sources") or []:
+            for key in ("path", "index_path", "path_relative", "index_path_relative"):
+                value = source.get(key)
+                if isinstance(value, str) and os.path.basename(value).startswith(f"{source_name}."):
+                    name = target_name + os.path.basename(value)[len(source_name):]
+                    source[key] = os.path.join(os.path.dirname(index_path), name) \
+                        if os.path.isabs(value) else os.path.join(os.path.dirname(value), name)
+        with open(f"{index_path}.meta.json", "w") as f:
+            json.dump(meta, f, indent=2)
+        return True
+
+    def _record_projection(self, index_path: str, embeddings: Any, projection: Any) -> None:
+        """Store the projection of a LEANN index next to it and describe it in its meta file"""
+        save_projection(index_path, projection)
+        entry = describe(index_path, embeddings, projection, self.projection_method)
+        entry.update(measure_recall(embeddings, embeddings @ projection, None, projection=projection))
+
+        meta_path = f"{index_path}.meta.json"
+        with open(meta_path) as f:
+            meta = json.load(f)
+        meta["projection"] = entry
+        with open(f"{meta_path}.tmp", "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    @staticmethod
+    def storage_mode(index_path: str) -> Optional[str]:
+        """Storage mode of the index at index_path, None if there is no index"""
+        try:
+            with open(f"{index_path}.meta.json") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("backend_name") == FLAT_BACKEND:
+            return "full"
+        if meta.get("backend_name") == SHARDED_BACKEND:
+            return "pruned" if meta.get("is_pruned") else "full"
+        return "pruned" if meta.get("is_pruned", meta.get("is_compact", True)) else "full"
+
+    def get_storage_mode(self, document_id: str) -> Optional[str]:
+        """Storage mode of a document's index, None if it has none"""
+        return self.storage_mode(self._get_index_path(document_id))
+
+    def is_flat(self, document_id: str) -> bool:
+        """True when a document's index uses the exact flat backend"""
+        return FlatIndex.is_flat(self._get_index_path(document_id))
+
+    def _open_leann_searcher(self, index_path: str) -> LeannSearcher:
+        """Open one LEANN index (a document's or a shard's)"""
+        # Create searcher - use CUDA if available
+        import torch
+        device = 'cuda' if (torch.cuda.is_available() and self.use_gpu) else 'cpu'
+
+        # Initialize searcher with optimized settings; indices with stored
+        # embeddings search (and warm up) without the embedding server
+        searcher = LeannSearcher(
+            index_path,
+            recompute_embeddings=self.storage_mode(index_path) != "full",
+            device=device,
+            batch_size=self.batch_size
+        )
+        # Reduced-dimension indices need their queries projected before search
+        searcher.projection = load_projection(index_path)
+        # Like FlatIndex / ShardedIndex: the index version the searcher reads
+        searcher.index_path = index_path
+        return searcher
+
+    @contextmanager
+    def _use_searcher(self, document_id: str) -> Iterator[Union[LeannSearcher, FlatIndex, ShardedIndex]]:
+        """
+        Searcher of the served index version, held until the block exits: a rebuild
+        switching versions meanwhile releases this one only after it
+        """
+        with self._versions.lease(self._get_base_path(document_id)) as index_path:
+            yield self._get_searcher(document_id, index_path)
+
+    def _get_searcher(self, document_id: str, index_path: str) -> Union[LeannSearcher, FlatIndex, ShardedIndex]:
+        """Get a cached LEANN searcher for a document's index version, opening it if needed"""
+        # Query embedding runs in this process: keep it to its thread budget
+        apply_query_threads(self.num_threads)
+
+        with self._searchers_lock:
+            cached = self._searchers.get(document_id)
+            if cached is not None and cached[0] == index_path:
+                self._searchers.move_to_end(document_id)
+                return cached[1]
+
+        # Check if LEANN index files exist (LEANN stores as files with prefix, not directory)
+        meta_file = f"{index_path}.meta.json"
+        if not os.path.exists(meta_file):
+            raise ValueError(f"Index not found for document {document_id}")
+
+        if FlatIndex.is_flat(index_path):
+            searcher = FlatIndex.load(index_path)
+        elif ShardedIndex.is_sharded(index_path):
+            searcher = ShardedIndex.load(index_path, self._open_leann_searcher, self._search_leann)
+        else:
+            searcher = self._open_leann_searcher(index_path)
+
+        released = []
+        with self._searchers_lock:
+            # A searcher of another version (or opened concurrently) is replaced
+            replaced = self._searchers.pop(document_id, None)
+            if replaced is not None:
+                released.append(replaced)
+            self._searchers[document_id] = (index_path, searcher)
+            while len(self._searchers) > self.searcher_cache_size:
+                released.append(self._searchers.popitem(last=False)[1])
+        for path, evicted in released:
+            self._release_searcher(path, evicted)
+        return searcher
+
+    @staticmethod
+    def _close_searcher(searcher: Union[LeannSearcher, FlatIndex, ShardedIndex]) -> None:
+        """Release resources held by a searcher (embedding server)"""
+        try:
+            if hasattr(searcher, 'cleanup'):
+                searcher.cleanup()
+        except Exception as e:
+            logger.warning(f"Error closing LEANN searcher: {e}")
+
+    def _release_searcher(self, index_path: str, searcher: Union[LeannSearcher, FlatIndex, ShardedIndex]) -> None:
+        """Close a searcher dropped from the cache once no search is using its index version"""
+        self._versions.after_release(index_path, lambda: self._close_searcher(searcher))
+
+    def _invalidate_searcher(self, document_id: str) -> None:
+        """Drop a cached searcher after its index changed"""
+        search_tuner.forget(document_id)
+        with self._searchers_lock:
+            cached = self._searchers.pop(document_id, None)
+        if cached is not None:
+            self._release_searcher(*cached)
+
+    @staticmethod
+    def _format_results(results) -> List[Dict[str, Any]]:
+        """Format LEANN results as ranked dicts with text and score"""
+        formatted_results = []
+        for idx, result in enumerate(results):
+            # Handle both tuple format (text, score) and SearchResult objects
+            passage_id = None
+            metadata = {}
+            if isinstance(result, tuple):
+                text, score = result
+            else:
+                # SearchResult object has .id, .text, .score and .metadata attributes
+                text = result.text if hasattr(result, 'text') else str(result)
+                score = result.score if hasattr(result, 'score') else 0.0
+                passage_id = getattr(result, 'id', None)
+                metadata = getattr(result, 'metadata', None) or {}
+
+            formatted_results.append({
+                "rank": idx + 1,
+                "id": passage_id,
+                "text": text,
+                "score": float(score) if hasattr(score, '__float__') else score,
+                "metadata": metadata
+            })
+
+        return formatted_results
 
     def search(
         self,
         document_id: str,
         query: str,
-        top_k: int = 5
+        top_k: int = 5,
+        latency_budget_ms: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """
         Search LEANN index for relevant chunks
         Returns: list of dicts with chunk text and score
         """
+        return self.search_detailed(document_id, query, top_k, latency_budget_ms, filters)["results"]
+
+    def search_detailed(
+        self,
+        document_id: str,
+        query: str,
+        top_k: int = 5,
+        latency_budget_ms: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Search LEANN index, adapting HNSW search effort to a latency budget
+        latency_budget_ms: None uses LEANN_SEARCH_LATENCY_BUDGET_MS, 0 searches at the fixed complexity
+        filters: page_from / page_to (1-based, inclusive) and section (heading path prefix);
+        only the matching passages are searched
+        Returns: dict with results (as search) and the effective search settings
+        """
         try:
-            index_path = self._get_index_path(document_id)
+            filters = active_filters(filters)
+            with self._use_searcher(document_id) as searcher:
+                rows = self._filter_rows(searcher, filters) if filters else None
 
-            # Check if LEANN index files exist (LEANN stores as files with prefix, not directory)
-            meta_file = f"{index_path}.meta.json"
-            if not os.path.exists(meta_file):
-                raise ValueError(f"Index not found for document {document_id}")
+                if isinstance(searcher, FlatIndex):
+                    # Exact search has no effort setting to adapt
+                    start = time.perf_counter()
+                    results = searcher.search(query, top_k=top_k, rows=rows)
+                    return {
+                        "results": self._format_results(results),
+                        "search": {
+                            "backend": FLAT_BACKEND,
+                            "shards": None,
+                            "candidates": len(rows) if rows is not None else None,
+                            "complexity": None,
+                            "budget_ms": None,
+                            "elapsed_ms": (time.perf_counter() - start) * 1000
+                        }
+                    }
+
+                setting = search_tuner.choose(document_id, latency_budget_ms)
+                start = time.perf_counter()
+                if rows is not None and len(rows) == 0:
+                    results = []
+                else:
+                    results = self._search_leann(searcher, [query], top_k, setting["complexity"], rows)[0]
+                elapsed = time.perf_counter() - start
+                if rows is None:
+                    # Filtered searches cover a subset and would skew the latency estimate
+                    search_tuner.record(document_id, setting["complexity"], elapsed, setting["budget_ms"])
 
-            # Create searcher - use CUDA if available
-            import torch
-            device = 'cuda' if (torch.cuda.is_available() and self.use_gpu) else 'cpu'
+                return {
+                    "results": self._format_results(results),
+                    "search": {
+                        "backend": self.backend,
+                        "shards": len(searcher.shards) if isinstance(searcher, ShardedIndex) else None,
+                        "candidates": len(rows) if rows is not None else None,
+                        "complexity": setting["complexity"],
+                        "budget_ms": setting["budget_ms"],
+                        "elapsed_ms": elapsed * 1000
+                    }
+                }
 
-            # Initialize searcher with optimized settings
-            searcher = LeannSearcher(
-                index_path,
-                device=device,
-                batch_size=self.batch_size
+        except Exception as e:
+            raise Exception(f"Error searching index: {str(e)}")
+
+    def _search_leann(
+        self,
+        searcher: Union[LeannSearcher, ShardedIndex],
+        queries: List[str],
+        top_k: int,
+        complexity: Optional[int] = None,
+        rows: Optional[Any] = None
+    ) -> List[List[Any]]:
+        """
+        Search a LEANN index (or all shards of one) for a batch of queries
+        rows: passage ids to restrict the search to (a metadata filter's matches)
+        Returns: one ranked result list per query
+        """
+        if isinstance(searcher, ShardedIndex):
+            return searcher.search_batch(queries, top_k, complexity, rows)
+        if rows is not None:
+            return self._filtered_search(searcher, queries, top_k, complexity, rows)
+
+        recompute = getattr(searcher, "recompute_embeddings", True)
+        projected = getattr(searcher, "projection", None) is not None
+        if not recompute and (projected or uses_onnx(searcher.embedding_model)):
+            # Stored embeddings: the queries are embedded here (ONNX engine, projection)
+            return self._batch_vector_search(searcher, queries, top_k, complexity)
+        if len(queries) > 1:
+            try:
+                return self._batch_vector_search(searcher, queries, top_k, complexity)
+            except Exception as e:
+                logger.info(f"Batch vector search unavailable, searching per query: {e}")
+        # Recompute mode was set when the searcher was opened
+        return [
+            searcher.search(query, top_k=top_k, complexity=complexity or search_tuner.default_complexity)
+            for query in queries
+        ]
+
+    def _filtered_search(
+        self,
+        searcher: LeannSearcher,
+        queries: List[str],
+        top_k: int,
+        complexity: Optional[int],
+        rows: Any
+    ) -> List[List[Any]]:
+        """
+        Search only the given passages of a LEANN index
+        Up to LEANN_FLAT_MAX_CHUNKS candidates are scored exactly, like a flat index,
+        against their vectors (see _candidate_vectors); nothing else is touched.
+        Larger candidate sets use the graph, fetching more results in proportion
+        to how selective the filter is and keeping the matching ones.
+        """
+        import numpy as np
+
+        if len(rows) <= self.flat_max_chunks:
+            passages = [searcher.passage_manager.get_passage(str(row)) for row in rows]
+            vectors, stored = self._candidate_vectors(searcher, rows, passages)
+            query_vectors = embed_texts(queries, searcher.embedding_model, searcher.embedding_mode)
+            if stored and getattr(searcher, "projection", None) is not None:
+                # Stored vectors of reduced-dimension indices are projected
+                query_vectors = query_vectors @ searcher.projection
+            scores = query_vectors @ vectors.T
+            batch_results = []
+            for row_scores in scores:
+                batch_results.append([
+                    SimpleNamespace(
+                        id=str(rows[i]),
+                        text=passages[i]["text"],
+                        score=float(row_scores[i]),
+                        metadata=passages[i].get("metadata", {})
+                    )
+                    for i in np.argsort(-row_scores, kind="stable")[:top_k]
+                ])
+            return batch_results
+
+        total = len(searcher.passage_manager)
+        fetch = min(total, top_k * math.ceil(total / len(rows)))
+        allowed = {str(row) for row in rows}
+        batch_results = self._search_leann(
+            searcher, queries, fetch, max(complexity or search_tuner.default_complexity, fetch)
+        )
+        return [[result for result in results if str(result.id) in allowed][:top_k] for results in batch_results]
+
+    def _candidate_vectors(self, searcher: LeannSearcher, rows: Any, passages: List[Dict[str, Any]]) -> Tuple[Any, bool]:
+        """
+        Vectors of a filter's candidate passages, cached on the searcher by rows
+        Full-storage indices read them from the index; pruned ones embed the
+        passages once per distinct candidate set.
+        Returns: (vectors, True if read from the index)
+        """
+        import numpy as np
+
+        key = np.asarray(rows, dtype=np.int64).tobytes()
+        with self._candidates_lock:
+            cache = getattr(searcher, "candidate_vectors", None)
+            if cache is None:
+                cache = searcher.candidate_vectors = OrderedDict()
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+
+        entry = None
+        index = getattr(getattr(searcher, "backend_impl", None), "_index", None)
+        if not getattr(searcher, "recompute_embeddings", True) and index is not None:
+            try:
+                entry = (np.vstack([index.reconstruct(int(row)) for row in rows]).astype(np.float32), True)
+            except Exception as e:
+                logger.info(f"Stored vectors unavailable, embedding filter candidates: {e}")
+        if entry is None:
+            entry = (embed_texts([passage["text"] for passage in passages],
+                                 searcher.embedding_model, searcher.embedding_mode), False)
+
+        with self._candidates_lock:
+            cache[key] = entry
+            while len(cache) > CANDIDATE_CACHE_SIZE:
+                cache.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def _filter_rows(searcher: Union[LeannSearcher, FlatIndex, ShardedIndex], filters: Dict[str, Any]) -> Any:
+        """Ids of the passages of a searcher's index matching the filters (table kept on the searcher)"""
+        table = getattr(searcher, "passage_table", None)
+        if table is None:
+            if isinstance(searcher, FlatIndex):
+                table = PassageTable([passage.get("metadata") or {} for passage in searcher.passages])
+            else:
+                with open_passage_store(searcher.index_path) as store:
+                    table = PassageTable([passage["metadata"] for passage in store.page(0, len(store))])
+            searcher.passage_table = table
+        return table.select(filters)
+
+    def _batch_vector_search(
+        self,
+        searcher: LeannSearcher,
+        queries: List[str],
+        top_k: int,
+        complexity: Optional[int] = None
+    ) -> List[List[Any]]:
+        """
+        Embed all queries in one batch and run a single multi-query backend search
+        Uses LEANN searcher internals (backend_impl, passage_manager); callers
+        fall back to per-query search if they are not available.
+        Pruned indices reuse the embedding server the searcher started, on the port
+        LEANN allocated; until it runs, searches go through searcher.search.
+        """
+        import numpy as np
+        from leann.api import compute_embeddings
+
+        backend = searcher.backend_impl
+        recompute = bool(getattr(searcher, "recompute_embeddings", True))
+
+        zmq_port = None
+        if recompute:
+            # Pruned indices need the embedding server anyway: embed through it too
+            zmq_port = getattr(getattr(backend, "embedding_server_manager", None), "server_port", None)
+            if zmq_port is None:
+                raise RuntimeError("Embedding server not started yet")
+            embeddings = compute_embeddings(
+                queries, searcher.embedding_model, searcher.embedding_mode,
+                use_server=True, port=zmq_port
             )
+        else:
+            embeddings = embed_texts(queries, searcher.embedding_model, searcher.embedding_mode)
+            projection = getattr(searcher, "projection", None)
+            if projection is not None:
+                embeddings = embeddings @ projection
 
-            # Search
-            results = searcher.search(query, top_k=top_k)
+        top_k = min(top_k, len(searcher.passage_manager))
+        raw = backend.search(
+            np.asarray(embeddings, dtype=np.float32),
+            top_k,
+            complexity=complexity or search_tuner.default_complexity,
+            zmq_port=zmq_port,
+            recompute_embeddings=recompute
+        )
 
-            # Format results
-            formatted_results = []
-            for idx, result in enumerate(results):
-                # Handle both tuple format (text, score) and SearchResult objects
-                if isinstance(result, tuple):
-                    text, score = result
-                else:
-                    # SearchResult object has .text and .score attributes
-                    text = result.text if hasattr(result, 'text') else str(result)
-                    score = result.score if hasattr(result, 'score') else 0.0
+        batch_results = []
+        for labels, distances in zip(raw["labels"], raw["distances"]):
+            results = []
+            for passage_id, score in zip(labels, distances):
+                passage = searcher.passage_manager.get_passage(str(passage_id))
+                results.append(SimpleNamespace(
+                    id=str(passage_id),
+                    text=passage["text"],
+                    score=float(score),
+                    metadata=passage.get("metadata", {})
+                ))
+            batch_results.append(results)
+        return batch_results
 
-                formatted_results.append({
-                    "rank": idx + 1,
-                    "text": text,
-                    "score": float(score) if hasattr(score, '__float__') else score
-                })
+    def search_batch(
+        self,
+        document_id: str,
+        queries: List[str],
+        top_k: int = 5
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search one index for many queries at once
+        Returns: one list of result dicts (same format as search) per query
+        """
+        try:
+            with self._use_searcher(document_id) as searcher:
+                if isinstance(searcher, FlatIndex):
+                    return [self._format_results(results) for results in searcher.search_batch(queries, top_k)]
 
-            return formatted_results
+                batch_results = self._search_leann(searcher, queries, top_k)
+                return [self._format_results(results) for results in batch_results]
 
         except Exception as e:
             raise Exception(f"Error searching index: {str(e)}")
 
+    def get_passages(self, document_id: str, offset: int = 0, limit: int = 50) -> Dict[str, Any]:
+        """
+        Page through the passages (chunks) of a document's index in order
+        Returns: dict with the total number of passages and the requested page
+        """
+        with self._versions.lease(self._get_base_path(document_id)) as index_path:
+            if not os.path.exists(f"{index_path}.meta.json"):
+                raise ValueError(f"Index not found for document {document_id}")
+            with open_passage_store(index_path) as store:
+                return {"total": len(store), "passages": store.page(offset, limit)}
+
+    def get_passage(self, document_id: str, passage_id: str) -> Dict[str, Any]:
+        """Get one passage by id; raises KeyError if it does not exist"""
+        with self._versions.lease(self._get_base_path(document_id)) as index_path:
+            if not os.path.exists(f"{index_path}.meta.json"):
+                raise ValueError(f"Index not found for document {document_id}")
+            with open_passage_store(index_path) as store:
+                return store.get(passage_id)
+
     def delete_index(self, document_id: str) -> bool:
-        """Delete LEANN index for a document"""
+        """
+        Delete LEANN index for a document, returns True if any files existed
+        The served version's files are removed once the searches reading it finish.
+        """
         try:
-            index_path = self._get_index_path(document_id)
+            base_path = self._get_base_path(document_id)
+            served = self._versions.withdraw(base_path)
+            self._invalidate_searcher(document_id)
 
             # LEANN stores index as multiple files with prefix, not as directory
-            # Delete all files matching the pattern
-            pattern = f"{index_path}.*"
-            files_to_delete = glob.glob(pattern)
-
-            if files_to_delete:
-                for file in files_to_delete:
-                    os.remove(file)
-                return True
-            return False
+            existed = bool(version_files(base_path, served))
+            for version in existing_versions(base_path):
+                if version != served:
+                    existed = remove_version(base_path, version) or existed
+            self._versions.after_release(version_path(base_path, served), lambda: remove_version(base_path, served))
+            return existed
 
         except Exception as e:
             raise Exception(f"Error deleting index: {str(e)}")
@@ -232,5 +1118,22 @@ class LeannService:
         return os.path.exists(meta_file)
 
 
+def _build_shard(
+    index_path: str,
+    passages: List[str],
+    storage_mode: str,
+    threads: int,
+    metadata: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    Shard build worker: one LEANN index, embedded in this process
+    Runs in a spawned process with its own service instance and its share of the cores.
+    """
+    leann_service.build_workers = 0
+    leann_service.build_threads = threads
+    return leann_service._write_leann(index_path, passages, storage_mode, metadata)
+
+
 # Singleton instance
 leann_service = LeannService()
+
@@ -0,0 +1,149 @@
+"""
+Model Manager - Ollama model warm-up and residency
+Preloads models at startup, keeps them loaded and lets operators pin or evict them
+"""
+import logging
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+from app.config import settings
+from app.services.ollama_service import ollama_service
+from app.services.model_router import parse_model_list
+
+logger = logging.getLogger(__name__)
+
+# keep_alive value that keeps a model loaded until it is explicitly evicted
+KEEP_ALIVE_FOREVER = -1
+
+
+class ModelManager:
+    """Keeps configured Ollama models resident"""
+
+    def __init__(self):
+        self.client = ollama_service.client
+        self.preload_models = (
+            parse_model_list(settings.ollama_preload_models)
+            or parse_model_list(settings.ollama_model_tiers)
+            or [settings.ollama_model]
+        )
+        self.pinned_models = set(parse_model_list(settings.ollama_pinned_models))
+        self.evict_models = parse_model_list(settings.ollama_evict_models)
+        self.refresh_interval = settings.ollama_keep_alive_refresh_seconds
+        self.enabled = settings.ollama_preload_on_startup
+
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _keep_alive_for(self, model: str):
+        return KEEP_ALIVE_FOREVER if model in self.pinned_models else ollama_service.keep_alive
+
+    def _set_status(self, model: str, **fields) -> None:
+        with self._lock:
+            self._status.setdefault(model, {"model": model}).update(fields)
+
+    def resident_models(self) -> List[str]:
+        """Models that are kept loaded (preloaded and pinned)"""
+        # A copy: pin / evict requests change the lists while the refresh loop iterates
+        with self._lock:
+            return list(dict.fromkeys(self.preload_models + sorted(self.pinned_models)))
+
+    def load(self, model: str) -> bool:
+        """Load a model into Ollama memory (an empty generate loads without generating)"""
+        with self._lock:
+            entry = self._status.setdefault(model, {"model": model})
+            entry["pinned"] = model in self.pinned_models
+            if entry.get("status") != "ready":  # A keep-alive refresh does not flip readiness
+                entry["status"] = "loading"
+        start = time.time()
+        try:
+            # Loaded with the chats' context size, which they would otherwise reload it for
+            self.client.generate(
+                model=model, prompt="", options={'num_ctx': ollama_service.num_ctx},
+                keep_alive=self._keep_alive_for(model)
+            )
+            self._set_status(
+                model,
+                status="ready",
+                load_seconds=round(time.time() - start, 3),
+                last_refresh=time.time(),
+                error=None
+            )
+            return True
+        except Exception as e:
+            self._set_status(model, status="error", error=str(e))
+            logger.warning(f"Error loading model {model}: {e}")
+            return False
+
+    def evict(self, model: str) -> bool:
+        """Unload a model from Ollama memory"""
+        with self._lock:
+            self.pinned_models.discard(model)
+            if model in self.preload_models:
+                self.preload_models.remove(model)
+        try:
+            self.client.generate(model=model, prompt="", keep_alive=0)
+            self._set_status(model, status="evicted", pinned=False, error=None)
+            return True
+        except Exception as e:
+            self._set_status(model, status="error", error=str(e))
+            logger.warning(f"Error evicting model {model}: {e}")
+            return False
+
+    def pin(self, model: str) -> bool:
+        """Keep a model loaded until it is evicted"""
+        with self._lock:
+            self.pinned_models.add(model)
+        return self.load(model)
+
+    def _run(self) -> None:
+        for model in self.evict_models:
+            self.evict(model)
+        for model in self.resident_models():
+            self.load(model)
+
+        # Refresh keep-alive so resident models are not unloaded when idle
+        while self.refresh_interval > 0 and not self._stop.wait(self.refresh_interval):
+            for model in self.resident_models():
+                self.load(model)
+
+    def start(self) -> None:
+        """Warm up models in a background thread"""
+        if not self.enabled or self._thread is not None:
+            return
+        for model in self.resident_models():
+            self._set_status(model, status="pending", pinned=model in self.pinned_models)
+        self._thread = threading.Thread(target=self._run, name="ollama-model-manager", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the keep-alive refresh loop"""
+        self._stop.set()
+
+    def is_ready(self) -> bool:
+        """
+        True when the default chat model is loaded (always true with preloading disabled)
+        An operator evicting it does not make the service unready: Ollama loads
+        the model again on the next request.
+        """
+        if not self.enabled:
+            return True
+        with self._lock:
+            return self._status.get(settings.ollama_model, {}).get("status") in ("ready", "evicted")
+
+    def status(self) -> Dict[str, Any]:
+        """Preload status per model"""
+        ready = self.is_ready()
+        with self._lock:
+            return {
+                "ready": ready,
+                "preload_enabled": self.enabled,
+                "refresh_interval_seconds": self.refresh_interval,
+                "models": [dict(entry) for entry in self._status.values()]
+            }
+
+
+# Singleton instance
+model_manager = ModelManager()
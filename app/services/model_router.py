@@ -0,0 +1,141 @@
+"""
+Model Router - picks a model tier per query
+Simple lookups go to a small model, open questions to the large one
+"""
+import re
+import threading
+from collections import deque
+from typing import List, Dict, Any, Optional
+
+from app.config import settings
+
+# Questions asking for a single value from the document. Number abbreviations
+# are matched apart: "º" / "°" are not word characters, and a bare "no" is the
+# Spanish negation unless it is "No." followed by a number.
+EXTRACTION_PATTERN = re.compile(
+    r"\b(fecha|n[úu]mero|importe|total|cif|nif|dni|iban|titular|direcci[óo]n|"
+    r"periodo|per[íi]odo|potencia|tarifa|cups|nombre|tel[ée]fono|email|correo|"
+    r"date|number|amount|name|address|phone)\b"
+    r"|\bn\.?\s?[º°]"
+    r"|\bno\.(?=\s*\d)",
+    re.IGNORECASE
+)
+
+# Questions that need reasoning over several passages
+ANALYTICAL_PATTERN = re.compile(
+    r"\b(por qu[ée]|explica\w*|compar\w*|resum\w*|analiz\w*|diferencias?|ventajas|"
+    r"eval[úu]a\w*|why|explain\w*|summar\w*|analy\w*|differences?|pros|cons)\b",
+    re.IGNORECASE
+)
+
+
+def parse_model_list(value: str) -> List[str]:
+    """Parse a comma separated list of model names"""
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+class ModelRouter:
+    """Routes queries to a model tier using cheap signals"""
+
+    def __init__(self):
+        self.default_model = settings.ollama_model
+        self.tiers = parse_model_list(settings.ollama_model_tiers)  # smallest first
+        self.max_simple_words = settings.ollama_router_max_words
+        self.min_score_margin = settings.ollama_router_min_score_margin
+
+        self._lock = threading.Lock()
+        self._routes: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.tiers) > 1
+
+    def allowed_models(self) -> List[str]:
+        """Models a request may select explicitly"""
+        return list(dict.fromkeys(self.tiers + [self.default_model]))
+
+    def route(
+        self,
+        query: str,
+        scores: Optional[List[float]] = None,
+        override: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Pick a model for a query
+        Signals: short query, extraction-style question, clear top retrieval
+        score margin. Each simple signal moves the query one step towards the
+        smallest tier; analytical questions always go to the largest.
+        Returns: dict with model, route name and the signals used
+        """
+        if override:
+            return {"model": override, "route": "override", "signals": {}}
+        if not self.enabled:
+            return {"model": self.default_model, "route": "default", "signals": {}}
+
+        ranked = sorted(scores or [], reverse=True)
+        margin = None
+        if len(ranked) >= 2 and ranked[0]:
+            margin = (ranked[0] - ranked[1]) / abs(ranked[0])
+
+        signals = {
+            "short": len(query.split()) <= self.max_simple_words,
+            "extraction": bool(EXTRACTION_PATTERN.search(query)),
+            "confident_retrieval": margin is not None and margin >= self.min_score_margin,
+            "analytical": bool(ANALYTICAL_PATTERN.search(query)),
+        }
+
+        if signals["analytical"]:
+            tier = len(self.tiers) - 1
+        else:
+            simple = sum([signals["short"], signals["extraction"], signals["confident_retrieval"]])
+            tier = round((1 - simple / 3) * (len(self.tiers) - 1))
+
+        return {
+            "model": self.tiers[tier],
+            "route": f"tier{tier}",
+            "signals": signals
+        }
+
+    def record(self, route: str, model: str, seconds: float, ok: bool = True, cancelled: bool = False) -> None:
+        """Record latency and outcome of a routed generation (cancelled is neither success nor error)"""
+        key = f"{route}:{model}"
+        with self._lock:
+            entry = self._routes.setdefault(key, {
+                "route": route,
+                "model": model,
+                "count": 0,
+                "errors": 0,
+                "cancelled": 0,
+                "latencies": deque(maxlen=500)
+            })
+            entry["count"] += 1
+            if cancelled:
+                entry["cancelled"] += 1
+            elif ok:
+                entry["latencies"].append(seconds)
+            else:
+                entry["errors"] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Per-route counts and latency statistics"""
+        with self._lock:
+            routes = []
+            for entry in self._routes.values():
+                latencies = sorted(entry["latencies"])
+                routes.append({
+                    "route": entry["route"],
+                    "model": entry["model"],
+                    "count": entry["count"],
+                    "errors": entry["errors"],
+                    "cancelled": entry["cancelled"],
+                    "latency_seconds": {
+                        "avg": sum(latencies) / len(latencies) if latencies else 0.0,
+                        "p50": latencies[int(0.50 * (len(latencies) - 1))] if latencies else 0.0,
+                        "p95": latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+                    }
+                })
+            return {"enabled": self.enabled, "tiers": self.tiers, "routes": routes}
+
+
+# Singleton instance
+model_router = ModelRouter()
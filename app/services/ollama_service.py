@@ -1,24 +1,62 @@
 """
 Ollama Service - LLM inference using Ollama
 """
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union, Mapping, Iterator, Tuple
+from contextlib import closing
+import threading
+import time
 import ollama
 from app.config import settings
+from app.services.generation_scheduler import (
+    generation_scheduler,
+    SchedulerRejected,
+    GenerationCancelled,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_BACKGROUND,
+)
+from app.services.model_router import model_router
+from app.services.context_budget import (
+    TokenCounter,
+    ContextBudgetManager,
+    MESSAGE_OVERHEAD_TOKENS,
+    REPLY_PRIMER_TOKENS,
+)
 
 
 class OllamaService:
     """Service for interacting with Ollama LLM"""
 
+    # Max characters of each message passed to the summarizer
+    SUMMARY_MESSAGE_CHARS = 2000
+
     def __init__(self):
         self.base_url = settings.ollama_base_url
         self.model = settings.ollama_model
         self.temperature = settings.ollama_temperature
         self.max_tokens = settings.ollama_max_tokens
+        self.keep_alive = self._parse_keep_alive(settings.ollama_keep_alive)
+        self.num_ctx = settings.ollama_num_ctx
+
+        # Token accounting for prompt assembly against num_ctx
+        self.token_counter = TokenCounter(
+            tokenizer_name=settings.ollama_tokenizer,
+            chars_per_token=settings.ollama_chars_per_token
+        )
+        self.context_budget = ContextBudgetManager(
+            counter=self.token_counter,
+            num_ctx=self.num_ctx,
+            max_output_tokens=self.max_tokens,
+            budget_tokens=settings.ollama_context_budget_tokens,
+            history_messages=settings.ollama_history_messages
+        )
 
         # Initialize Ollama client with base URL
         self.client = ollama.Client(host=self.base_url)
 
-        # System prompt for RAG chat
+        # System prompt for RAG chat. It only holds the instructions: the
+        # document context is appended after it and the conversation goes in
+        # separate messages, so the rendered prompt starts with a stable prefix
+        # that Ollama can reuse from its KV cache across turns.
         self.system_prompt = """Eres un asistente útil que responde preguntas basándote SOLAMENTE en el contexto proporcionado.
 
 REGLAS IMPORTANTES:
@@ -27,46 +65,346 @@ REGLAS IMPORTANTES:
 3. Sé conciso y directo
 4. Cita partes relevantes del contexto cuando sea apropiado
 5. Responde en el mismo idioma de la pregunta
-6. No inventes información que no esté en el contexto
-
-Contexto del documento:
-{context}
+6. No inventes información que no esté en el contexto"""
 
-Conversación:
-{chat_history}
-
-Pregunta del usuario: {query}
-
-Respuesta:"""
+    @staticmethod
+    def _parse_keep_alive(value: str) -> Union[float, str]:
+        """Ollama accepts durations ("30m") or numbers of seconds (-1 = forever)"""
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return value
 
     def query(
         self,
         prompt: str,
         model: Optional[str] = None,
         temperature: Optional[float] = None,
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        priority: int = PRIORITY_INTERACTIVE
     ) -> str:
         """
         Query Ollama model with a prompt
         """
+        return self.query_messages(
+            messages=[{'role': 'user', 'content': prompt}],
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            priority=priority
+        )
+
+    def query_messages(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        priority: int = PRIORITY_INTERACTIVE
+    ) -> str:
+        """
+        Query Ollama model with a list of role/content messages
+        """
+        response = self._complete(messages, model, temperature, max_tokens, priority=priority)
+        return response['message']['content']
+
+    def _complete(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        queue_timeout: Optional[float] = None,
+        cancel_event: Optional[threading.Event] = None
+    ) -> Mapping[str, Any]:
+        """
+        Run a chat completion and return the raw Ollama response
+        Waits for a slot in the generation scheduler first; raises
+        SchedulerRejected when the request is not admitted.
+        cancel_event: Optional event set when the client goes away; the
+        generation is then streamed so it can be aborted between tokens, and
+        GenerationCancelled is raised
+        """
+        with generation_scheduler.slot(priority=priority, timeout=queue_timeout, cancel_event=cancel_event) as waited:
+            if cancel_event is None:
+                response = self._call_chat(messages, model, temperature, max_tokens)
+            else:
+                response = self._collect_stream(
+                    self._stream_chat(messages, model, temperature, max_tokens, cancel_event)
+                )
+        return {**response, "queue_wait_seconds": waited}
+
+    def _chat_options(self, temperature: Optional[float], max_tokens: Optional[int]) -> Dict[str, Any]:
+        return {
+            'temperature': temperature or self.temperature,
+            'num_predict': min(max_tokens or self.max_tokens, self.num_ctx),
+            # Keep num_ctx constant: changing it forces Ollama to reload the model
+            'num_ctx': self.num_ctx,
+            'top_p': 0.9
+        }
+
+    def _call_chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str],
+        temperature: Optional[float],
+        max_tokens: Optional[int]
+    ) -> Mapping[str, Any]:
+        """Send the chat request to Ollama"""
         try:
-            response = self.client.chat(
+            return self.client.chat(
                 model=model or self.model,
-                messages=[{
-                    'role': 'user',
-                    'content': prompt
-                }],
-                options={
-                    'temperature': temperature or self.temperature,
-                    'num_predict': max_tokens or self.max_tokens,
-                    'top_p': 0.9
-                }
+                messages=messages,
+                options=self._chat_options(temperature, max_tokens),
+                keep_alive=self.keep_alive
             )
 
-            return response['message']['content']
+        except Exception as e:
+            raise Exception(f"Error querying Ollama: {str(e)}")
 
+    def _stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        cancel_event: Optional[threading.Event] = None
+    ) -> Iterator[Mapping[str, Any]]:
+        """
+        Stream chat chunks from Ollama
+        Raises GenerationCancelled once cancel_event is set. Closing the stream
+        drops the HTTP connection, which makes Ollama stop generating.
+        """
+        stream = self.client.chat(
+            model=model or self.model,
+            messages=messages,
+            options=self._chat_options(temperature, max_tokens),
+            keep_alive=self.keep_alive,
+            stream=True
+        )
+        try:
+            for chunk in stream:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise GenerationCancelled("Client disconnected during generation")
+                yield chunk
+
+        except GenerationCancelled:
+            raise
         except Exception as e:
             raise Exception(f"Error querying Ollama: {str(e)}")
+        finally:
+            stream.close()
+
+    @staticmethod
+    def _collect_stream(chunks: Iterator[Mapping[str, Any]]) -> Mapping[str, Any]:
+        """Join streamed chunks into the shape of a non-streaming response"""
+        parts = []
+        final: Mapping[str, Any] = {}
+        for chunk in chunks:
+            parts.append(chunk.get('message', {}).get('content', ''))
+            if chunk.get('done'):
+                final = chunk
+        return {**final, 'message': {'role': 'assistant', 'content': ''.join(parts)}}
+
+    def prepare_chat(
+        self,
+        query: str,
+        context_chunks: List[str],
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        system_instruction: Optional[str] = None,
+        context_scores: Optional[List[float]] = None,
+        conversation_summary: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Build chat messages as a stable prefix plus a per-turn suffix
+        Prefix: system instruction, then document context (one system message)
+        Suffix: summary of older turns, recent turns as user/assistant
+        messages, then the new query
+        Context and history are trimmed to the token budget (history first).
+        Returns: dict with messages, the context chunks used, num_predict and usage
+        """
+        # Use custom system instruction if provided, otherwise use default
+        instruction = f"{system_instruction or self.system_prompt}\n\nContexto del documento:\n"
+
+        summary = f"Resumen de la conversación anterior:\n{conversation_summary}" if conversation_summary else ""
+
+        budgeted = self.context_budget.assemble(
+            instruction=instruction,
+            query=query,
+            context_chunks=context_chunks,
+            context_scores=context_scores,
+            chat_history=chat_history,
+            summary=summary
+        )
+
+        # Format context
+        context = "\n\n---\n\n".join(budgeted["context_chunks"])
+
+        messages = [{'role': 'system', 'content': f"{instruction}{context}"}]
+        if summary:
+            messages.append({'role': 'system', 'content': summary})
+        for msg in budgeted["chat_history"]:
+            messages.append({'role': msg['role'], 'content': msg.get('content', '')})
+        messages.append({'role': 'user', 'content': query})
+
+        return {
+            "messages": messages,
+            "context_chunks": budgeted["context_chunks"],
+            "num_predict": budgeted["num_predict"],
+            "usage": budgeted["usage"]
+        }
+
+    def _route_and_prepare(
+        self,
+        query: str,
+        context_chunks: List[str],
+        chat_history: Optional[List[Dict[str, str]]],
+        system_instruction: Optional[str],
+        context_scores: Optional[List[float]],
+        conversation_summary: Optional[str],
+        model: Optional[str]
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        routing = model_router.route(query, scores=context_scores, override=model)
+        prepared = self.prepare_chat(
+            query=query,
+            context_chunks=context_chunks,
+            chat_history=chat_history,
+            system_instruction=system_instruction,
+            context_scores=context_scores,
+            conversation_summary=conversation_summary
+        )
+        return routing, prepared
+
+    def _finish(
+        self,
+        routing: Dict[str, Any],
+        prepared: Dict[str, Any],
+        response: Mapping[str, Any]
+    ) -> Dict[str, Any]:
+        """Build the chat result and feed the real prompt size back into the estimator"""
+        usage = dict(prepared["usage"])
+        usage["prompt_eval_count"] = response.get('prompt_eval_count')
+        usage["eval_count"] = response.get('eval_count')
+
+        if usage["prompt_eval_count"]:
+            messages = prepared["messages"]
+            overhead = len(messages) * MESSAGE_OVERHEAD_TOKENS + REPLY_PRIMER_TOKENS
+            self.token_counter.calibrate(
+                prompt_chars=sum(len(m['content']) for m in messages),
+                observed_tokens=usage["prompt_eval_count"] - overhead
+            )
+
+        return {
+            "answer": response['message']['content'],
+            "context_chunks": prepared["context_chunks"],
+            "usage": usage,
+            "queue_wait_seconds": response["queue_wait_seconds"],
+            "model": routing["model"],
+            "route": routing["route"]
+        }
+
+    def chat_detailed(
+        self,
+        query: str,
+        context_chunks: List[str],
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        system_instruction: Optional[str] = None,
+        context_scores: Optional[List[float]] = None,
+        conversation_summary: Optional[str] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        model: Optional[str] = None,
+        cancel_event: Optional[threading.Event] = None
+    ) -> Dict[str, Any]:
+        """
+        Chat with context from RAG and report token usage
+        model: Optional explicit model, otherwise the router picks a tier
+        cancel_event: Optional event that aborts the generation when set
+        Returns: dict with answer, context chunks used, token usage and model
+        """
+        routing, prepared = self._route_and_prepare(
+            query, context_chunks, chat_history, system_instruction,
+            context_scores, conversation_summary, model
+        )
+
+        start = time.time()
+        try:
+            response = self._complete(
+                prepared["messages"],
+                model=routing["model"],
+                max_tokens=prepared["num_predict"],
+                priority=priority,
+                cancel_event=cancel_event
+            )
+        except GenerationCancelled:
+            model_router.record(routing["route"], routing["model"], time.time() - start, cancelled=True)
+            raise
+        except Exception as e:
+            if not isinstance(e, SchedulerRejected):
+                model_router.record(routing["route"], routing["model"], time.time() - start, ok=False)
+            raise
+        model_router.record(
+            routing["route"],
+            routing["model"],
+            time.time() - start - response["queue_wait_seconds"]
+        )
+
+        return self._finish(routing, prepared, response)
+
+    def chat_stream(
+        self,
+        query: str,
+        context_chunks: List[str],
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        system_instruction: Optional[str] = None,
+        context_scores: Optional[List[float]] = None,
+        conversation_summary: Optional[str] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        model: Optional[str] = None,
+        cancel_event: Optional[threading.Event] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Chat with context from RAG, streaming the answer
+        Yields: {"type": "token", "content": ...} events, then one
+        {"type": "done", ...} event with the fields returned by chat_detailed.
+        Closing the generator or setting cancel_event aborts the generation.
+        """
+        routing, prepared = self._route_and_prepare(
+            query, context_chunks, chat_history, system_instruction,
+            context_scores, conversation_summary, model
+        )
+
+        start = time.time()
+        parts = []
+        final: Mapping[str, Any] = {}
+        try:
+            with generation_scheduler.slot(priority=priority, cancel_event=cancel_event) as waited:
+                chunks = self._stream_chat(
+                    prepared["messages"], routing["model"], None, prepared["num_predict"], cancel_event
+                )
+                with closing(chunks):
+                    for chunk in chunks:
+                        content = chunk.get('message', {}).get('content', '')
+                        if content:
+                            parts.append(content)
+                            yield {"type": "token", "content": content}
+                        if chunk.get('done'):
+                            final = chunk
+        except (GenerationCancelled, GeneratorExit):
+            model_router.record(routing["route"], routing["model"], time.time() - start, cancelled=True)
+            raise
+        except Exception as e:
+            if not isinstance(e, SchedulerRejected):
+                model_router.record(routing["route"], routing["model"], time.time() - start, ok=False)
+            raise
+        model_router.record(routing["route"], routing["model"], time.time() - start - waited)
+
+        response = {
+            **final,
+            'message': {'role': 'assistant', 'content': ''.join(parts)},
+            'queue_wait_seconds': waited
+        }
+        yield {"type": "done", **self._finish(routing, prepared, response)}
 
     def chat(
         self,
@@ -79,47 +417,47 @@ Respuesta:"""
         Chat with context from RAG
         system_instruction: Optional custom system instruction (overrides default)
         """
-        # Format context
-        context = "\n\n---\n\n".join(context_chunks)
-
-        # Format chat history
-        history_text = ""
-        if chat_history:
-            for msg in chat_history[-5:]:  # Last 5 messages for context
-                role = msg.get('role', 'user')
-                content = msg.get('content', '')
-                if role == 'user':
-                    history_text += f"Usuario: {content}\n"
-                elif role == 'assistant':
-                    history_text += f"Asistente: {content}\n"
-
-        # Use custom system instruction if provided, otherwise use default
-        if system_instruction:
-            # Custom instruction - user provides full control
-            prompt = f"""{system_instruction}
+        return self.chat_detailed(
+            query=query,
+            context_chunks=context_chunks,
+            chat_history=chat_history,
+            system_instruction=system_instruction
+        )["answer"]
 
-Contexto del documento:
-{context}
+    def summarize_conversation(
+        self,
+        previous_summary: Optional[str],
+        messages: List[Dict[str, str]]
+    ) -> str:
+        """
+        Fold conversation turns into a running summary
+        Runs at background priority on the (cheap) summary model.
+        """
+        turns = ""
+        for msg in messages:
+            speaker = "Usuario" if msg.get('role') == 'user' else "Asistente"
+            turns += f"{speaker}: {msg.get('content', '')[:self.SUMMARY_MESSAGE_CHARS]}\n"
 
-Conversación previa:
-{history_text if history_text else "Esta es la primera pregunta."}
+        prompt = f"""Actualiza el resumen de una conversación sobre unos documentos.
+Conserva los datos concretos (nombres, fechas, importes, números) y las preguntas ya respondidas.
+Responde solo con el resumen actualizado, en el idioma de la conversación y en menos de 200 palabras.
 
-Pregunta del usuario: {query}
+Resumen actual:
+{previous_summary or "(vacío)"}
 
-Respuesta:"""
-        else:
-            # Default system prompt
-            prompt = self.system_prompt.format(
-                context=context,
-                chat_history=history_text if history_text else "Esta es la primera pregunta.",
-                query=query
-            )
+Nuevos mensajes:
+{turns}"""
 
-        # Query model
-        return self.query(prompt)
+        return self.query_messages(
+            messages=[{'role': 'user', 'content': prompt}],
+            model=settings.ollama_summary_model or self.model,
+            temperature=0.1,
+            max_tokens=settings.ollama_summary_max_tokens,
+            priority=PRIORITY_BACKGROUND
+        ).strip()
 
     def test_connection(self) -> Dict[str, Any]:
-        """Test connection to Ollama"""
+        """Test connection to Ollama (same options as chats, so the probe never reloads the model)"""
         try:
             response = self.client.chat(
                 model=self.model,
@@ -127,10 +465,8 @@ Respuesta:"""
                     'role': 'user',
                     'content': 'Say "OK" if you are working.'
                 }],
-                options={
-                    'temperature': 0.1,
-                    'num_predict': 10
-                }
+                options=self._chat_options(0.1, 10),
+                keep_alive=self.keep_alive
             )
 
             return {
@@ -0,0 +1,110 @@
+"""
+Passage Metadata - where each chunk sits in its document, and search filters on it
+Every passage records the pages it spans, the heading path it belongs to and
+its character offsets in the extracted text. Headings come from Markdown
+"#" lines and from the PDF outline. A PassageTable holds these fields for a
+whole index as arrays, so a filter such as "pages 3-4" or a section prefix
+resolves to the matching passage ids before any vector search.
+"""
+import bisect
+import re
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+# Search filter keys: page range (inclusive, 1-based) and heading path prefix
+FILTER_KEYS = ("page_from", "page_to", "section")
+
+# Separator of heading path levels when matching a section prefix
+HEADING_SEPARATOR = " > "
+
+_MARKDOWN_HEADING = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$", re.MULTILINE)
+
+
+def markdown_sections(text: str) -> List[List[Any]]:
+    """[offset, level, title] of every Markdown heading in the text"""
+    return [[match.start(), len(match.group(1)), match.group(2).strip()] for match in _MARKDOWN_HEADING.finditer(text)]
+
+
+def _heading_paths(sections: List[List[Any]]) -> Tuple[List[int], List[List[str]]]:
+    """Offsets of the sections in order, with the full heading path in effect from each"""
+    offsets = []
+    paths = []
+    stack: List[Tuple[int, str]] = []
+    for offset, level, title in sorted(sections, key=lambda section: section[0]):
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        stack.append((level, title))
+        offsets.append(offset)
+        paths.append([heading for _, heading in stack])
+    return offsets, paths
+
+
+def passage_metadata(
+    text: str,
+    spans: List[Tuple[int, int]],
+    pages: List[int],
+    sections: Optional[List[List[Any]]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Metadata of the passages text[start:end] for each span
+    pages: character offset where each page starts ([0] for unpaged text)
+    sections: [offset, level, title] headings besides the Markdown ones (PDF outline)
+    A passage belongs to the first heading that starts inside it, else to the
+    heading in effect where it starts (its first lines overlap the previous chunk).
+    """
+    offsets, paths = _heading_paths((sections or []) + markdown_sections(text))
+    pages = pages or [0]
+
+    metadata = []
+    for start, end in spans:
+        first_inside = bisect.bisect_left(offsets, start)
+        if first_inside < len(offsets) and offsets[first_inside] < end:
+            heading_path = paths[first_inside]
+        else:
+            heading_path = paths[first_inside - 1] if first_inside > 0 else []
+        metadata.append({
+            "page_start": bisect.bisect_right(pages, start),
+            "page_end": bisect.bisect_right(pages, max(start, end - 1)),
+            "heading_path": heading_path,
+            "char_start": start,
+            "char_end": end,
+        })
+    return metadata
+
+
+def active_filters(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Filters with a value set, None when nothing is filtered"""
+    if not filters:
+        return None
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unsupported search filters: {', '.join(sorted(unknown))}")
+    active = {key: value for key, value in filters.items() if value is not None and value != ""}
+    return active or None
+
+
+class PassageTable:
+    """Page range and heading path of every passage of one index, by passage id"""
+
+    def __init__(self, metadata: List[Dict[str, Any]]):
+        # Passages of indices built before metadata was recorded have no page (0)
+        self.page_start = np.array([meta.get("page_start") or 0 for meta in metadata], dtype=np.int32)
+        self.page_end = np.array([meta.get("page_end") or meta.get("page_start") or 0 for meta in metadata],
+                                 dtype=np.int32)
+        self.headings = [HEADING_SEPARATOR.join(meta.get("heading_path") or []).casefold() for meta in metadata]
+
+    def __len__(self) -> int:
+        return len(self.headings)
+
+    def select(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Ids (positions) of the passages matching all filters, in document order"""
+        mask = np.ones(len(self), dtype=bool)
+        if filters.get("page_from") is not None:
+            mask &= self.page_end >= filters["page_from"]
+        if filters.get("page_to") is not None:
+            mask &= (self.page_start <= filters["page_to"]) & (self.page_start > 0)
+        if filters.get("section"):
+            prefix = filters["section"].strip().casefold()
+            mask &= np.array([heading.startswith(prefix) for heading in self.headings], dtype=bool)
+        return np.flatnonzero(mask)
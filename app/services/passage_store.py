@@ -0,0 +1,151 @@
+"""
+Passage Store - memory-mapped reader for an index's passages
+Reads passage text by id from passages.jsonl without parsing the whole file.
+Line offsets are kept in a .passages.offsets.npy sidecar (derived once from
+LEANN's pickled passages.idx, or by scanning the jsonl) that is memory-mapped
+too, so lookups are O(1) and memory stays constant for very large documents.
+"""
+import json
+import mmap
+import os
+import pickle
+import tempfile
+import threading
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+# Serializes sidecar writes of concurrent first reads in this process
+_offsets_lock = threading.Lock()
+
+
+class PassageStore:
+    """Random access to the passages of one index"""
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self.jsonl_path = self._jsonl_path(index_path)
+        self.offsets_path = f"{index_path}.passages.offsets.npy"
+
+        if not os.path.exists(self.jsonl_path):
+            raise FileNotFoundError(f"Passages not found for index {index_path}")
+        if not self._offsets_current():
+            with _offsets_lock:
+                if not self._offsets_current():
+                    self._write_offsets()
+
+        self._file = open(self.jsonl_path, "rb")
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty file cannot be mapped
+            self._data = b""
+        self._offsets = np.load(self.offsets_path, mmap_mode="r")
+
+    @staticmethod
+    def _jsonl_path(index_path: str) -> str:
+        """Passages file named in the index meta (LEANN), else the default name"""
+        try:
+            with open(f"{index_path}.meta.json") as f:
+                sources = json.load(f).get("passage_sources") or []
+            for source in sources:
+                if source.get("type") == "jsonl":
+                    relative = source.get("path_relative") or source.get("path")
+                    path = os.path.join(os.path.dirname(index_path), os.path.basename(relative))
+                    if os.path.exists(path):
+                        return path
+        except (OSError, ValueError):
+            pass
+        return f"{index_path}.passages.jsonl"
+
+    def _offsets_current(self) -> bool:
+        return (
+            os.path.exists(self.offsets_path)
+            and os.path.getmtime(self.offsets_path) >= os.path.getmtime(self.jsonl_path)
+        )
+
+    def _write_offsets(self) -> None:
+        """
+        Store the byte offset of each passage, indexed by passage id
+        Ids are the dense 0..n-1 strings LEANN and the flat backend assign.
+        The temporary file is unique, so writers in other processes never share it.
+        """
+        offsets = self._offsets_from_idx()
+        if offsets is None:
+            offsets = self._scan_offsets()
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=f"{os.path.basename(self.offsets_path)}.", suffix=".tmp", dir=os.path.dirname(self.offsets_path) or "."
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.asarray(offsets, dtype=np.int64))
+            os.replace(tmp_path, self.offsets_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _offsets_from_idx(self) -> Optional[List[int]]:
+        """Offsets from LEANN's pickled {id: offset} file when ids are dense"""
+        idx_path = self.jsonl_path[:-len(".jsonl")] + ".idx"
+        if not os.path.exists(idx_path):
+            return None
+        try:
+            with open(idx_path, "rb") as f:
+                id_to_offset = pickle.load(f)
+            return [id_to_offset[str(i)] for i in range(len(id_to_offset))]
+        except (KeyError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _scan_offsets(self) -> List[int]:
+        offsets = []
+        with open(self.jsonl_path, "rb") as f:
+            position = 0
+            for line in f:
+                if line.strip():
+                    passage_id = json.loads(line)["id"]
+                    if str(passage_id) != str(len(offsets)):
+                        raise ValueError(f"Passage ids are not sequential in {self.jsonl_path}")
+                    offsets.append(position)
+                position += len(line)
+        return offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def _read(self, position: int) -> Dict[str, Any]:
+        start = int(self._offsets[position])
+        end = self._data.find(b"\n", start)
+        if end == -1:
+            end = len(self._data)
+        passage = json.loads(self._data[start:end])
+        return {
+            "id": str(passage.get("id", position)),
+            "text": passage.get("text", ""),
+            "metadata": passage.get("metadata") or {}
+        }
+
+    def get(self, passage_id: str) -> Dict[str, Any]:
+        """Passage by id; raises KeyError if it does not exist"""
+        try:
+            position = int(passage_id)
+        except (TypeError, ValueError):
+            raise KeyError(passage_id)
+        if not 0 <= position < len(self._offsets):
+            raise KeyError(passage_id)
+        return self._read(position)
+
+    def page(self, offset: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        """Passages in document order"""
+        end = min(offset + limit, len(self._offsets))
+        return [self._read(position) for position in range(max(offset, 0), end)]
+
+    def close(self) -> None:
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    def __enter__(self) -> "PassageStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,83 @@
+"""
+Projection - dimension reduction of embeddings for smaller, faster indices
+Projects the 768-dim embeddings to fewer dimensions with a matrix that is
+fitted on the document's own passages (PCA), or fixed (a seeded random
+orthogonal projection, or truncation for Matryoshka-trained models). The
+matrix is saved next to the index ({index}.projection.npy) and described in
+its meta file; queries are projected with the same matrix before searching.
+Recall against full-dimension search is measured with
+flat_index.measure_recall at build time.
+
+PCA here is uncentered (principal subspace of the raw vectors): the indices
+score by inner product, and that is what the projection has to preserve.
+"""
+import json
+import os
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+PROJECTION_METHODS = ("pca", "random", "truncate")
+
+
+def projection_path(index_path: str) -> str:
+    return f"{index_path}.projection.npy"
+
+
+def fit_projection(embeddings: np.ndarray, dimensions: int, method: str = "pca", seed: int = 0) -> np.ndarray:
+    """
+    Projection matrix (source dimensions x dimensions) for the embeddings
+    PCA needs at least as many passages as dimensions to fill the subspace;
+    with fewer, the remaining directions come from a random basis.
+    """
+    if method not in PROJECTION_METHODS:
+        raise ValueError(f"Unsupported projection method: {method} (expected one of {', '.join(PROJECTION_METHODS)})")
+    source_dimensions = embeddings.shape[1]
+    if not 0 < dimensions < source_dimensions:
+        raise ValueError(f"Projection dimensions must be between 1 and {source_dimensions - 1}, got {dimensions}")
+
+    if method == "truncate":
+        return np.eye(source_dimensions, dimensions, dtype=np.float32)
+
+    rng = np.random.default_rng(seed)
+    if method == "random":
+        basis, _ = np.linalg.qr(rng.normal(size=(source_dimensions, dimensions)))
+        return basis.astype(np.float32)
+
+    # Right singular vectors of the raw (uncentered) matrix, strongest first
+    _, _, vt = np.linalg.svd(embeddings.astype(np.float64), full_matrices=False)
+    components = vt[:dimensions].T
+    if components.shape[1] < dimensions:
+        # Complete with random directions orthogonal to the fitted ones
+        filler = rng.normal(size=(source_dimensions, dimensions - components.shape[1]))
+        filler -= components @ (components.T @ filler)
+        components = np.hstack([components, np.linalg.qr(filler)[0]])
+    return components.astype(np.float32)
+
+
+def describe(index_path: str, embeddings: np.ndarray, matrix: np.ndarray, method: str) -> Dict[str, Any]:
+    """Meta file entry: method, dimensions and how much of the vectors' energy is kept"""
+    total = float((embeddings.astype(np.float64) ** 2).sum())
+    kept = float(((embeddings @ matrix).astype(np.float64) ** 2).sum())
+    return {
+        "method": method,
+        "source_dimensions": int(matrix.shape[0]),
+        "dimensions": int(matrix.shape[1]),
+        "energy_kept": kept / total if total else 1.0,
+        "file": os.path.basename(projection_path(index_path)),
+    }
+
+
+def save_projection(index_path: str, matrix: np.ndarray) -> None:
+    np.save(projection_path(index_path), matrix)
+
+
+def load_projection(index_path: str) -> Optional[np.ndarray]:
+    """Projection of the index at index_path, None if it stores full vectors"""
+    try:
+        with open(f"{index_path}.meta.json") as f:
+            if not json.load(f).get("projection"):
+                return None
+    except (OSError, ValueError):
+        return None
+    return np.load(projection_path(index_path))
@@ -0,0 +1,132 @@
+"""
+Search Tuner - adapts HNSW search effort to a latency budget
+Keeps a moving average of search latency per document and complexity (the
+HNSW candidate list size, LEANN's ef) and picks the largest complexity that
+is expected to finish within the budget. Effort only widens one step at a
+time and only when the estimate leaves headroom, so under load recall drops
+a little instead of the tail latency growing.
+"""
+import threading
+from typing import List, Dict, Any, Optional
+
+from app.config import settings
+
+# Weight of the newest observation in the latency moving averages
+EWMA_ALPHA = 0.2
+
+# Fraction of the budget a wider setting must fit in before effort is increased
+WIDEN_HEADROOM = 0.8
+
+
+def parse_levels(value: str) -> List[int]:
+    """Parse a comma separated list of complexities, ascending"""
+    return sorted({int(level) for level in value.split(",") if level.strip()})
+
+
+class SearchTuner:
+    """Per-document choice of search complexity under a latency budget"""
+
+    def __init__(self):
+        self.levels = parse_levels(settings.leann_search_complexity_levels)
+        self.default_complexity = settings.leann_search_complexity
+        self.default_budget_ms = settings.leann_search_latency_budget_ms
+
+        self._lock = threading.Lock()
+        # document id -> {"current": complexity, "latency": {complexity: EWMA seconds}, ...}
+        self._documents: Dict[str, Dict[str, Any]] = {}
+
+    def _entry(self, document_id: str) -> Dict[str, Any]:
+        return self._documents.setdefault(document_id, {
+            "current": self.default_complexity,
+            "latency": {},
+            "searches": 0,
+            "over_budget": 0,
+        })
+
+    @staticmethod
+    def _estimate(latency: Dict[int, float], current: int, complexity: int) -> Optional[float]:
+        """
+        Expected seconds at a complexity, scaled from the current one
+        Averages of other levels may be stale (measured under different load),
+        the current level's is refreshed by every search.
+        """
+        if current not in latency:
+            return None
+        return latency[current] * complexity / current
+
+    def choose(self, document_id: str, budget_ms: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Pick the complexity for the next search of a document
+        budget_ms: None uses the configured default, 0 disables adaptation
+        Returns: dict with complexity, budget_ms and whether it was adapted
+        """
+        budget_ms = self.default_budget_ms if budget_ms is None else budget_ms
+        if not budget_ms or not self.levels:
+            return {"complexity": self.default_complexity, "budget_ms": None, "adapted": False}
+
+        budget = budget_ms / 1000
+        with self._lock:
+            entry = self._entry(document_id)
+            latency = entry["latency"]
+            current = entry["current"]
+            if current not in self.levels:
+                current = max([level for level in self.levels if level <= current] or self.levels[:1])
+
+            estimate = self._estimate(latency, current, current)
+            if estimate is not None and estimate > budget:
+                # Narrow to the largest level expected to fit
+                fitting = [level for level in self.levels
+                           if level < current and self._estimate(latency, current, level) <= budget]
+                chosen = fitting[-1] if fitting else self.levels[0]
+            else:
+                # Widen one step, and only with headroom
+                chosen = current
+                position = self.levels.index(current)
+                if position + 1 < len(self.levels):
+                    wider = self.levels[position + 1]
+                    estimate = self._estimate(latency, current, wider)
+                    if estimate is not None and estimate <= budget * WIDEN_HEADROOM:
+                        chosen = wider
+            entry["current"] = chosen
+
+        return {"complexity": chosen, "budget_ms": budget_ms, "adapted": True}
+
+    def record(self, document_id: str, complexity: int, seconds: float, budget_ms: Optional[float] = None) -> None:
+        """Record the latency of a search run at a complexity"""
+        with self._lock:
+            entry = self._entry(document_id)
+            latency = entry["latency"]
+            previous = latency.get(complexity)
+            latency[complexity] = seconds if previous is None else (
+                EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * previous
+            )
+            entry["searches"] += 1
+            if budget_ms and seconds * 1000 > budget_ms:
+                entry["over_budget"] += 1
+
+    def forget(self, document_id: str) -> None:
+        """Drop the measurements of a document whose index changed"""
+        with self._lock:
+            self._documents.pop(document_id, None)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Current complexity and latency averages per document"""
+        with self._lock:
+            documents = {
+                document_id: {
+                    "complexity": entry["current"],
+                    "searches": entry["searches"],
+                    "over_budget": entry["over_budget"],
+                    "latency_ms": {str(level): seconds * 1000 for level, seconds in sorted(entry["latency"].items())},
+                }
+                for document_id, entry in self._documents.items()
+            }
+        return {
+            "default_budget_ms": self.default_budget_ms or None,
+            "levels": self.levels,
+            "documents": documents,
+        }
+
+
+# Singleton instance
+search_tuner = SearchTuner()
@@ -0,0 +1,243 @@
+"""
+Sharded Index - one large document split into several LEANN indices
+Passages are split into contiguous ranges, each built as its own index
+({index}.shard_K.*) so shards can be built in parallel worker processes and
+rebuilt one at a time. The document's meta file lists the shards with the
+global id of their first passage and a digest of their content.
+
+Searches run on all shards concurrently; each shard returns its top-k in
+score order and the lists are merged k-way into the global top-k.
+"""
+import bisect
+import hashlib
+import heapq
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+import numpy as np
+
+from app.services.passage_store import PassageStore
+
+# Backend name written to the document's meta file (shards record their own backend)
+SHARDED_BACKEND = "sharded"
+
+
+def shard_count(num_passages: int, shard_chunks: int, max_shards: int) -> int:
+    """Shards for a document: one per shard_chunks passages, up to max_shards (shard_chunks 0 = never shard)"""
+    if shard_chunks <= 0 or num_passages <= shard_chunks:
+        return 1
+    return max(1, min(max_shards, math.ceil(num_passages / shard_chunks)))
+
+
+def shard_ranges(num_passages: int, shards: int) -> List[Tuple[int, int]]:
+    """Contiguous (start, end) passage ranges of near-equal size"""
+    base, extra = divmod(num_passages, shards)
+    ranges = []
+    start = 0
+    for shard in range(shards):
+        end = start + base + (1 if shard < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def shard_path(index_path: str, shard: int) -> str:
+    return f"{index_path}.shard_{shard}"
+
+
+def shard_digest(passages: List[str], **options) -> str:
+    """Content and build options of a shard: equal digests mean the shard can be reused"""
+    digest = hashlib.sha256(json.dumps(options, sort_keys=True).encode())
+    for passage in passages:
+        digest.update(hashlib.sha256(passage.encode("utf-8")).digest())
+    return digest.hexdigest()
+
+
+def read_meta(index_path: str) -> Optional[Dict[str, Any]]:
+    """Meta of a sharded index, None if the index at index_path is not sharded"""
+    try:
+        with open(f"{index_path}.meta.json") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("backend_name") == SHARDED_BACKEND else None
+
+
+def write_meta(index_path: str, meta: Dict[str, Any]) -> None:
+    """Written after all shards: the meta file marks the index as complete"""
+    with open(f"{index_path}.meta.json", "w") as f:
+        json.dump({"version": "1.0", "backend_name": SHARDED_BACKEND, **meta}, f, indent=2)
+
+
+def merge_top_k(ranked_lists: List[List[Any]], top_k: int) -> List[Any]:
+    """k-way merge of per-shard results, each already in descending score order"""
+    return list(islice(heapq.merge(*ranked_lists, key=lambda result: -result.score), top_k))
+
+
+def _global_results(results: List[Any], offset: int) -> List[SimpleNamespace]:
+    """Shard results with passage ids translated to document-wide ids"""
+    return [
+        SimpleNamespace(
+            id=str(offset + int(result.id)),
+            text=result.text,
+            score=float(result.score),
+            metadata=getattr(result, "metadata", None) or {}
+        )
+        for result in results
+    ]
+
+
+class ShardedIndex:
+    """Concurrent search over the shards of one document"""
+
+    def __init__(
+        self,
+        index_path: str,
+        meta: Dict[str, Any],
+        shards: List[Any],
+        search_shard: Callable[[Any, List[str], int, Optional[int], Optional[np.ndarray]], List[List[Any]]]
+    ):
+        self.index_path = index_path
+        self.meta = meta
+        self.shards = shards
+        self.offsets = [entry["offset"] for entry in meta["shards"]]
+        self.counts = [entry["count"] for entry in meta["shards"]]
+        self._search_shard = search_shard
+        self._pool = ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="shard-search")
+
+    @staticmethod
+    def is_sharded(index_path: str) -> bool:
+        return read_meta(index_path) is not None
+
+    @classmethod
+    def load(
+        cls,
+        index_path: str,
+        open_shard: Callable[[str], Any],
+        search_shard: Callable[[Any, List[str], int, Optional[int], Optional[np.ndarray]], List[List[Any]]]
+    ) -> "ShardedIndex":
+        """
+        Open every shard with open_shard; search_shard runs a batch of queries on one
+        of them (restricted to the given shard-local passage ids when not None)
+        """
+        meta = read_meta(index_path)
+        if meta is None:
+            raise ValueError(f"Not a sharded index: {index_path}")
+        directory = os.path.dirname(index_path)
+        shards = []
+        try:
+            for entry in meta["shards"]:
+                shards.append(open_shard(os.path.join(directory, entry["file"])))
+        except Exception:
+            for shard in shards:
+                if hasattr(shard, "cleanup"):
+                    shard.cleanup()
+            raise
+        return cls(index_path, meta, shards, search_shard)
+
+    def __len__(self) -> int:
+        return self.meta["num_passages"]
+
+    def search_batch(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        complexity: Optional[int] = None,
+        rows: Optional[np.ndarray] = None
+    ) -> List[List[SimpleNamespace]]:
+        """
+        Top-k per query over all shards, searched concurrently
+        rows: document-wide passage ids to search; shards holding none of them are skipped
+        """
+        targets = []
+        for shard, offset, count in zip(self.shards, self.offsets, self.counts):
+            if rows is None:
+                targets.append((shard, offset, None))
+                continue
+            local = rows[(rows >= offset) & (rows < offset + count)] - offset
+            if len(local):
+                targets.append((shard, offset, local))
+
+        per_shard = list(self._pool.map(
+            lambda target: self._search_shard(target[0], queries, top_k, complexity, target[2]), targets
+        ))
+        return [
+            merge_top_k([_global_results(results[query], target[1]) for results, target in zip(per_shard, targets)], top_k)
+            for query in range(len(queries))
+        ]
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        complexity: Optional[int] = None,
+        rows: Optional[np.ndarray] = None,
+        **kwargs
+    ) -> List[SimpleNamespace]:
+        return self.search_batch([query], top_k, complexity, rows)[0]
+
+    def cleanup(self) -> None:
+        """Release the shards' searchers (embedding servers) and the search threads"""
+        for shard in self.shards:
+            if hasattr(shard, "cleanup"):
+                shard.cleanup()
+        self._pool.shutdown(wait=False)
+
+
+class ShardedPassageStore:
+    """PassageStore interface over the passages of all shards, with document-wide ids"""
+
+    def __init__(self, index_path: str):
+        meta = read_meta(index_path)
+        if meta is None:
+            raise FileNotFoundError(f"Passages not found for index {index_path}")
+        directory = os.path.dirname(index_path)
+        self.offsets = [entry["offset"] for entry in meta["shards"]]
+        self.stores = []
+        try:
+            for entry in meta["shards"]:
+                self.stores.append(PassageStore(os.path.join(directory, entry["file"])))
+        except Exception:
+            self.close()
+            raise
+
+    def __len__(self) -> int:
+        return self.offsets[-1] + len(self.stores[-1]) if self.stores else 0
+
+    def get(self, passage_id: str) -> Dict[str, Any]:
+        """Passage by document-wide id; raises KeyError if it does not exist"""
+        try:
+            position = int(passage_id)
+        except (TypeError, ValueError):
+            raise KeyError(passage_id)
+        if not 0 <= position < len(self):
+            raise KeyError(passage_id)
+        shard = bisect.bisect_right(self.offsets, position) - 1
+        passage = self.stores[shard].get(str(position - self.offsets[shard]))
+        return {**passage, "id": str(position)}
+
+    def page(self, offset: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        end = min(offset + limit, len(self))
+        return [self.get(str(position)) for position in range(max(offset, 0), end)]
+
+    def close(self) -> None:
+        for store in self.stores:
+            store.close()
+
+    def __enter__(self) -> "ShardedPassageStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def open_passage_store(index_path: str):
+    """Passage reader for a sharded or single index"""
+    if read_meta(index_path) is not None:
+        return ShardedPassageStore(index_path)
+    return PassageStore(index_path)
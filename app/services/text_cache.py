@@ -0,0 +1,77 @@
+"""
+Text Cache - extracted document text stored next to the upload
+Parsing a PDF with PyMuPDF is done once; the text, the character offset
+where each page starts, the outline headings and what boilerplate removal
+saved are kept in a gzip compressed JSON sidecar
+({upload}.text.json.gz), so rebuilding an index only pays for chunking and
+embedding. The sidecar records the size and modification time of the upload
+and is ignored when they no longer match.
+"""
+import gzip
+import json
+import logging
+import os
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_SUFFIX = ".text.json.gz"
+CACHE_VERSION = 3
+
+
+def cache_path(file_path: str) -> str:
+    return f"{file_path}{CACHE_SUFFIX}"
+
+
+def _source_stamp(file_path: str) -> Dict[str, Any]:
+    stat = os.stat(file_path)
+    return {"source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns}
+
+
+def load(file_path: str) -> Optional[Dict[str, Any]]:
+    """Cached text, page offsets and sections for an upload, None if missing or stale"""
+    path = cache_path(file_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            cached = json.load(f)
+        stamp = _source_stamp(file_path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable text cache {path}: {e}")
+        return None
+    if cached.get("version") != CACHE_VERSION or any(cached.get(key) != value for key, value in stamp.items()):
+        return None
+    return cached
+
+
+def save(
+    file_path: str,
+    text: str,
+    pages: List[int],
+    sections: Optional[List[List[Any]]] = None,
+    boilerplate: Optional[Dict[str, Any]] = None
+) -> None:
+    """
+    Store the extracted text of an upload; failures only cost a re-parse later
+    sections: [offset, level, title] of the document's outline headings
+    boilerplate: removed header / footer lines and savings, None if not applied
+    """
+    path = cache_path(file_path)
+    tmp_path = f"{path}.tmp"
+    try:
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump({"version": CACHE_VERSION, **_source_stamp(file_path), "pages": pages,
+                       "sections": sections or [], "boilerplate": boilerplate, "text": text},
+                      f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write text cache {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def remove(file_path: str) -> None:
+    path = cache_path(file_path)
+    if os.path.exists(path):
+        os.remove(path)
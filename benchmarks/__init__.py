@@ -0,0 +1,3 @@
+"""
+Load testing and benchmark tools (not imported by the application)
+"""
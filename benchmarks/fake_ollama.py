@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Fake Ollama server for load and latency testing
+Implements the /api/chat, /api/generate, /api/tags and /api/embeddings shapes
+used by OllamaService with configurable latency, throughput and errors, so the
+chat pipeline can be benchmarked without a GPU.
+
+Usage:
+    python -m benchmarks.fake_ollama --port 11435 --ttft 0.3 --tokens-per-second 40
+    OLLAMA_BASE_URL=http://localhost:11435 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, AsyncIterator
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Words the fake answers are made of
+VOCABULARY = (
+    "según el documento la factura indica que el importe total es de euros "
+    "para el periodo de facturación con fecha y titular del contrato"
+).split()
+
+
+@dataclass
+class FakeOllamaConfig:
+    """Latency and capacity profile of the fake server"""
+    ttft: float = 0.2  # Seconds before the first token (model already loaded)
+    prompt_tokens_per_second: float = 0.0  # Prompt evaluation speed, 0 = included in ttft
+    tokens_per_second: float = 50.0  # Generation speed
+    response_tokens: int = 64  # Tokens per answer, capped by options.num_predict
+    error_rate: float = 0.0  # Fraction of requests answered with HTTP 500
+    max_concurrency: int = 1  # Requests generating at the same time (OLLAMA_NUM_PARALLEL)
+    max_queue: int = 512  # Waiting requests before answering 503 (OLLAMA_MAX_QUEUE)
+    load_seconds: float = 0.0  # Extra latency the first time a model is used
+    embedding_dim: int = 768
+    models: List[str] = field(default_factory=lambda: ["qwen2.5:7b-instruct"])
+    seed: Optional[int] = None
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeOllama:
+    """Request handling state: admission, loaded models and counters"""
+
+    def __init__(self, config: FakeOllamaConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.slots = asyncio.Semaphore(max(1, config.max_concurrency))
+        self.waiting = 0
+        self.loaded_models = set()
+        self.counters = {"requests": 0, "errors": 0, "busy": 0, "cancelled": 0, "completed": 0}
+
+    def _options(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        return body.get("options") or {}
+
+    def _num_tokens(self, body: Dict[str, Any]) -> int:
+        num_predict = self._options(body).get("num_predict")
+        if num_predict is None or num_predict < 0:
+            return self.config.response_tokens
+        return min(self.config.response_tokens, num_predict)
+
+    def _tokens(self, count: int) -> List[str]:
+        return [(" " if i else "") + self.random.choice(VOCABULARY) for i in range(count)]
+
+    async def _prefill(self, model: str, prompt_tokens: int) -> float:
+        """Sleep for model load and time-to-first-token, returns seconds spent"""
+        start = time.monotonic()
+        if model not in self.loaded_models:
+            await asyncio.sleep(self.config.load_seconds)
+            self.loaded_models.add(model)
+        delay = self.config.ttft
+        if self.config.prompt_tokens_per_second > 0:
+            delay += prompt_tokens / self.config.prompt_tokens_per_second
+        await asyncio.sleep(delay)
+        return time.monotonic() - start
+
+    async def _token_delay(self) -> None:
+        if self.config.tokens_per_second > 0:
+            await asyncio.sleep(1.0 / self.config.tokens_per_second)
+
+    def _stats(self, prompt_tokens: int, eval_count: int, prefill: float, generation: float) -> Dict[str, Any]:
+        # Ollama reports durations in nanoseconds
+        return {
+            "total_duration": int((prefill + generation) * 1e9),
+            "load_duration": 0,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prefill * 1e9),
+            "eval_count": eval_count,
+            "eval_duration": int(generation * 1e9),
+        }
+
+    def busy(self) -> bool:
+        """True when the wait queue is full"""
+        if self.waiting >= self.config.max_queue:
+            self.counters["busy"] += 1
+            return True
+        return False
+
+    def fails(self) -> bool:
+        return self.random.random() < self.config.error_rate
+
+    async def generate(
+        self,
+        body: Dict[str, Any],
+        prompt_tokens: int,
+        wrap
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Wait for a generation slot and produce the response chunks of one request
+        wrap: builds the endpoint specific chunk from (text, done)
+        """
+        model = body.get("model", "")
+        num_tokens = self._num_tokens(body)
+
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        try:
+            prefill = await self._prefill(model, prompt_tokens)
+            start = time.monotonic()
+            for token in self._tokens(num_tokens):
+                yield wrap(token, False)
+                await self._token_delay()
+            final = wrap("", True)
+            final.update(self._stats(prompt_tokens, num_tokens, prefill, time.monotonic() - start))
+            self.counters["completed"] += 1
+            yield final
+        except (asyncio.CancelledError, GeneratorExit):
+            self.counters["cancelled"] += 1
+            raise
+        finally:
+            self.slots.release()
+
+
+def create_app(config: FakeOllamaConfig) -> FastAPI:
+    """Build the fake Ollama application"""
+    app = FastAPI(title="Fake Ollama")
+    fake = FakeOllama(config)
+    app.state.fake = fake
+
+    async def respond(body: Dict[str, Any], prompt_tokens: int, wrap):
+        fake.counters["requests"] += 1
+        if fake.fails():
+            fake.counters["errors"] += 1
+            return JSONResponse(status_code=500, content={"error": "fake ollama: injected error"})
+        if fake.busy():
+            return JSONResponse(status_code=503, content={"error": "server busy, please try again.  maximum pending requests exceeded"})
+
+        chunks = fake.generate(body, prompt_tokens, wrap)
+        if body.get("stream", True):
+            async def lines():
+                async for chunk in chunks:
+                    yield json.dumps(chunk) + "\n"
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+        # Non-streaming: join the chunks into one response
+        text = []
+        final = {}
+        async for chunk in chunks:
+            final = chunk
+            text.append(chunk.get("message", {}).get("content", chunk.get("response", "")))
+        if "message" in final:
+            final["message"]["content"] = "".join(text)
+        else:
+            final["response"] = "".join(text)
+        return JSONResponse(final)
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        model = body.get("model", "")
+        messages = body.get("messages") or []
+        prompt_tokens = sum(_estimate_tokens(m.get("content", "")) + 4 for m in messages)
+
+        def wrap(text: str, done: bool) -> Dict[str, Any]:
+            return {
+                "model": model,
+                "created_at": _now(),
+                "message": {"role": "assistant", "content": text},
+                "done": done,
+            }
+
+        return await respond(body, prompt_tokens, wrap)
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        model = body.get("model", "")
+        prompt = body.get("prompt", "")
+
+        # An empty prompt only loads (keep_alive > 0) or unloads (keep_alive = 0) the model
+        if not prompt:
+            if body.get("keep_alive") in (0, "0", "0s"):
+                fake.loaded_models.discard(model)
+            elif model not in fake.loaded_models:
+                await asyncio.sleep(config.load_seconds)
+                fake.loaded_models.add(model)
+            return JSONResponse({"model": model, "created_at": _now(), "response": "", "done": True})
+
+        def wrap(text: str, done: bool) -> Dict[str, Any]:
+            return {"model": model, "created_at": _now(), "response": text, "done": done}
+
+        return await respond(body, _estimate_tokens(prompt), wrap)
+
+    @app.get("/api/tags")
+    async def tags():
+        return {
+            "models": [
+                {
+                    "name": name,
+                    "model": name,
+                    "modified_at": _now(),
+                    "size": 0,
+                    "digest": hashlib.sha256(name.encode()).hexdigest(),
+                    "details": {"format": "gguf", "family": "fake", "parameter_size": "", "quantization_level": ""},
+                }
+                for name in config.models
+            ]
+        }
+
+    @app.post("/api/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        # Deterministic unit vector per prompt
+        digest = hashlib.sha256(body.get("prompt", "").encode()).digest()
+        rng = np.random.default_rng(int.from_bytes(digest[:8], "little"))
+        vector = rng.standard_normal(config.embedding_dim)
+        vector /= np.linalg.norm(vector)
+        return {"embedding": vector.tolist()}
+
+    @app.get("/stats")
+    async def stats():
+        return {**fake.counters, "waiting": fake.waiting, "loaded_models": sorted(fake.loaded_models)}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--ttft", type=float, default=0.2, help="Seconds to first token")
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=0.0,
+                        help="Prompt evaluation speed added to ttft (0 = disabled)")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--response-tokens", type=int, default=64)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--max-concurrency", type=int, default=1)
+    parser.add_argument("--max-queue", type=int, default=512)
+    parser.add_argument("--load-seconds", type=float, default=0.0)
+    parser.add_argument("--models", default="qwen2.5:7b-instruct", help="Comma separated model names")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeOllamaConfig(
+        ttft=args.ttft,
+        prompt_tokens_per_second=args.prompt_tokens_per_second,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        error_rate=args.error_rate,
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+        load_seconds=args.load_seconds,
+        models=[name.strip() for name in args.models.split(",") if name.strip()],
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the ingestion hot paths
+Times LeannService.extract_text_from_pdf, chunk_text and build_index and the
+result merge/formatting of chat queries over synthetic Markdown and PDF inputs
+(10 KB to 100 MB). Records time and peak memory, saves baselines as JSON and
+flags regressions against a saved baseline.
+
+Usage:
+    python -m benchmarks.ingestion_bench --save-baseline benchmarks/baselines/ingestion.json
+    python -m benchmarks.ingestion_bench --compare benchmarks/baselines/ingestion.json --threshold 0.15
+    python -m benchmarks.ingestion_bench --sizes 10KB,1MB,100MB --only chunk_text
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import List, Dict, Any, Callable, Optional
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_SIZES = "10KB,100KB,1MB,10MB"
+BENCHMARKS = ("extract_text_from_pdf", "chunk_text", "build_index", "merge_results")
+
+WORDS = (
+    "factura suministro potencia energía consumo periodo importe total titular contrato "
+    "lectura contador impuesto eléctrico alquiler equipo medida tarifa acceso peaje "
+    "cargo término fijo variable kilovatio hora descuento bono social cliente dirección"
+).split()
+
+# Characters of text per synthetic PDF page
+PDF_PAGE_CHARS = 3000
+
+
+def parse_size(value: str) -> int:
+    """Parse sizes like 10KB, 1MB or 512 into bytes"""
+    value = value.strip().upper()
+    for suffix, factor in (("GB", 1024 ** 3), ("MB", 1024 ** 2), ("KB", 1024), ("B", 1)):
+        if value.endswith(suffix):
+            return int(float(value[:-len(suffix)]) * factor)
+    return int(value)
+
+
+def format_size(size: int) -> str:
+    for suffix, factor in (("MB", 1024 ** 2), ("KB", 1024)):
+        if size >= factor:
+            return f"{size / factor:g}{suffix}"
+    return f"{size}B"
+
+
+# ---------------------------------------------------------------------------
+# Synthetic inputs
+# ---------------------------------------------------------------------------
+
+def synthetic_markdown(size: int, seed: int = 0) -> str:
+    """Markdown with headers, paragraphs and tables, about `size` bytes long"""
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    section = 0
+    while length < size:
+        section += 1
+        block = [f"## Sección {section}", ""]
+        for _ in range(rng.randint(2, 5)):
+            block.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 120))) + ".")
+            block.append("")
+        if section % 4 == 0:
+            block.append("| Concepto | Cantidad | Importe |")
+            block.append("|---|---|---|")
+            for _ in range(rng.randint(3, 8)):
+                block.append(f"| {rng.choice(WORDS)} | {rng.randint(1, 900)} | {rng.uniform(1, 500):.2f} € |")
+            block.append("")
+        text = "\n".join(block) + "\n"
+        parts.append(text)
+        length += len(text.encode("utf-8"))
+    return "".join(parts)[:size]
+
+
+def ensure_markdown(workdir: str, size: int) -> str:
+    path = os.path.join(workdir, f"synthetic_{size}.md")
+    if not os.path.exists(path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(synthetic_markdown(size))
+    return path
+
+
+def ensure_pdf(workdir: str, size: int) -> str:
+    """PDF holding about `size` bytes of extractable text"""
+    import fitz  # PyMuPDF
+
+    path = os.path.join(workdir, f"synthetic_{size}.pdf")
+    if os.path.exists(path):
+        return path
+
+    text = synthetic_markdown(size)
+    doc = fitz.open()
+    for start in range(0, len(text), PDF_PAGE_CHARS):
+        page = doc.new_page()
+        page.insert_textbox(page.rect + (36, 36, -36, -36), text[start:start + PDF_PAGE_CHARS], fontsize=6)
+    doc.save(path, deflate=True)
+    doc.close()
+    return path
+
+
+def synthetic_results(documents: int, top_k: int, seed: int = 0):
+    """Search results shaped like LeannService.search output, grouped by document"""
+    rng = random.Random(seed)
+    results_by_document = []
+    for d in range(documents):
+        document = type("Document", (), {"id": d + 1, "title": f"Documento {d + 1}"})()
+        results = [
+            {
+                "id": str(i),
+                "text": " ".join(rng.choice(WORDS) for _ in range(150)),
+                "score": rng.random(),
+                "metadata": {},
+            }
+            for i in range(top_k)
+        ]
+        results_by_document.append((document, results))
+    return results_by_document
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """
+    Time `repeat` runs, then one more run under tracemalloc for peak Python memory
+    Native allocations (e.g. torch) only show in max_rss_mb, which is process wide.
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds": statistics.median(times),
+        "seconds_min": min(times),
+        "peak_python_mb": peak / 1024 ** 2,
+        "max_rss_mb": _max_rss_mb(),
+        "runs": repeat,
+    }
+
+
+def run_benchmarks(args) -> Dict[str, Any]:
+    workdir = args.workdir or tempfile.mkdtemp(prefix="rag_ingestion_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    # Keep benchmark indices out of the application's data directory
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ["LEANN_INDEX_PATH"] = os.path.join(workdir, "leann_index")
+
+    from app.services.leann_service import leann_service
+
+    sizes = [parse_size(size) for size in args.sizes.split(",") if size.strip()]
+    selected = [name for name in BENCHMARKS if not args.only or name in args.only.split(",")]
+    results: Dict[str, Dict[str, Any]] = {}
+
+    def record(name: str, size: Optional[int], func: Callable[[], Any], repeat: int):
+        print(f"  {name} ...", end="", flush=True)
+        try:
+            result = measure(func, repeat)
+        except Exception as e:
+            print(f" skipped ({e})")
+            results[name] = {"skipped": str(e)}
+            return
+        if size:
+            result["bytes"] = size
+            result["mb_per_second"] = size / 1024 ** 2 / result["seconds"] if result["seconds"] else 0.0
+        results[name] = result
+        print(f" {result['seconds'] * 1000:.1f} ms, peak {result['peak_python_mb']:.1f} MB")
+
+    for size in sizes:
+        label = format_size(size)
+        print(f"Input size {label}")
+
+        if "extract_text_from_pdf" in selected:
+            pdf_path = ensure_pdf(workdir, size)
+            record(f"extract_text_from_pdf[{label}]", size,
+                   lambda: leann_service.extract_text_from_pdf(pdf_path), args.repeat)
+
+        if "chunk_text" in selected or "build_index" in selected:
+            md_path = ensure_markdown(workdir, size)
+
+        if "chunk_text" in selected:
+            with open(md_path, encoding="utf-8") as f:
+                text = f.read()
+            record(f"chunk_text[{label}]", size, lambda: leann_service.chunk_text(text), args.repeat)
+
+        if "build_index" in selected:
+            if size > parse_size(args.build_max_size):
+                print(f"  build_index[{label}] skipped (above --build-max-size)")
+            else:
+                def build():
+                    result = leann_service.build_index(f"bench_{size}", md_path, "text/markdown")
+                    if result["status"] != "success":
+                        raise RuntimeError(result.get("error"))
+                record(f"build_index[{label}]", size, build, 1)
+
+    if "merge_results" in selected:
+        from app.api.v1.endpoints.chat import _select_context, _format_context_chunks
+
+        print("Result merge")
+        for documents in (1, 5, 20):
+            results_by_document = synthetic_results(documents, args.top_k)
+
+            def merge():
+                for _ in range(100):
+                    _format_context_chunks(_select_context(results_by_document, args.top_k, None))
+            record(f"merge_results[{documents}docs x100]", None, merge, args.repeat)
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "sizes": args.sizes,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Baselines
+# ---------------------------------------------------------------------------
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """
+    Benchmarks whose time or peak memory grew by more than `threshold` (fraction)
+    Time uses the fastest run, which is less sensitive to noise than the median.
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous or "skipped" in result or "skipped" in previous:
+            continue
+        for metric in ("seconds_min", "peak_python_mb"):
+            if previous[metric] <= 0:
+                continue
+            change = result[metric] / previous[metric] - 1
+            if change > threshold:
+                regressions.append({
+                    "benchmark": name,
+                    "metric": metric,
+                    "baseline": previous[metric],
+                    "current": result[metric],
+                    "change": change,
+                })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestion microbenchmarks")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Input sizes (default {DEFAULT_SIZES}, up to 100MB)")
+    parser.add_argument("--only", help=f"Comma separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark (median reported)")
+    parser.add_argument("--build-max-size", default="1MB", help="Largest input for build_index (needs the embedding model)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--workdir", help="Directory for generated inputs, reused between runs")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--save-baseline", help="Write results as the new baseline")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Regression threshold as a fraction (default 0.2)")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"Results written to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        print("=" * 72)
+        if not regressions:
+            print(f"No regressions above {args.threshold:.0%} against {args.compare}")
+        for regression in regressions:
+            print(f"REGRESSION {regression['benchmark']} {regression['metric']}: "
+                  f"{regression['baseline']:.4g} -> {regression['current']:.4g} ({regression['change']:+.0%})")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
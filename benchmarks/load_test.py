@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test for the chat API
+Uploads a seeded synthetic document corpus, creates chat sessions over it and
+replays a weighted query mix against /chat/query at a fixed concurrency
+(closed loop) or arrival rate (open loop). Reports throughput, error rates and
+p50/p95/p99 latency, overall and per pipeline stage (retrieval, queue wait,
+generation) from the timings returned by the API.
+
+Usage:
+    # Fully offline: starts the fake Ollama server and the API in-process
+    python -m benchmarks.load_test --spawn --documents 4 --sessions 8 --concurrency 8 --requests 200
+
+    # Against a running deployment
+    python -m benchmarks.load_test --base-url http://localhost:6956 --rate 2 --duration 60
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
+
+import httpx
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+API_PREFIX = "/api/v1"
+
+# Query templates per category; {field} placeholders come from the document facts
+QUERY_TEMPLATES = {
+    "extraction": [
+        "¿Cuál es el importe total de la factura {invoice}?",
+        "¿Quién es el titular del contrato {contract}?",
+        "¿Cuál es la fecha de emisión de la factura {invoice}?",
+        "¿Qué potencia contratada tiene el suministro {cups}?",
+    ],
+    "summary": [
+        "Resume el contenido del documento",
+        "¿De qué trata este documento?",
+    ],
+    "analytical": [
+        "Compara los consumos de los distintos periodos y explica las diferencias",
+        "¿Por qué ha variado el importe respecto al periodo anterior?",
+    ],
+}
+
+DEFAULT_MIX = "extraction=0.6,summary=0.2,analytical=0.2"
+
+FILLER = (
+    "El presente documento recoge las condiciones del suministro eléctrico y el detalle "
+    "de los consumos registrados durante el periodo de facturación. Los importes incluyen "
+    "el término de potencia, el término de energía, el impuesto eléctrico y el alquiler "
+    "del equipo de medida. Las lecturas se han obtenido mediante telemedida."
+).split()
+
+
+# ---------------------------------------------------------------------------
+# Corpus and query mix
+# ---------------------------------------------------------------------------
+
+def make_document(rng: random.Random, index: int, paragraphs: int) -> Dict[str, Any]:
+    """Synthetic invoice-like Markdown document with a few retrievable facts"""
+    facts = {
+        "invoice": f"FE{rng.randint(10**7, 10**8 - 1)}",
+        "contract": f"C-{rng.randint(100000, 999999)}",
+        "cups": f"ES00{rng.randint(10**15, 10**16 - 1)}",
+        "holder": rng.choice(["Ana García", "Luis Martín", "Marta Ruiz", "Jorge Sanz"]),
+        "total": f"{rng.uniform(30, 400):.2f}",
+        "date": f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2025",
+        "power": f"{rng.choice([3.3, 4.6, 5.75, 6.9])}",
+    }
+
+    lines = [
+        f"# Factura {facts['invoice']}",
+        "",
+        f"- Titular del contrato {facts['contract']}: {facts['holder']}",
+        f"- Fecha de emisión de la factura {facts['invoice']}: {facts['date']}",
+        f"- Suministro {facts['cups']}, potencia contratada {facts['power']} kW",
+        f"- Importe total de la factura {facts['invoice']}: {facts['total']} €",
+        "",
+    ]
+    for p in range(paragraphs):
+        lines.append(f"## Periodo {p + 1}")
+        lines.append(" ".join(rng.choice(FILLER) for _ in range(rng.randint(60, 120))))
+        lines.append(f"Consumo del periodo {p + 1}: {rng.randint(50, 600)} kWh.")
+        lines.append("")
+
+    return {"title": f"Factura sintética {index + 1}", "content": "\n".join(lines), "facts": facts}
+
+
+def make_corpus(seed: int, documents: int, paragraphs: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [make_document(rng, i, paragraphs) for i in range(documents)]
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parse "category=weight,..." into normalized weights"""
+    mix = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in QUERY_TEMPLATES:
+            raise ValueError(f"Unknown query category '{name}'. Available: {', '.join(QUERY_TEMPLATES)}")
+        mix[name] = float(weight or 1)
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("Query mix weights must be positive")
+    return {name: weight / total for name, weight in mix.items()}
+
+
+def pick_query(rng: random.Random, mix: Dict[str, float], facts: Dict[str, str]) -> Tuple[str, str]:
+    """Returns: (category, query text)"""
+    category = rng.choices(list(mix), weights=list(mix.values()))[0]
+    template = rng.choice(QUERY_TEMPLATES[category])
+    return category, template.format(**facts)
+
+
+# ---------------------------------------------------------------------------
+# Setup through the API
+# ---------------------------------------------------------------------------
+
+async def upload_corpus(
+    client: httpx.AsyncClient,
+    corpus: List[Dict[str, Any]],
+    timeout: float
+) -> List[Dict[str, Any]]:
+    """Upload documents and wait until they are indexed; returns corpus entries with their id"""
+    for i, document in enumerate(corpus):
+        response = await client.post(
+            f"{API_PREFIX}/documents/upload",
+            files={"file": (f"synthetic_{i + 1}.md", document["content"].encode("utf-8"), "text/markdown")},
+            data={"title": document["title"]},
+        )
+        response.raise_for_status()
+        document["id"] = response.json()["document_id"]
+
+    deadline = time.monotonic() + timeout
+    pending = {document["id"] for document in corpus}
+    while pending:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Timed out waiting for documents to be indexed: {sorted(pending)}")
+        for document_id in list(pending):
+            response = await client.get(f"{API_PREFIX}/documents/{document_id}")
+            response.raise_for_status()
+            info = response.json()
+            if info["status"] == "ready":
+                pending.discard(document_id)
+            elif info["status"] == "error":
+                raise RuntimeError(f"Document {document_id} failed to index: {info.get('error_message')}")
+        if pending:
+            await asyncio.sleep(0.5)
+
+    return corpus
+
+
+async def create_sessions(
+    client: httpx.AsyncClient,
+    rng: random.Random,
+    corpus: List[Dict[str, Any]],
+    count: int,
+    documents_per_session: int
+) -> List[Dict[str, Any]]:
+    """Create chat sessions over random subsets of the corpus"""
+    sessions = []
+    for _ in range(count):
+        documents = rng.sample(corpus, min(documents_per_session, len(corpus)))
+        response = await client.post(
+            f"{API_PREFIX}/chat/sessions",
+            json={"document_ids": [document["id"] for document in documents]},
+        )
+        response.raise_for_status()
+        sessions.append({"id": response.json()["id"], "documents": documents})
+    return sessions
+
+
+# ---------------------------------------------------------------------------
+# Load generation
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Sample:
+    """Outcome of one query"""
+    category: str
+    status: int
+    latency: float
+    timings: Dict[str, float] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+async def send_query(
+    client: httpx.AsyncClient,
+    rng: random.Random,
+    mix: Dict[str, float],
+    sessions: List[Dict[str, Any]],
+    top_k: int
+) -> Sample:
+    session = rng.choice(sessions)
+    category, query = pick_query(rng, mix, rng.choice(session["documents"])["facts"])
+
+    start = time.perf_counter()
+    try:
+        response = await client.post(
+            f"{API_PREFIX}/chat/query",
+            json={"session_id": session["id"], "query": query, "top_k": top_k},
+        )
+    except httpx.HTTPError as e:
+        return Sample(category, 0, time.perf_counter() - start, error=type(e).__name__)
+    latency = time.perf_counter() - start
+
+    if response.status_code != 200:
+        return Sample(category, response.status_code, latency, error=response.text[:200])
+    return Sample(category, 200, latency, timings=response.json().get("timings") or {})
+
+
+async def run_closed_loop(
+    client: httpx.AsyncClient,
+    rng: random.Random,
+    mix: Dict[str, float],
+    sessions: List[Dict[str, Any]],
+    top_k: int,
+    concurrency: int,
+    requests: Optional[int],
+    duration: Optional[float]
+) -> List[Sample]:
+    """Each of `concurrency` virtual users sends its next query as soon as the previous one returns"""
+    samples: List[Sample] = []
+    deadline = time.monotonic() + duration if duration else None
+    issued = 0
+
+    async def user():
+        nonlocal issued
+        while True:
+            if requests is not None and issued >= requests:
+                return
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            issued += 1
+            samples.append(await send_query(client, rng, mix, sessions, top_k))
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return samples
+
+
+async def run_open_loop(
+    client: httpx.AsyncClient,
+    rng: random.Random,
+    mix: Dict[str, float],
+    sessions: List[Dict[str, Any]],
+    top_k: int,
+    rate: float,
+    requests: Optional[int],
+    duration: Optional[float]
+) -> List[Sample]:
+    """Send queries with Poisson arrivals at `rate` per second, regardless of response times"""
+    tasks = []
+    start = time.monotonic()
+    while True:
+        if requests is not None and len(tasks) >= requests:
+            break
+        if duration is not None and time.monotonic() - start >= duration:
+            break
+        tasks.append(asyncio.create_task(send_query(client, rng, mix, sessions, top_k)))
+        await asyncio.sleep(rng.expovariate(rate))
+    return list(await asyncio.gather(*tasks))
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    if not ordered:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "p50": ordered[int(0.50 * (len(ordered) - 1))],
+        "p95": ordered[int(0.95 * (len(ordered) - 1))],
+        "p99": ordered[int(0.99 * (len(ordered) - 1))],
+        "max": ordered[-1],
+    }
+
+
+def summarize(samples: List[Sample], wall_seconds: float) -> Dict[str, Any]:
+    ok = [s for s in samples if s.status == 200]
+    errors: Dict[str, int] = {}
+    error_examples: Dict[str, str] = {}
+    for sample in samples:
+        if sample.status != 200:
+            key = str(sample.status) if sample.status else sample.error
+            errors[key] = errors.get(key, 0) + 1
+            error_examples.setdefault(key, sample.error)
+
+    stages = {}
+    for stage in ("retrieval", "queue_wait", "generation"):
+        values = [s.timings[stage] for s in ok if stage in s.timings]
+        if values:
+            stages[stage] = percentiles(values)
+
+    categories = {}
+    for category in sorted({s.category for s in samples}):
+        in_category = [s for s in samples if s.category == category]
+        categories[category] = {
+            "requests": len(in_category),
+            "errors": sum(1 for s in in_category if s.status != 200),
+            "latency": percentiles([s.latency for s in in_category if s.status == 200]),
+        }
+
+    return {
+        "requests": len(samples),
+        "succeeded": len(ok),
+        "wall_seconds": wall_seconds,
+        "throughput_rps": len(ok) / wall_seconds if wall_seconds > 0 else 0.0,
+        "error_rate": (len(samples) - len(ok)) / len(samples) if samples else 0.0,
+        "errors": errors,
+        "error_examples": error_examples,
+        "latency": percentiles([s.latency for s in ok]),
+        "stages": stages,
+        "categories": categories,
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print("=" * 72)
+    print(f"Requests: {report['requests']}  succeeded: {report['succeeded']}  "
+          f"error rate: {report['error_rate']:.1%}")
+    print(f"Wall time: {report['wall_seconds']:.1f}s  throughput: {report['throughput_rps']:.2f} req/s")
+    if report["errors"]:
+        print("Errors: " + ", ".join(f"{key}={count}" for key, count in report["errors"].items()))
+        for key, example in report["error_examples"].items():
+            print(f"  {key}: {example}")
+    print("-" * 72)
+    print(f"{'stage':<16}{'p50 (ms)':>12}{'p95 (ms)':>12}{'p99 (ms)':>12}{'max (ms)':>12}")
+    rows = [("end-to-end", report["latency"])] + list(report["stages"].items())
+    rows += [(f"  {name}", data["latency"]) for name, data in report["categories"].items()]
+    for name, stats in rows:
+        print(f"{name:<16}" + "".join(f"{stats[key] * 1000:>12.1f}" for key in ("p50", "p95", "p99", "max")))
+    print("=" * 72)
+
+
+# ---------------------------------------------------------------------------
+# Offline mode: fake Ollama and the API in this process
+# ---------------------------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve(app, port: int):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def spawn_stack(args) -> str:
+    """
+    Start the fake Ollama server and the API on free local ports
+    The API gets a throwaway database, upload and index directory.
+    Returns: API base URL
+    """
+    from benchmarks.fake_ollama import create_app as create_fake_ollama, FakeOllamaConfig
+
+    ollama_port = _free_port()
+    _serve(create_fake_ollama(FakeOllamaConfig(
+        ttft=args.llm_ttft,
+        tokens_per_second=args.llm_tokens_per_second,
+        response_tokens=args.llm_response_tokens,
+        error_rate=args.llm_error_rate,
+        max_concurrency=args.llm_concurrency,
+        seed=args.seed,
+    )), ollama_port)
+
+    workdir = tempfile.mkdtemp(prefix="rag_load_test_")
+    os.makedirs(os.path.join(workdir, "uploads"))
+    # Settings are read at import time, so configure before importing the app
+    os.environ.update({
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{ollama_port}",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'load_test.db')}",
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "LEANN_INDEX_PATH": os.path.join(workdir, "leann_index"),
+        "SECRET_KEY": os.environ.get("SECRET_KEY", "load-test"),
+    })
+    from app.main import app
+    from app.models import init_db
+
+    init_db()
+    api_port = _free_port()
+    _serve(app, api_port)
+    print(f"Fake Ollama on :{ollama_port}, API on :{api_port}, data in {workdir}")
+    return f"http://127.0.0.1:{api_port}"
+
+
+async def run(args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    base_url = spawn_stack(args) if args.spawn else args.base_url.rstrip("/")
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        corpus = make_corpus(args.seed, args.documents, args.paragraphs)
+        print(f"Uploading {len(corpus)} documents...")
+        await upload_corpus(client, corpus, timeout=args.index_timeout)
+        sessions = await create_sessions(client, rng, corpus, args.sessions, args.documents_per_session)
+
+        requests = args.requests
+        print(f"Running {'rate %.2f/s' % args.rate if args.rate else 'concurrency %d' % args.concurrency}...")
+        start = time.monotonic()
+        if args.rate:
+            samples = await run_open_loop(client, rng, mix, sessions, args.top_k, args.rate, requests, args.duration)
+        else:
+            samples = await run_closed_loop(
+                client, rng, mix, sessions, args.top_k, args.concurrency, requests, args.duration
+            )
+        wall_seconds = time.monotonic() - start
+
+        report = summarize(samples, wall_seconds)
+        try:
+            report["server_metrics"] = (await client.get(f"{API_PREFIX}/metrics")).json()
+        except (httpx.HTTPError, ValueError):
+            pass
+
+    report["config"] = {key: value for key, value in vars(args).items()}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the chat API")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--base-url", help="URL of a running API")
+    target.add_argument("--spawn", action="store_true",
+                        help="Start the API and a fake Ollama server in-process (fully offline)")
+
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--documents", type=int, default=4)
+    parser.add_argument("--paragraphs", type=int, default=12, help="Paragraphs per synthetic document")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--documents-per-session", type=int, default=1)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Query mix weights (default {DEFAULT_MIX})")
+    parser.add_argument("--top-k", type=int, default=5)
+
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=4, help="Closed loop virtual users")
+    load.add_argument("--rate", type=float, default=None, help="Open loop arrivals per second")
+    parser.add_argument("--requests", type=int, default=None, help="Total queries (default 100 without --duration)")
+    parser.add_argument("--duration", type=float, default=None, help="Seconds to run")
+
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per request timeout")
+    parser.add_argument("--index-timeout", type=float, default=600.0)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+
+    stub = parser.add_argument_group("fake Ollama (with --spawn)")
+    stub.add_argument("--llm-ttft", type=float, default=0.2)
+    stub.add_argument("--llm-tokens-per-second", type=float, default=50.0)
+    stub.add_argument("--llm-response-tokens", type=int, default=64)
+    stub.add_argument("--llm-error-rate", type=float, default=0.0)
+    stub.add_argument("--llm-concurrency", type=int, default=2)
+    args = parser.parse_args()
+
+    if args.requests is None and args.duration is None:
+        args.requests = 100
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Retrieval quality versus latency benchmark for index configurations
+Builds one index per configuration over a labeled corpus, runs the query set
+and reports recall@k, MRR, build time, index size on disk and search latency
+percentiles as a comparison table. Chunk overlap can put an answer in several
+passages, so recall@k is relevant passages found in the top k divided by
+min(k, relevant passages).
+
+The default corpus is synthetic: invoice-like documents whose facts are asked
+for by the queries, a passage being relevant when it contains the answer.
+A bundled corpus can be passed as JSON:
+    {"documents": ["text", ...],
+     "queries": [{"query": "...", "relevant": ["answer substring", ...]}, ...]}
+
+Usage:
+    python -m benchmarks.retrieval_bench
+    python -m benchmarks.retrieval_bench --configs configs.json --top-k 1,3,5,10 --output retrieval.json
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import List, Dict, Any
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.load_test import make_document  # noqa: E402
+
+# Each entry: name, chunking (chunk_size, overlap), LEANN builder kwargs (build)
+# and LeannSearcher.search kwargs (search); "flat": true uses the exact flat backend,
+# with "vector_dtype" (float32, float16, int8) for its stored vectors and
+# "projection" ({"dimensions": n, "method": "pca"|"random"|"truncate"}) to reduce them
+DEFAULT_CONFIGS = [
+    {"name": "flat exact", "chunk_size": 1000, "flat": True},
+    {"name": "flat float16", "chunk_size": 1000, "flat": True, "vector_dtype": "float16"},
+    {"name": "flat int8", "chunk_size": 1000, "flat": True, "vector_dtype": "int8"},
+    {"name": "flat pca 256", "chunk_size": 1000, "flat": True, "projection": {"dimensions": 256, "method": "pca"}},
+    {"name": "flat pca 128", "chunk_size": 1000, "flat": True, "projection": {"dimensions": 128, "method": "pca"}},
+    {"name": "flat random 128", "chunk_size": 1000, "flat": True, "projection": {"dimensions": 128, "method": "random"}},
+    {"name": "hnsw compact+recompute", "chunk_size": 1000,
+     "build": {"backend_name": "hnsw", "is_compact": True, "is_recompute": True}, "search": {"complexity": 64}},
+    {"name": "hnsw full embeddings", "chunk_size": 1000,
+     "build": {"backend_name": "hnsw", "is_compact": False, "is_recompute": False},
+     "search": {"complexity": 64, "recompute_embeddings": False}},
+    {"name": "hnsw chunk 500", "chunk_size": 500,
+     "build": {"backend_name": "hnsw", "is_compact": True, "is_recompute": True}, "search": {"complexity": 64}},
+    {"name": "hnsw chunk 1500", "chunk_size": 1500,
+     "build": {"backend_name": "hnsw", "is_compact": True, "is_recompute": True}, "search": {"complexity": 64}},
+    {"name": "hnsw complexity 32", "chunk_size": 1000,
+     "build": {"backend_name": "hnsw", "is_compact": True, "is_recompute": True}, "search": {"complexity": 32}},
+    {"name": "hnsw complexity 128", "chunk_size": 1000,
+     "build": {"backend_name": "hnsw", "is_compact": True, "is_recompute": True}, "search": {"complexity": 128}},
+]
+
+# Question and answer field per fact of the synthetic documents
+FACT_QUERIES = [
+    ("¿Cuál es el importe total de la factura {invoice}?", "total"),
+    ("¿Quién es el titular del contrato {contract}?", "holder"),
+    ("¿Cuál es la fecha de emisión de la factura {invoice}?", "date"),
+    ("¿Qué potencia contratada tiene el suministro {cups}?", "power"),
+]
+
+
+def synthetic_corpus(seed: int, documents: int, paragraphs: int) -> Dict[str, Any]:
+    """Synthetic documents with one query per fact"""
+    rng = random.Random(seed)
+    corpus = {"documents": [], "queries": []}
+    for i in range(documents):
+        document = make_document(rng, i, paragraphs)
+        # Scatter the facts through the document so they land in different chunks
+        lines = document["content"].split("\n")
+        header, facts, body = lines[:2], lines[2:6], lines[6:]
+        for fact in facts:
+            body.insert(rng.randint(0, len(body)), fact)
+        corpus["documents"].append("\n".join(header + body))
+        for template, answer_field in FACT_QUERIES:
+            corpus["queries"].append({
+                "query": template.format(**document["facts"]),
+                "relevant": [document["facts"][answer_field]],
+            })
+    return corpus
+
+
+def index_size_bytes(index_path: str) -> int:
+    return sum(os.path.getsize(path) for path in glob.glob(f"{index_path}.*"))
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))] if ordered else 0.0
+
+
+def run_config(
+    config: Dict[str, Any],
+    corpus: Dict[str, Any],
+    workdir: str,
+    top_ks: List[int],
+    warmup: int
+) -> Dict[str, Any]:
+    """Build the index for one configuration and evaluate the query set"""
+    from leann import LeannBuilder, LeannSearcher
+    from app.services.leann_service import leann_service
+    from app.services.flat_index import FlatIndex
+
+    chunk_size = config.get("chunk_size", 1000)
+    overlap = config.get("overlap", 200)
+    chunks = []
+    for text in corpus["documents"]:
+        chunks.extend(chunk for chunk in leann_service.chunk_text(text, chunk_size, overlap) if chunk.strip())
+
+    index_path = os.path.join(workdir, config["name"].replace(" ", "_").replace("+", "_"), "index")
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+
+    build_kwargs = {"backend_name": leann_service.backend, "device": "cpu", "batch_size": leann_service.batch_size}
+    build_kwargs.update(config.get("build", {}))
+
+    start = time.perf_counter()
+    if config.get("flat"):
+        projection = config.get("projection", {})
+        FlatIndex.build(
+            index_path, chunks, vector_dtype=config.get("vector_dtype", "float32"),
+            projection_dims=projection.get("dimensions", 0), projection_method=projection.get("method", "pca")
+        )
+    else:
+        builder = LeannBuilder(**build_kwargs)
+        for chunk in chunks:
+            builder.add_text(chunk)
+        builder.build_index(index_path)
+    build_seconds = time.perf_counter() - start
+
+    if config.get("flat"):
+        searcher = FlatIndex.load(index_path)
+    else:
+        searcher = LeannSearcher(index_path, device="cpu", batch_size=leann_service.batch_size)
+    max_k = max(top_ks)
+    search_kwargs = config.get("search", {})
+
+    # Warm up the embedding model / server before timing
+    for query in corpus["queries"][:warmup]:
+        searcher.search(query["query"], top_k=max_k, **search_kwargs)
+
+    latencies = []
+    hits = {k: 0.0 for k in top_ks}
+    reciprocal_ranks = []
+    for query in corpus["queries"]:
+        start = time.perf_counter()
+        results = searcher.search(query["query"], top_k=max_k, **search_kwargs)
+        latencies.append(time.perf_counter() - start)
+
+        relevant = [i for i, result in enumerate(results)
+                    if any(answer in result.text for answer in query["relevant"])]
+        total_relevant = sum(1 for chunk in chunks if any(answer in chunk for answer in query["relevant"])) or 1
+        for k in top_ks:
+            hits[k] += sum(1 for rank in relevant if rank < k) / min(total_relevant, k)
+        reciprocal_ranks.append(1.0 / (relevant[0] + 1) if relevant else 0.0)
+
+    if hasattr(searcher, "cleanup"):
+        searcher.cleanup()
+
+    count = len(corpus["queries"])
+    return {
+        "name": config["name"],
+        "config": config,
+        "chunks": len(chunks),
+        "build_seconds": build_seconds,
+        "index_bytes": index_size_bytes(index_path),
+        "recall": {str(k): hits[k] / count for k in top_ks},
+        "mrr": sum(reciprocal_ranks) / count,
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+        },
+    }
+
+
+def print_table(rows: List[Dict[str, Any]], top_ks: List[int]) -> None:
+    header = f"{'config':<26}{'chunks':>7}{'build s':>9}{'size KB':>9}"
+    header += "".join(f"{f'R@{k}':>7}" for k in top_ks)
+    header += f"{'MRR':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    print("=" * len(header))
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        if "error" in row:
+            print(f"{row['name']:<26} failed: {row['error']}")
+            continue
+        line = f"{row['name']:<26}{row['chunks']:>7}{row['build_seconds']:>9.2f}{row['index_bytes'] / 1024:>9.0f}"
+        line += "".join(f"{row['recall'][str(k)]:>7.3f}" for k in top_ks)
+        line += f"{row['mrr']:>7.3f}"
+        line += "".join(f"{row['latency_ms'][p]:>9.1f}" for p in ("p50", "p95", "p99"))
+        print(line)
+    print("=" * len(header))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval quality versus latency benchmark")
+    parser.add_argument("--configs", help="JSON file with a list of configurations (default: built-in set)")
+    parser.add_argument("--corpus", help="Labeled corpus JSON (default: synthetic)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--paragraphs", type=int, default=12)
+    parser.add_argument("--top-k", default="1,3,5,10", help="Cutoffs for recall@k")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed queries per configuration")
+    parser.add_argument("--workdir", help="Directory for the benchmark indices (default: temporary)")
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    if args.configs:
+        with open(args.configs) as f:
+            configs = json.load(f)
+    else:
+        configs = DEFAULT_CONFIGS
+
+    if args.corpus:
+        with open(args.corpus) as f:
+            corpus = json.load(f)
+    else:
+        corpus = synthetic_corpus(args.seed, args.documents, args.paragraphs)
+
+    top_ks = sorted(int(k) for k in args.top_k.split(",") if k.strip())
+    workdir = args.workdir or tempfile.mkdtemp(prefix="rag_retrieval_bench_")
+    print(f"{len(corpus['documents'])} documents, {len(corpus['queries'])} queries, indices in {workdir}")
+
+    rows = []
+    for config in configs:
+        print(f"Running {config['name']}...")
+        try:
+            rows.append(run_config(config, corpus, workdir, top_ks, args.warmup))
+        except Exception as e:
+            rows.append({"name": config["name"], "config": config, "error": str(e)})
+
+    print_table(rows, top_ks)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Export the embedding model to an int8 ONNX graph for LEANN_EMBEDDING_ENGINE=onnx
+Exports facebook/contriever (or --model), quantizes it, and checks parity with
+the torch embeddings on sample sentences plus passages of existing indices.
+The engine refuses to load a model whose parity check did not pass.
+
+Usage:
+    python export_onnx.py
+    python export_onnx.py --output ./data/onnx/contriever --min-cosine 0.98 --max-passages 200
+    python export_onnx.py --check-only
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.config import settings
+from app.services.embedding_engine import (
+    OnnxEmbedder, PARITY_SAMPLE_TEXTS, export_onnx_model, parity_check, save_parity
+)
+from app.services.flat_index import EMBEDDING_MODEL
+from app.services.passage_store import PassageStore
+
+
+def index_passages(index_base_path: str, limit: int):
+    """Up to `limit` passages taken round-robin from the existing indices"""
+    stores = []
+    for meta_path in sorted(glob.glob(os.path.join(index_base_path, "doc_*.meta.json"))):
+        try:
+            stores.append(PassageStore(meta_path[:-len(".meta.json")]))
+        except (OSError, ValueError):
+            continue
+
+    passages = []
+    position = 0
+    while len(passages) < limit and any(position < len(store) for store in stores):
+        for store in stores:
+            if position < len(store) and len(passages) < limit:
+                passages.append(store.get(str(position))["text"])
+        position += 1
+    for store in stores:
+        store.close()
+    return passages
+
+
+def time_encode(encode, texts, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encode(texts)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the embedding model to int8 ONNX and check parity")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--output", default=settings.leann_onnx_model_dir)
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="Lowest per-text cosine to torch accepted")
+    parser.add_argument("--max-norm-error", type=float, default=0.05, help="Largest relative embedding norm difference accepted")
+    parser.add_argument("--max-passages", type=int, default=200, help="Indexed passages added to the parity texts")
+    parser.add_argument("--check-only", action="store_true", help="Re-run the parity check of an existing export")
+    args = parser.parse_args()
+
+    texts = PARITY_SAMPLE_TEXTS + index_passages(settings.leann_index_path, args.max_passages)
+
+    if not args.check_only:
+        print(f"Exporting {args.model} to {args.output} ...")
+        info = export_onnx_model(args.model, args.output, PARITY_SAMPLE_TEXTS)
+        print(f"  int8 graph written (normalize={info['normalize']})")
+
+    print(f"Checking parity on {len(texts)} texts ...")
+    embedder = OnnxEmbedder(args.output, settings.leann_num_threads)
+    report = parity_check(embedder, texts, min_cosine=args.min_cosine, max_norm_error=args.max_norm_error)
+
+    from leann.api import compute_embeddings
+    report["torch_seconds"] = time_encode(
+        lambda batch: compute_embeddings(batch, args.model, "sentence-transformers", use_server=False), texts
+    )
+    report["onnx_seconds"] = time_encode(embedder.encode, texts)
+    save_parity(args.output, report)
+
+    print("=" * 60)
+    print(f"mean cosine:        {report['mean_cosine']:.5f}")
+    print(f"min cosine:         {report['min_cosine']:.5f} (required {args.min_cosine})")
+    print(f"norm ratio error:   {report['max_norm_ratio_error']:.4f} (allowed {args.max_norm_error})")
+    print(f"top-1 agreement:    {report['top1_neighbour_agreement']:.3f}")
+    print(f"torch / onnx:       {report['torch_seconds']:.2f}s / {report['onnx_seconds']:.2f}s")
+    print("=" * 60)
+    if report["passed"]:
+        print("Parity check passed. Set LEANN_EMBEDDING_ENGINE=onnx to use it.")
+    else:
+        print("Parity check FAILED: the ONNX engine will not load this model.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
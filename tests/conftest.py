@@ -0,0 +1,6 @@
+"""
+Shared test setup: settings need a secret key, tests never use a real one
+"""
+import os
+
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
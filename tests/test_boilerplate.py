@@ -0,0 +1,71 @@
+"""
+Tests for repeated PDF header / footer removal
+"""
+from app.services.boilerplate import find_repeated_lines, strip_boilerplate
+
+
+def invoice_pages():
+    """Three invoice-style pages: shared company header and page counter, per-page content"""
+    rows = [
+        ("Servicio A", ["120,00", "80,50", "120,00"], "320,50"),
+        ("Servicio B", ["299,50"], "299,50"),
+        ("Servicio C", ["80,50", "120,00"], "200,50"),
+    ]
+    pages = []
+    for number, (service, amounts, total) in enumerate(rows, start=1):
+        pages.append("\n".join(
+            ["ACME Energía S.L.", f"Factura 2024-00{number}", "Concepto", "Importe", service]
+            + amounts + ["Total", total, f"Página {number} de 3"]
+        ))
+    return pages
+
+
+def test_invoice_keeps_amounts_numbers_and_column_headers():
+    pages = invoice_pages()
+    stripped, stats = strip_boilerplate(pages, 0.6)
+
+    assert stats["lines"] == ["ACME Energía S.L.", "Página 1 de 3"]
+    # The first page is untouched, repeated amounts on it included
+    assert stripped[0] == pages[0]
+    for number, page in enumerate(stripped[1:], start=2):
+        lines = page.split("\n")
+        assert "ACME Energía S.L." not in lines
+        assert f"Página {number} de 3" not in lines
+        assert lines[:3] == [f"Factura 2024-00{number}", "Concepto", "Importe"]
+        assert "Total" in lines
+    assert stripped[1].split("\n")[3:] == ["Servicio B", "299,50", "Total", "299,50"]
+    assert stripped[2].split("\n")[3:] == ["Servicio C", "80,50", "120,00", "Total", "200,50"]
+    assert stats["chars_saved"] == sum(len(line) + 1 for line in ("ACME Energía S.L.", "Página 2 de 3",
+                                                                   "ACME Energía S.L.", "Página 3 de 3"))
+
+
+def test_amount_lines_are_never_boilerplate():
+    pages = ["Cabecera\n100,00\ncuerpo %d\n100,00" % i for i in range(4)]
+    assert find_repeated_lines(pages, 0.6) == ["cabecera"]
+    stripped, _ = strip_boilerplate(pages, 0.6)
+    assert all(page.count("100,00") == 2 for page in stripped)
+
+
+def test_invoice_numbers_are_not_masked():
+    pages = [f"Factura 2024-00{i}\ntexto {i}" for i in range(1, 4)]
+    assert find_repeated_lines(pages, 0.6) == []
+
+
+def test_page_counters_match_with_numbers_masked():
+    pages = [f"cuerpo {i}\nPage {i} of 4" for i in range(1, 5)]
+    assert find_repeated_lines(pages, 0.6) == ["page # of #"]
+    pages = [f"cuerpo {i}\n{i}/4 Contrato" for i in range(1, 5)]
+    assert find_repeated_lines(pages, 0.6) == ["#/# contrato"]
+
+
+def test_lines_in_the_middle_of_a_page_are_kept():
+    body = ["línea %d" % i for i in range(12)]
+    pages = ["\n".join(["Cabecera"] + body[:6] + ["Nota interna"] + body[6:] + ["Pie"]) for _ in range(3)]
+    stripped, stats = strip_boilerplate(pages, 0.6)
+    assert "Nota interna" not in stats["lines"]
+    assert all("Nota interna" in page for page in stripped)
+
+
+def test_short_documents_are_left_alone():
+    pages = ["Cabecera\nuno", "Cabecera\ndos"]
+    assert strip_boilerplate(pages, 0.6) == (pages, {"lines": [], "chars_saved": 0})
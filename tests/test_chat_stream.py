@@ -0,0 +1,55 @@
+"""
+Tests for closing a streamed answer while a worker is still reading it
+"""
+import threading
+
+from app.api.v1.endpoints.chat import _EventStream
+
+
+def test_close_waits_for_the_pending_read():
+    reading = threading.Event()
+    release = threading.Event()
+    closed = []
+
+    def events():
+        try:
+            yield {"type": "token", "content": "a"}
+            reading.set()
+            release.wait(5)
+            yield {"type": "token", "content": "b"}
+        finally:
+            closed.append(True)
+
+    stream = _EventStream(events())
+    assert stream.next()["content"] == "a"
+
+    results = []
+    worker = threading.Thread(target=lambda: results.append(stream.next()))
+    worker.start()
+    assert reading.wait(5)
+
+    errors = []
+
+    def close():
+        try:
+            stream.close()
+        except Exception as e:
+            errors.append(e)
+
+    closer = threading.Thread(target=close)
+    closer.start()
+    closer.join(0.2)
+    assert closer.is_alive() and not closed
+
+    release.set()
+    worker.join(5)
+    closer.join(5)
+    assert results[0]["content"] == "b"
+    assert closed == [True]
+    assert errors == []
+
+
+def test_next_returns_none_at_the_end():
+    stream = _EventStream(iter([{"type": "done"}]))
+    assert stream.next() == {"type": "done"}
+    assert stream.next() is None
@@ -0,0 +1,90 @@
+"""
+Tests for fitting context chunks and chat history into the prompt budget
+"""
+from app.services.context_budget import (
+    ContextBudgetManager, TokenCounter, MESSAGE_OVERHEAD_TOKENS, REPLY_PRIMER_TOKENS, SAFETY_MARGIN_TOKENS,
+    DEFAULT_PROMPT_BUDGET_TOKENS
+)
+
+
+def manager(num_ctx=1000, max_output_tokens=200, **kwargs):
+    # One token per character (plus one per text) keeps the arithmetic readable
+    return ContextBudgetManager(TokenCounter(chars_per_token=1.0), num_ctx, max_output_tokens, **kwargs)
+
+
+def test_prompt_budget_is_capped_by_default():
+    assert manager(num_ctx=32768, max_output_tokens=2000).prompt_budget() == DEFAULT_PROMPT_BUDGET_TOKENS
+    assert manager(num_ctx=2048, max_output_tokens=500).prompt_budget() == 2048 - 500 - SAFETY_MARGIN_TOKENS
+
+
+def test_prompt_budget_fills_the_window_when_opted_in():
+    assert manager(budget_tokens=0).prompt_budget() == 1000 - 200 - SAFETY_MARGIN_TOKENS
+    # The answer never takes more than half the window
+    assert manager(max_output_tokens=5000, budget_tokens=0).prompt_budget() == 500 - SAFETY_MARGIN_TOKENS
+    assert manager(budget_tokens=300).prompt_budget() == 300
+    assert manager(budget_tokens=5000).prompt_budget() == 1000 - 200 - SAFETY_MARGIN_TOKENS
+
+
+def test_budget_smaller_than_instruction():
+    result = manager(budget_tokens=50).assemble(
+        "x" * 200, "question",
+        ["chunk"],
+        chat_history=[{"role": "user", "content": "hi"}]
+    )
+    assert result["context_chunks"] == []
+    assert result["chat_history"] == []
+    assert result["usage"]["context_chunks_dropped"] == 1
+    assert result["usage"]["history_messages_dropped"] == 1
+    assert result["num_predict"] >= 1
+
+
+def test_num_predict_is_at_least_one_when_prompt_fills_the_window():
+    result = manager(num_ctx=100, max_output_tokens=50).assemble("x" * 500, "question", [])
+    assert result["num_predict"] == 1
+
+
+def test_context_taken_by_score_in_given_order():
+    instruction, query = "i" * 9, "q" * 9
+    fixed = 2 * (10 + MESSAGE_OVERHEAD_TOKENS) + REPLY_PRIMER_TOKENS
+    chunks = ["a" * 19, "b" * 39, "c" * 19]  # 20, 40 and 20 tokens, + 2 separator each
+    result = manager(budget_tokens=fixed + 44).assemble(instruction, query, chunks, context_scores=[0.2, 0.9, 0.5])
+    # b (best) takes the budget; c and a no longer fit
+    assert result["context_chunks"] == ["b" * 39]
+
+    result = manager(budget_tokens=fixed + 64).assemble(instruction, query, chunks, context_scores=[0.2, 0.9, 0.5])
+    assert result["context_chunks"] == ["b" * 39, "c" * 19]
+    assert result["usage"]["context_tokens"] == 64
+
+
+def test_chunks_that_do_not_fit_are_skipped():
+    fixed = 2 * (2 + MESSAGE_OVERHEAD_TOKENS) + REPLY_PRIMER_TOKENS
+    chunks = ["a" * 99, "b" * 9]
+    result = manager(budget_tokens=fixed + 20).assemble("i", "q", chunks)
+    assert result["context_chunks"] == ["b" * 9]
+
+
+def test_history_trimmed_oldest_first_after_context():
+    fixed = 2 * (2 + MESSAGE_OVERHEAD_TOKENS) + REPLY_PRIMER_TOKENS
+    turn = 10 + MESSAGE_OVERHEAD_TOKENS
+    history = [
+        {"role": "user", "content": "1" * 9},
+        {"role": "assistant", "content": "2" * 9},
+        {"role": "system", "content": "ignored"},
+        {"role": "user", "content": "3" * 9},
+    ]
+    result = manager(budget_tokens=fixed + 12 + 2 * turn).assemble("i", "q", ["c" * 9], chat_history=history)
+    assert result["context_chunks"] == ["c" * 9]
+    assert [msg["content"] for msg in result["chat_history"]] == ["2" * 9, "3" * 9]
+    assert result["usage"]["history_messages_dropped"] == 1
+
+
+def test_history_limited_to_recent_messages():
+    history = [{"role": "user", "content": str(i)} for i in range(10)]
+    result = manager(history_messages=3).assemble("i", "q", [], chat_history=history)
+    assert [msg["content"] for msg in result["chat_history"]] == ["7", "8", "9"]
+    assert manager(history_messages=0).assemble("i", "q", [], chat_history=history)["chat_history"] == []
+
+
+def test_summary_always_counted():
+    result = manager().assemble("i", "q", [], summary="s" * 19)
+    assert result["usage"]["summary_tokens"] == 20 + MESSAGE_OVERHEAD_TOKENS
@@ -0,0 +1,158 @@
+"""
+Tests for LLM generation admission control
+"""
+import threading
+import time
+
+import pytest
+
+from app.services.generation_scheduler import (
+    GenerationScheduler, SchedulerRejected, GenerationCancelled,
+    PRIORITY_INTERACTIVE, PRIORITY_BATCH, PRIORITY_BACKGROUND
+)
+
+
+def wait_for_queue(scheduler, depth, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while scheduler.metrics()["queue_depth"] != depth:
+        assert time.monotonic() < deadline, "requests did not queue"
+        time.sleep(0.005)
+
+
+def queue_request(scheduler, priority, admitted, errors, **kwargs):
+    def run():
+        try:
+            scheduler.acquire(priority=priority, **kwargs)
+        except Exception as e:
+            errors.append(e)
+            return
+        admitted.append(priority)
+        scheduler.release(0.01)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_queued_requests_are_served_by_priority_then_arrival():
+    scheduler = GenerationScheduler(max_concurrency=1, max_queue=10, queue_timeout=5)
+    scheduler.acquire()
+    admitted, errors = [], []
+    threads = []
+    for depth, priority in enumerate([PRIORITY_BACKGROUND, PRIORITY_BATCH, PRIORITY_INTERACTIVE, PRIORITY_BATCH], 1):
+        threads.append(queue_request(scheduler, priority, admitted, errors))
+        wait_for_queue(scheduler, depth)
+
+    scheduler.release(0.01)
+    for thread in threads:
+        thread.join(5)
+
+    assert errors == []
+    assert admitted == [PRIORITY_INTERACTIVE, PRIORITY_BATCH, PRIORITY_BATCH, PRIORITY_BACKGROUND]
+
+
+def test_full_queue_rejects_with_429():
+    scheduler = GenerationScheduler(max_concurrency=1, max_queue=1, queue_timeout=5)
+    scheduler.acquire()
+    admitted, errors = [], []
+    thread = queue_request(scheduler, PRIORITY_INTERACTIVE, admitted, errors)
+    wait_for_queue(scheduler, 1)
+
+    with pytest.raises(SchedulerRejected) as rejected:
+        scheduler.acquire(priority=PRIORITY_INTERACTIVE)
+    assert rejected.value.status_code == 429
+    assert scheduler.metrics()["rejected_queue_full"] == 1
+
+    scheduler.release(0.01)
+    thread.join(5)
+    assert admitted == [PRIORITY_INTERACTIVE]
+
+
+def test_full_queue_displaces_a_less_urgent_request():
+    scheduler = GenerationScheduler(max_concurrency=1, max_queue=1, queue_timeout=5)
+    scheduler.acquire()
+    admitted, errors = [], []
+    background = queue_request(scheduler, PRIORITY_BACKGROUND, admitted, errors)
+    wait_for_queue(scheduler, 1)
+    interactive = queue_request(scheduler, PRIORITY_INTERACTIVE, admitted, errors)
+    background.join(5)
+
+    assert len(errors) == 1 and errors[0].status_code == 429
+    wait_for_queue(scheduler, 1)
+    scheduler.release(0.01)
+    interactive.join(5)
+    assert admitted == [PRIORITY_INTERACTIVE]
+
+
+def test_timeout_while_waiting_rejects_with_503():
+    scheduler = GenerationScheduler(max_concurrency=1, max_queue=5, queue_timeout=0.1)
+    scheduler.acquire()
+
+    start = time.monotonic()
+    with pytest.raises(SchedulerRejected) as rejected:
+        scheduler.acquire()
+    assert rejected.value.status_code == 503
+    assert time.monotonic() - start >= 0.1
+    metrics = scheduler.metrics()
+    assert metrics["dropped_deadline"] == 1
+    assert metrics["queue_depth"] == 0
+
+
+def test_deadline_that_cannot_be_met_rejects_with_503_up_front():
+    scheduler = GenerationScheduler(max_concurrency=1, max_queue=5, queue_timeout=5)
+    scheduler.acquire()
+    scheduler.release(10.0)  # generations take ~10 s
+    scheduler.acquire()
+
+    with pytest.raises(SchedulerRejected) as rejected:
+        scheduler.acquire(timeout=1.0)
+    assert rejected.value.status_code == 503
+    assert rejected.value.retry_after == 10
+    assert scheduler.metrics()["rejected_deadline"] == 1
+
+
+def test_retry_after_follows_queue_length_and_service_time():
+    scheduler = GenerationScheduler(max_concurrency=2, max_queue=2, queue_timeout=0)
+    # No service time observed yet: retry after the minimum of one second
+    assert scheduler._retry_after() == 1
+
+    scheduler.acquire()
+    scheduler.release(2.5)
+    scheduler.acquire()
+    scheduler.acquire()
+    admitted, errors = [], []
+    threads = [queue_request(scheduler, PRIORITY_INTERACTIVE, admitted, errors) for _ in range(2)]
+    wait_for_queue(scheduler, 2)
+
+    with pytest.raises(SchedulerRejected) as rejected:
+        scheduler.acquire()
+    # Two queued requests over two slots: one more round of ~2.5 s after the current one
+    assert rejected.value.retry_after == 5
+
+    scheduler.release(2.5)
+    scheduler.release(2.5)
+    for thread in threads:
+        thread.join(5)
+    assert errors == []
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    scheduler = GenerationScheduler(max_concurrency=1, max_queue=5, queue_timeout=5)
+    scheduler.acquire()
+    cancel = threading.Event()
+    admitted, errors = [], []
+    thread = queue_request(scheduler, PRIORITY_INTERACTIVE, admitted, errors, cancel_event=cancel)
+    wait_for_queue(scheduler, 1)
+
+    cancel.set()
+    thread.join(5)
+    assert len(errors) == 1 and isinstance(errors[0], GenerationCancelled)
+    assert scheduler.metrics()["queue_depth"] == 0
+
+
+def test_rejection_maps_to_http_error_with_retry_after_header():
+    from app.api.v1.endpoints.chat import _generation_error
+
+    error = _generation_error(SchedulerRejected("Generation queue is full", status_code=429, retry_after=7))
+    assert error.status_code == 429
+    assert error.headers == {"Retry-After": "7"}
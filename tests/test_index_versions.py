@@ -0,0 +1,187 @@
+"""
+Tests for versioned index prefixes and their release after in-flight searches
+"""
+import json
+import os
+import pickle
+
+import pytest
+
+from app.services.index_versions import (
+    IndexVersions, version_path, manifest_path, existing_versions, version_files, read_manifest,
+    remove_version
+)
+
+
+def write_version(base_path, version):
+    prefix = version_path(base_path, version)
+    for suffix in (".meta.json", ".passages.jsonl"):
+        with open(f"{prefix}{suffix}", "w") as f:
+            f.write("{}")
+
+
+@pytest.fixture
+def base_path(tmp_path):
+    return str(tmp_path / "doc_1")
+
+
+def test_reserve_is_above_versions_on_disk_and_in_progress(base_path):
+    versions = IndexVersions()
+    write_version(base_path, 0)
+    write_version(base_path, 4)  # leftover of an interrupted build
+    assert versions.reserve(base_path) == 5
+    assert versions.reserve(base_path) == 6
+
+
+def test_publish_while_leased_keeps_the_old_version_until_release(base_path):
+    versions = IndexVersions()
+    retired = []
+
+    def retire(previous):
+        retired.append(previous)
+        remove_version(base_path, previous)
+
+    write_version(base_path, 1)
+    versions.publish(base_path, 1, retire)
+    assert retired == [0]
+
+    with versions.lease(base_path) as leased:
+        assert leased == version_path(base_path, 1)
+        write_version(base_path, 2)
+        versions.publish(base_path, 2, retire)
+
+        # New readers get the new version while the old one is still held
+        assert versions.current_path(base_path) == version_path(base_path, 2)
+        assert read_manifest(base_path)["version"] == 2
+        assert retired == [0]
+        assert version_files(base_path, 1)
+
+    assert retired == [0, 1]
+    assert existing_versions(base_path) == [2]
+
+
+def test_nested_leases_release_after_the_last_one(base_path):
+    versions = IndexVersions()
+    released = []
+    with versions.lease(base_path) as first:
+        with versions.lease(base_path):
+            versions.after_release(first, lambda: released.append(first))
+        assert released == []
+    assert released == [first]
+
+
+def test_failed_build_removes_the_reserved_prefix(base_path, monkeypatch):
+    from app.services.leann_service import LeannService
+
+    service = LeannService()
+    service.index_base_path = os.path.dirname(base_path)
+    write_version(base_path, 1)
+    service._versions.publish(base_path, 1, lambda previous: None)
+
+    def failing_write(index_path, *args, **kwargs):
+        with open(f"{index_path}.index", "w") as f:
+            f.write("partial")
+        raise RuntimeError("embedding failed")
+
+    monkeypatch.setattr(service, "_write_index", failing_write)
+    with pytest.raises(RuntimeError):
+        service._write_version("1", ["passage"], None)
+
+    assert existing_versions(base_path) == [1]
+    assert service._get_index_path("1") == version_path(base_path, 1)
+    # The failed number is not handed out again
+    assert service._versions.reserve(base_path) == 3
+
+
+def test_withdraw_with_no_current_manifest(base_path):
+    versions = IndexVersions()
+    assert versions.withdraw(base_path) == 0
+    assert not os.path.exists(manifest_path(base_path))
+
+    # Unversioned index (built before versioning): served and withdrawn as version 0
+    write_version(base_path, 0)
+    assert versions.current_path(base_path) == base_path
+    assert versions.withdraw(base_path) == 0
+    assert version_files(base_path, 0)
+
+
+def test_withdraw_forgets_the_served_version(base_path):
+    versions = IndexVersions()
+    write_version(base_path, 3)
+    versions.publish(base_path, 3, lambda previous: None)
+    assert versions.withdraw(base_path) == 3
+    assert not os.path.exists(manifest_path(base_path))
+    assert versions.current_path(base_path) == base_path
+
+
+def write_leann_shard(index_path, passages, storage_mode, metadata=None):
+    """Files of a LEANN index as LeannBuilder lays them out (no vectors needed here)"""
+    offsets = {}
+    with open(f"{index_path}.passages.jsonl", "wb") as f:
+        for i, text in enumerate(passages):
+            offsets[str(i)] = f.tell()
+            f.write((json.dumps({"id": str(i), "text": text, "metadata": {}}) + "\n").encode())
+    with open(f"{index_path}.passages.idx", "wb") as f:
+        pickle.dump(offsets, f)
+    with open(f"{index_path}.index", "w") as f:
+        f.write("index")
+    name = os.path.basename(index_path)
+    with open(f"{index_path}.meta.json", "w") as f:
+        json.dump({
+            "version": "1.0",
+            "backend_name": "hnsw",
+            "passage_sources": [{
+                "type": "jsonl",
+                "path": f"{index_path}.passages.jsonl",
+                "index_path": f"{index_path}.passages.idx",
+                "path_relative": f"{name}.passages.jsonl",
+                "index_path_relative": f"{name}.passages.idx",
+            }],
+        }, f)
+    return {"backend": "hnsw", "storage_mode": storage_mode, "embedding": None}
+
+
+def read_passage(shard_path, passage_id):
+    """Passage text resolved like LEANN's PassageManager: the primary path first"""
+    with open(f"{shard_path}.meta.json") as f:
+        source = json.load(f)["passage_sources"][0]
+    meta_dir = os.path.dirname(shard_path)
+    candidates = [(source["path"], source["index_path"]),
+                  (os.path.join(meta_dir, source["path_relative"]),
+                   os.path.join(meta_dir, source["index_path_relative"]))]
+    path, idx_path = next(pair for pair in candidates if os.path.exists(pair[0]))
+    with open(idx_path, "rb") as f:
+        offset = pickle.load(f)[passage_id]
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return json.loads(f.readline())["text"]
+
+
+def test_reused_shard_reads_its_own_version_after_the_old_one_is_removed(tmp_path, monkeypatch):
+    from app.services.leann_service import LeannService
+    from app.services.sharded_index import shard_path
+
+    service = LeannService()
+    service.index_base_path = str(tmp_path)
+    service.flat_max_chunks = 0
+    service.shard_chunks = 2
+    service.max_shards = 2
+    service.build_threads = 1
+    monkeypatch.setattr(service, "_write_leann", write_leann_shard)
+
+    v1, _ = service._write_version("1", ["a", "b", "c", "d"], "full")
+    with service._versions.lease(service._get_base_path("1")) as leased:
+        assert leased == v1
+        v2, written = service._write_version("1", ["a", "b", "c", "changed"], "full", reuse=True)
+        assert written["shards"]["reused"] == 1
+        # The old version is still on disk while leased: the reused shard must not point at it
+        with open(f"{shard_path(v2, 0)}.meta.json") as f:
+            source = json.load(f)["passage_sources"][0]
+        assert all(os.path.basename(source[key]).startswith(os.path.basename(shard_path(v2, 0)) + ".")
+                   for key in ("path", "index_path", "path_relative", "index_path_relative"))
+        assert os.path.dirname(source["path"]) == str(tmp_path)
+
+    base_path = service._get_base_path("1")
+    assert existing_versions(base_path) == [2]
+    assert read_passage(shard_path(v2, 0), "1") == "b"
+    assert read_passage(shard_path(v2, 1), "1") == "changed"
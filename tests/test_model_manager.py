@@ -0,0 +1,48 @@
+"""
+Tests for model residency and readiness
+"""
+import pytest
+
+from app.config import settings
+from app.services.model_manager import ModelManager, KEEP_ALIVE_FOREVER
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = []
+
+    def generate(self, model, prompt, keep_alive, options=None):
+        self.calls.append((model, keep_alive))
+        self.options = options
+
+
+@pytest.fixture
+def manager():
+    manager = ModelManager()
+    manager.client = FakeClient()
+    manager.enabled = True
+    return manager
+
+
+def test_ready_once_the_chat_model_is_loaded(manager):
+    assert not manager.is_ready()
+    assert manager.load(settings.ollama_model)
+    assert manager.is_ready()
+    assert manager.client.options == {"num_ctx": settings.ollama_num_ctx}
+
+
+def test_evicting_the_chat_model_keeps_the_service_ready(manager):
+    manager.load(settings.ollama_model)
+    assert manager.evict(settings.ollama_model)
+    assert manager.client.calls[-1] == (settings.ollama_model, 0)
+    assert settings.ollama_model not in manager.resident_models()
+    assert manager.is_ready()
+
+
+def test_pin_keeps_the_model_loaded(manager):
+    assert manager.pin("other:1b")
+    assert manager.client.calls[-1] == ("other:1b", KEEP_ALIVE_FOREVER)
+    assert "other:1b" in manager.resident_models()
+
+    manager.evict("other:1b")
+    assert "other:1b" not in manager.resident_models()
@@ -0,0 +1,37 @@
+"""
+Tests for query routing between model tiers
+"""
+import pytest
+
+from app.services.model_router import EXTRACTION_PATTERN, ModelRouter
+
+
+@pytest.mark.parametrize("query", [
+    "¿Cuál es el n° factura?",
+    "¿Cuál es el nº de contrato?",
+    "n.º de cliente",
+    "¿Qué importe tiene la factura No. 2024-001?",
+    "¿Cuál es el CUPS?",
+    "What is the invoice number?",
+])
+def test_extraction_questions(query):
+    assert EXTRACTION_PATTERN.search(query)
+
+
+@pytest.mark.parametrize("query", [
+    "¿El contrato no incluye permanencia?",
+    "¿Por qué no se aplica el descuento?",
+    "No. Quiero saber las condiciones",
+    "¿Hay penalización por cancelación?",
+])
+def test_negated_and_open_questions_are_not_extraction(query):
+    assert not EXTRACTION_PATTERN.search(query)
+
+
+def test_negated_question_is_not_routed_as_extraction():
+    router = ModelRouter()
+    router.tiers = ["small", "medium", "large"]
+    route = router.route("¿El contrato no incluye permanencia?")
+    assert route["signals"]["extraction"] is False
+    assert route["model"] == "medium"  # short only
+    assert router.route("¿Cuál es el n° factura?", scores=[0.9, 0.5])["model"] == "small"
@@ -0,0 +1,24 @@
+"""
+Tests for the options sent to Ollama
+"""
+from app.services.ollama_service import OllamaService
+
+
+class FakeClient:
+    def __init__(self):
+        self.requests = []
+
+    def chat(self, **request):
+        self.requests.append(request)
+        return {"message": {"content": "OK"}}
+
+
+def test_connection_probe_uses_the_chat_options():
+    service = OllamaService()
+    service.client = FakeClient()
+    assert service.test_connection()["status"] == "success"
+
+    probe = service.client.requests[-1]
+    assert probe["options"]["num_ctx"] == service.num_ctx
+    assert probe["options"] == service._chat_options(0.1, 10)
+    assert probe["keep_alive"] == service.keep_alive
@@ -0,0 +1,49 @@
+"""
+Tests for the memory-mapped passage reader
+"""
+import json
+import os
+import threading
+
+from app.services.passage_store import PassageStore
+
+
+def write_passages(index_path, count):
+    with open(f"{index_path}.passages.jsonl", "w") as f:
+        for i in range(count):
+            f.write(json.dumps({"id": str(i), "text": f"passage {i}", "metadata": {"page_start": i}}) + "\n")
+
+
+def test_reads_passages_by_id(tmp_path):
+    index_path = str(tmp_path / "doc_1")
+    write_passages(index_path, 5)
+    with PassageStore(index_path) as store:
+        assert len(store) == 5
+        assert store.get("3") == {"id": "3", "text": "passage 3", "metadata": {"page_start": 3}}
+        assert [passage["id"] for passage in store.page(3, 10)] == ["3", "4"]
+    assert os.path.exists(f"{index_path}.passages.offsets.npy")
+
+
+def test_concurrent_first_reads_write_the_sidecar_once(tmp_path):
+    index_path = str(tmp_path / "doc_1")
+    write_passages(index_path, 2000)
+    errors = []
+    barrier = threading.Barrier(8)
+
+    def read():
+        try:
+            barrier.wait()
+            with PassageStore(index_path) as store:
+                assert store.get("1999")["text"] == "passage 1999"
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    # No temporary files left behind
+    assert sorted(os.listdir(tmp_path)) == ["doc_1.passages.jsonl", "doc_1.passages.offsets.npy"]
@@ -0,0 +1,48 @@
+"""
+Tests for splitting a document into shards and merging per-shard results
+"""
+from types import SimpleNamespace
+
+from app.services.sharded_index import merge_top_k, shard_count, shard_ranges
+
+
+def hits(shard, *scores):
+    return [SimpleNamespace(id=f"{shard}-{i}", score=score) for i, score in enumerate(scores)]
+
+
+def ids(results):
+    return [result.id for result in results]
+
+
+def test_merge_top_k_orders_across_shards():
+    merged = merge_top_k([hits("a", 0.9, 0.5, 0.1), hits("b", 0.8, 0.6)], 4)
+    assert ids(merged) == ["a-0", "b-0", "b-1", "a-1"]
+
+
+def test_merge_top_k_ties_keep_shard_order():
+    merged = merge_top_k([hits("a", 0.7, 0.7), hits("b", 0.7), hits("c", 0.9, 0.7)], 5)
+    assert ids(merged) == ["c-0", "a-0", "a-1", "b-0", "c-1"]
+
+
+def test_merge_top_k_larger_than_total_hits():
+    merged = merge_top_k([hits("a", 0.4), [], hits("b", 0.6, 0.2)], 10)
+    assert ids(merged) == ["b-0", "a-0", "b-1"]
+
+
+def test_merge_top_k_without_results():
+    assert merge_top_k([], 5) == []
+    assert merge_top_k([[], []], 5) == []
+    assert merge_top_k([hits("a", 0.5)], 0) == []
+
+
+def test_shard_count():
+    assert shard_count(100, 0, 8) == 1
+    assert shard_count(100, 100, 8) == 1
+    assert shard_count(101, 100, 8) == 2
+    assert shard_count(10_000, 100, 8) == 8
+
+
+def test_shard_ranges_cover_every_passage():
+    ranges = shard_ranges(10, 3)
+    assert ranges == [(0, 4), (4, 7), (7, 10)]
+    assert shard_ranges(2, 1) == [(0, 2)]
@@ -0,0 +1,86 @@
+"""
+Tests for claiming a storage mode conversion before it is scheduled
+"""
+import importlib
+from types import SimpleNamespace
+
+import pytest
+from fastapi import BackgroundTasks, HTTPException
+
+from app.models import StorageModeRequest
+from app.services import leann_service
+
+
+class FakeSession:
+    def __init__(self, document=None):
+        self.document = document
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def query(self, model):
+        return self
+
+    def filter(self, *args):
+        return self
+
+    def first(self):
+        return self.document
+
+
+@pytest.fixture
+def documents(monkeypatch):
+    module = importlib.import_module("app.api.v1.endpoints.documents")
+    document = SimpleNamespace(id=7, status="ready", storage_mode=None, file_path="doc.pdf", file_type="pdf",
+                               error_message=None)
+    monkeypatch.setattr(module, "_get_indexed_document", lambda db, document_id: document)
+    monkeypatch.setattr(leann_service, "is_flat", lambda document_id: False)
+    monkeypatch.setattr(leann_service, "get_storage_mode", lambda document_id: "pruned")
+    yield module, document
+    leann_service.release_rebuild("7")
+
+
+def test_second_conversion_request_gets_409(documents):
+    module, document = documents
+    tasks = BackgroundTasks()
+    response = module.set_storage_mode(7, StorageModeRequest(mode="full"), tasks, FakeSession())
+    assert response.converting
+    assert len(tasks.tasks) == 1
+
+    with pytest.raises(HTTPException) as error:
+        module.set_storage_mode(7, StorageModeRequest(mode="full"), BackgroundTasks(), FakeSession())
+    assert error.value.status_code == 409
+    assert len(tasks.tasks) == 1
+
+
+def test_conversion_to_the_current_mode_releases_the_claim(documents):
+    module, document = documents
+    tasks = BackgroundTasks()
+    response = module.set_storage_mode(7, StorageModeRequest(mode="pruned"), tasks, FakeSession())
+    assert not response.converting
+    assert tasks.tasks == []
+    assert leann_service.claim_rebuild("7")
+
+
+def test_scheduled_conversion_releases_the_claim(documents, monkeypatch):
+    module, document = documents
+
+    def failing_text(file_path, file_type):
+        raise RuntimeError("unreadable")
+
+    monkeypatch.setattr(leann_service, "get_text", failing_text)
+    tasks = BackgroundTasks()
+    module.set_storage_mode(7, StorageModeRequest(mode="full"), tasks, FakeSession(document))
+    task = tasks.tasks[0]
+    task.func(*task.args, **task.kwargs)
+
+    assert not leann_service.is_rebuilding("7")
+    assert document.error_message == "Storage conversion to full failed: unreadable"
+
+
+def test_missing_document_releases_the_claim():
+    module = importlib.import_module("app.api.v1.endpoints.documents")
+    assert leann_service.claim_rebuild("8")
+    module.convert_index_background(8, "full", FakeSession())
+    assert not leann_service.is_rebuilding("8")